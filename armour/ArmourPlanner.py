@@ -2,7 +2,7 @@ from rtd.util.mixins import Options
 from rtd.planner import RtdPlanner
 from rtd.entity.states import EntityState
 from rtd.planner.trajectory import Trajectory
-from rtd.planner.trajopt import TrajOptProps, RtdTrajOpt, GenericArmObjective, ScipyOptimizationEngine
+from rtd.planner.trajopt import TrajOptProps, RtdTrajOpt, GenericArmObjective, ScipyOptimizationEngine, TorchMultiStartOptimizationEngine
 from rtd.sim.world import WorldState
 from armour.reachsets import JRSGenerator, FOGenerator, IRSGenerator, JLSGenerator
 from armour.trajectory import ArmTrajectoryFactory
@@ -19,6 +19,11 @@ class ArmourPlanner(RtdPlanner, Options):
             "use_robust_input": False,
             "smooth_obs": False,
             "traj_type": "piecewise",
+            "parallel_reachsets": False,
+            "optimization_engine": "scipy",
+            "warm_start": True,
+            "jrs_cache_dir": None,
+            "reduction_policy": None,
         }
         
         
@@ -27,10 +32,15 @@ class ArmourPlanner(RtdPlanner, Options):
         RtdPlanner.__init__(self)
         Options.__init__(self)
         # initialize using given options
-        self.mergeoptions(options)
+        options = self.mergeoptions(options)
+        self.warm_start: bool = options["warm_start"]
+        # last successfully planned trajectory, used to warm start the next plan
+        self.lastTrajectory: Trajectory = None
         self.rsGenerators = dict()
-        self.rsGenerators["jrs"] = JRSGenerator(robot, traj_type=options["traj_type"])
-        self.rsGenerators["fo"] = FOGenerator(robot, self.rsGenerators["jrs"], smooth_obs=options["smooth_obs"])
+        self.rsGenerators["jrs"] = JRSGenerator(robot, traj_type=options["traj_type"],
+                                                cache_dir=options["jrs_cache_dir"])
+        self.rsGenerators["fo"] = FOGenerator(robot, self.rsGenerators["jrs"], smooth_obs=options["smooth_obs"],
+                                              reduction_policy=options["reduction_policy"])
         if options["input_constraints_flag"]:
             self.rsGenerators["irs"] = IRSGenerator(robot, self.rsGenerators["jrs"], use_robost_input=options["use_robust_input"])
             self.rsGenerators["jls"] = JLSGenerator(robot, self.rsGenerators["jrs"])
@@ -42,11 +52,18 @@ class ArmourPlanner(RtdPlanner, Options):
         self.objective = GenericArmObjective(trajOptProps, self.trajectoryFactory)
         
         # selection of optimization engine
-        self.optimizationEngine = ScipyOptimizationEngine(trajOptProps)
+        match options["optimization_engine"]:
+            case "scipy":
+                self.optimizationEngine = ScipyOptimizationEngine(trajOptProps)
+            case "torch_multistart":
+                self.optimizationEngine = TorchMultiStartOptimizationEngine(trajOptProps)
+            case _:
+                raise ValueError("optimization_engine must be one of 'scipy' or 'torch_multistart'!")
         
         # create the trajopt object
         self.trajopt = RtdTrajOpt(trajOptProps, self.rsGenerators, self.objective,
-                                  self.optimizationEngine, self.trajectoryFactory)
+                                  self.optimizationEngine, self.trajectoryFactory,
+                                  parallel_reachsets=options["parallel_reachsets"])
     
     
     def planTrajectory(self, robotState: EntityState, worldState: WorldState, waypoint) -> tuple[Trajectory, dict]:
@@ -63,7 +80,12 @@ class ArmourPlanner(RtdPlanner, Options):
         otherwise return an invalid trajectory which will throw when
         attempting to set the new trajectory, ensuring the old one
         continues
-        '''
         
-        traj, _, info = self.trajopt.solveTrajOpt(robotState, worldState, waypoint)
+        If the `warm_start` option is set, the last successful plan
+        is used as the initial guess for the next one
+        '''
+        initialGuess = self.lastTrajectory if self.warm_start else None
+        traj, _, info = self.trajopt.solveTrajOpt(robotState, worldState, waypoint, initialGuess)
+        if traj is not None:
+            self.lastTrajectory = traj
         return traj, info
\ No newline at end of file
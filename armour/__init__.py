@@ -1,4 +1,18 @@
-from armour.ArmourPlanner import ArmourPlanner
 from armour.ArmourAgent import ArmourAgent
 from armour.ArmourGoal import ArmourGoal
-from armour.ArmourSimulation import ArmourSimulation
\ No newline at end of file
+
+# the simulation and planner need zonopy, which is installed separately
+_zonopy_classes = ("ArmourSimulation", "ArmourPlanner")
+try:
+    from armour.ArmourSimulation import ArmourSimulation
+    from armour.ArmourPlanner import ArmourPlanner
+except ModuleNotFoundError as e:
+    if e.name not in ("zonopy", "zonopyrobots"):
+        raise
+    _zonopy_error = e
+    
+    def __getattr__(name: str):
+        if name in _zonopy_classes:
+            raise ModuleNotFoundError(f"{__name__}.{name} needs {_zonopy_error.name}, which isn't installed",
+                                      name=_zonopy_error.name) from _zonopy_error
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,8 @@
 from rtd.entity.components import BaseInfoComponent
 from rtd.util.mixins import Options
-from zonopyrobots import ZonoArmRobot
 from urchin import URDF
 import torch
+import numpy as np
 
 # define top level module logger
 import logging
@@ -16,7 +16,8 @@ class ArmourAgentInfo(BaseInfoComponent, Options):
         '''
         Sets the default options for the ArmourAgentInfo, such
         as `M_min_eigenvalue`, `gravity`, `transmission_inertia`,
-        and `buffer_dist`.
+        `buffer_dist`, and `joint_torque_limits`, which defaults to the
+        efforts in the URDF.
         '''
         return {
             "M_min_eigenvalue": 0.002,
@@ -24,6 +25,7 @@ class ArmourAgentInfo(BaseInfoComponent, Options):
             "transmission_inertia": None,
             "buffer_dist": 0,
             "torch_device": torch.device("cpu"),
+            "joint_torque_limits": None,
         }
     
     
@@ -34,7 +36,9 @@ class ArmourAgentInfo(BaseInfoComponent, Options):
         # initialize using given options
         options = self.mergeoptions(options)
 
-        # Save a ZonoArmRobot object generated from this URDF
+        # Save a ZonoArmRobot object generated from this URDF, where
+        # zonopy-robots is installed separately so it's only needed here
+        from zonopyrobots import ZonoArmRobot
         self.params = ZonoArmRobot.load(robot, device=options["torch_device"], dtype=torch.double)
         self.urdf = self.params.urdf
         
@@ -55,6 +59,13 @@ class ArmourAgentInfo(BaseInfoComponent, Options):
         self.gravity = options["gravity"]
         self.transmission_inertia = options["transmission_inertia"]
         self.buffer_dist = options["buffer_dist"]
+        # (2, n_q) lower and upper torque limits
+        if options["joint_torque_limits"] is not None:
+            self.joint_torque_limits = np.array(options["joint_torque_limits"], dtype=float)
+        else:
+            effort = np.array([joint.limit.effort if joint.limit is not None else np.inf
+                               for joint in self.urdf.actuated_joints[:self.n_q]], dtype=float)
+            self.joint_torque_limits = np.array([-effort, effort])
     
     
     def __str__(self):
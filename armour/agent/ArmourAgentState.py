@@ -27,6 +27,14 @@ class ArmourAgentState(BaseStateComponent, Options):
         # initialize using given options
         self.mergeoptions(options)
         self.entityinfo = arm_info
+        # sorted times and the states at them since the last commit,
+        # shared by everything querying this state during a step
+        self._timeline_times: Vecnp = np.zeros(0)
+        self._timeline_states: Matnp = None
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+        # requested times this close to a time of the timeline use its state
+        self.timeline_tol: float = 1e-9
         # self.reset()
     
     
@@ -40,6 +48,25 @@ class ArmourAgentState(BaseStateComponent, Options):
         return self.state[self.velocity_indices,:]
     
     
+    @property
+    def cache_hit_rate(self) -> float:
+        '''
+        Fraction of the times requested from `get_state` which were
+        served from the timeline cache
+        '''
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / total if total > 0 else 0.0
+    
+    
+    def clear_cache(self):
+        '''
+        Drops the interpolated states of the timeline cache, which is
+        needed whenever the committed states change
+        '''
+        self._timeline_times = np.zeros(0)
+        self._timeline_states = None
+    
+    
     def reset(self, **options):
         options = self.mergeoptions(options)
         # Set component dependent properties
@@ -51,6 +78,7 @@ class ArmourAgentState(BaseStateComponent, Options):
         self.state: Matnp = np.zeros((self.n_states, 1))
         self.time = np.zeros(1)
         self.step_start_idxs = np.zeros(1)
+        self.clear_cache()
         
         # add position
         if options["initial_position"] is not None:
@@ -85,6 +113,7 @@ class ArmourAgentState(BaseStateComponent, Options):
         self.state: Matnp = np.zeros((self.n_states, 1))
         self.time = np.zeros(1)
         self.step_start_idxs = np.zeros(1)
+        self.clear_cache()
         
         # make the random configuration
         if random_position:
@@ -99,6 +128,12 @@ class ArmourAgentState(BaseStateComponent, Options):
     def get_state(self, time: Vecnp = None) -> ArmRobotState:
         '''
         Returns the state of the ArmourAgent at a specific time.
+        
+        The states of the last step and any time interpolated since are
+        kept in a sorted timeline until the next commit. The times found
+        in it, up to round off, are gathered from it, so the dynamics,
+        collision, visual and goal checks of a step which sample the same
+        grid, or a coarser grid of the same times, don't interpolate again
         '''
         # default to the last time and state
         if time is None:
@@ -112,16 +147,71 @@ class ArmourAgentState(BaseStateComponent, Options):
             state.state = self.state[:,0:][..., None]
             return state
         
-        # otherwise, interpolate
-        timesize = time.size if isinstance(time, Vecnp) else 1
-        state.state = np.zeros((self.n_states, timesize))
+        # find the nearest time of the timeline for each requested time
+        times = np.reshape(np.asarray(time, dtype=np.double), -1)
+        cached = self._timeline_times
+        if cached.size > 0:
+            idx = np.minimum(np.searchsorted(cached, times), cached.size-1)
+            left = np.maximum(idx - 1, 0)
+            (err, left_err) = (np.abs(cached.take(idx) - times), np.abs(cached.take(left) - times))
+            closer = left_err < err
+            idx[closer] = left[closer]
+            hit = np.minimum(err, left_err) <= self.timeline_tol
+        else:
+            hit = np.zeros(times.size, dtype=bool)
         
-        # if we can and need to interpolate the state, do it
-        for i in range(self.n_states):
-            state.state[i,:] = np.interp(time, self.time, self.state[i,:])
+        if hit.all():
+            state.state = self._timeline_states.take(idx, axis=1)
+            self.cache_hits += times.size
+            return state
+        
+        # interpolate each distinct remaining time once and add it to the
+        # timeline, where sampled grids are usually already sorted
+        state.state = np.empty((self.n_states, times.size))
+        if hit.any():
+            state.state[:,hit] = self._timeline_states.take(idx[hit], axis=1)
+        new_times = times[~hit]
+        if np.all(new_times[1:] > new_times[:-1]):
+            new_states = self.interpolate(new_times)
+            state.state[:,~hit] = new_states
+        else:
+            (new_times, inverse) = np.unique(new_times, return_inverse=True)
+            new_states = self.interpolate(new_times)
+            state.state[:,~hit] = new_states.take(inverse, axis=1)
+        self.addToTimeline(new_times, new_states)
+        self.cache_hits += times.size - new_times.size
+        self.cache_misses += new_times.size
         return state
     
     
+    def interpolate(self, times: Vecnp) -> Matnp:
+        '''
+        Linearly interpolate all of the committed states at the sorted
+        times at once, holding the first and last states outside of them
+        like `np.interp`
+        '''
+        idx = np.maximum(np.minimum(np.searchsorted(self.time, times, side='right'), self.time.size-1), 1)
+        t0 = self.time.take(idx - 1)
+        dt = self.time.take(idx) - t0
+        dt[dt <= 0] = np.inf
+        weight = np.maximum(np.minimum((times - t0) / dt, 1), 0)
+        state0 = self.state.take(idx - 1, axis=1)
+        return state0 + (self.state.take(idx, axis=1) - state0) * weight
+    
+    
+    def addToTimeline(self, times: Vecnp, states: Matnp):
+        '''
+        Merge the sorted times and their states into the timeline
+        '''
+        if self._timeline_states is None:
+            (self._timeline_times, self._timeline_states) = (times, states)
+            return
+        merged = np.concatenate((self._timeline_times, times))
+        order = np.argsort(merged, kind='stable')
+        self._timeline_times = merged[order]
+        self._timeline_states = np.concatenate((self._timeline_states, states), axis=1)[:,order]
+    
+    
     def commit_state_data(self, T_state: Vecnp, Z_state: Matnp):
         '''
         method: commit_move_data(T_state,Z_state)
@@ -141,6 +231,13 @@ class ArmourAgentState(BaseStateComponent, Options):
         self.step_start_idxs = np.append(self.time, self.time.size+1)
         self.time = np.concatenate((self.time, self.time[-1] + T_state[1:]))
         self.state = np.concatenate((self.state, Z_state[:,1:]), 1)
+        if self._timeline_times.size > 0:
+            logger.debug(f"Timeline cache hit rate {self.cache_hit_rate:.2f} over {self._timeline_times.size} times")
+        
+        # start the timeline of the step with the committed states, which
+        # are those of the command that was followed
+        self.clear_cache()
+        self.addToTimeline(self.time[-T_state.size:], self.state[:,-T_state.size:])
     
     
     def joint_limit_check(self, t_check_step: float) -> bool:
@@ -1,8 +1,8 @@
 from rtd.entity.states import EntityState
 from rtd.planner.reachsets import ReachSetGenerator
-from armour.reachsets import FOInstance, JRSGenerator
+from armour.reachsets import FOInstance, JRSGenerator, ObstaclePolytopeCache, ReductionPolicy
 from zonopy import polyZonotope
-from itertools import combinations
+from functools import lru_cache
 # from zonopy.kinematics import FO as FOcc
 import torch
 import numpy as np
@@ -17,9 +17,15 @@ class FOGenerator(ReachSetGenerator):
     '''
     ForwardOccupancy
     This acts as a generator for a single instance of a
-    ForwardReachableSet, and return FOInstance
+    ForwardReachableSet, and return FOInstance. With `smooth_obs`, the
+    obstacle constraints of each link-obstacle pair are aggregated over
+    time into one conservative smooth maximum with sharpness `smooth_beta`.
+    The orders of the zonotope reductions are set by `reduction_policy`.
+    The obstacle polytopes take their generator pairs from the table in
+    `obs_frs_combs`, which is shared by every generator by default
     '''
-    def __init__(self, robot, jrsGenerator: JRSGenerator, smooth_obs: bool = False, obs_frs_combs: dict = None):
+    def __init__(self, robot, jrsGenerator: JRSGenerator, smooth_obs: bool = False, obs_frs_combs: dict = None,
+                 smooth_beta: float = 1000.0, reduction_policy: ReductionPolicy = None):
         # initialize base classes
         ReachSetGenerator.__init__(self)
         # set properties
@@ -28,9 +34,17 @@ class FOGenerator(ReachSetGenerator):
         self.cache_max_size = 0 # we don't want to cache any FO
         self.robot = robot.params
         self.jrsGenerator: JRSGenerator = jrsGenerator
+        self.dependencies = [jrsGenerator]
+        self.smooth_obs = smooth_obs
+        self.smooth_beta = smooth_beta
         self.obs_frs_combs: dict = obs_frs_combs
         if self.obs_frs_combs['combs'] is None:
             self.obs_frs_combs['combs'] = self.generate_combinations_upto(self.obs_frs_combs['maxcombs'])
+        if reduction_policy is None:
+            reduction_policy = ReductionPolicy()
+        self.reduction_policy: ReductionPolicy = reduction_policy
+        # polytope data of static obstacles, shared by the instances
+        self.obstacle_cache = ObstaclePolytopeCache(self.obs_frs_combs['combs'])
     
     
     def generateReachableSet(self, robotState: EntityState) -> dict[int, FOInstance]:
@@ -41,18 +55,32 @@ class FOGenerator(ReachSetGenerator):
         '''
         jrsInstance = self.jrsGenerator.getReachableSet(robotState, ignore_cache=True)
         logger.info("Generating forward occupancy!")
-        forwardocc = list(forward_occupancy(jrsInstance[1].R, self.robot)[0].values())[1:jrsInstance[1].n_q+1]
-        return {1: FOInstance(forwardocc, jrsInstance[1], self.obs_frs_combs)}
+        forwardocc = list(forward_occupancy(jrsInstance[1].R, self.robot,
+                                            zono_order=self.reduction_policy.order("kinematics"))[0].values())[1:jrsInstance[1].n_q+1]
+        for (j, FO_j) in enumerate(forwardocc):
+            order = self.reduction_policy.order("occupancy", j)
+            if order is not None:
+                forwardocc[j] = FO_j.reduce_indep(order)
+        return {1: FOInstance(forwardocc, jrsInstance[1], self.obs_frs_combs, self.obstacle_cache,
+                               self.smooth_beta if self.smooth_obs else None, self.reduction_policy)}
                     
     
     @staticmethod
-    def generate_combinations_upto(n: int) -> list[list[int]]:
+    @lru_cache(maxsize=None)
+    def generate_combinations_upto(n: int) -> tuple[torch.Tensor, ...]:
         '''
-        generate a bunch of combinations, store in a cell
+        generate the pairs of generator indices for each number of
+        generators up to `n`, where entry i holds the (i+1)i/2 pairs of
+        the first i+1 generators as an (n_pairs, 2) tensor
+        
+        The pairs are in colexicographic order, so every entry is a view
+        into the same contiguous table. The tables are computed once per
+        process and shared by all generators
         '''
-        combs = [list(combinations(np.arange(i+1), 2)) for i in range(0, n)]
-        combs[0].append(0)
-        return combs
+        table = torch.tril_indices(n, n, -1).flip(0).T.contiguous()
+        combs = [table[:(i+1)*i//2] for i in range(0, n)]
+        combs[0] = torch.zeros(1, dtype=torch.long)
+        return tuple(combs)
 
 # Pulled from zonopy-ext
 from zonopy import polyZonotope, matPolyZonotope, batchPolyZonotope, batchMatPolyZonotope
@@ -1,8 +1,9 @@
 from typing import Callable
 from rtd.planner.reachsets import ReachSetInstance
 from rtd.sim.world import WorldState
-from armour.reachsets import JRSInstance
-from zonopy import batchZonotope, batchPolyZonotope
+from armour.reachsets import JRSInstance, ObstaclePolytopeCache, ReductionPolicy
+from zonopy import batchPolyZonotope
+from rtd.functional.polynomials import monomials
 import torch
 import numpy as np
 from nptyping import NDArray, Shape, Float64
@@ -22,7 +23,9 @@ class FOInstance(ReachSetInstance):
     This is just an individual instance of joint limit set set from
     armour
     '''
-    def __init__(self, FO, jrsInstance: JRSInstance, obs_frs_combs):
+    def __init__(self, FO, jrsInstance: JRSInstance, obs_frs_combs: dict = None,
+                 obstacle_cache: ObstaclePolytopeCache = None, smooth_beta: float = None,
+                 reduction_policy: ReductionPolicy = None):
         # initialize base classes
         ReachSetInstance.__init__(self)
         
@@ -33,6 +36,19 @@ class FOInstance(ReachSetInstance):
         self.input_range: BoundsVec = jrsInstance.input_range
         # initialize combinations (for obstacle avoidance constraints)
         self.obs_frs_combs = obs_frs_combs
+        # obstacle polytope data kept across planning cycles
+        if obstacle_cache is None:
+            obstacle_cache = ObstaclePolytopeCache(None if obs_frs_combs is None else obs_frs_combs['combs'])
+        self.obstacle_cache = obstacle_cache
+        # aggregate the time steps of each pair with a smooth maximum if set
+        self.smooth_beta = smooth_beta
+        # orders of the reductions before building the constraints
+        if reduction_policy is None:
+            reduction_policy = ReductionPolicy()
+        self.reduction_policy = reduction_policy
+        # counts of the link-obstacle pairs culled by the broad phase and
+        # the exact check, from the last genNLConstraint
+        self.pair_stats: dict = None
     
     
     def genNLConstraint(self, worldState: WorldState) -> Callable:
@@ -41,68 +57,216 @@ class FOInstance(ReachSetInstance):
         nlconstraint.
         Returns a function handle for the nlconstraint generated
         where the function's return type is [c, ceq, gc, gceq]
+        
+        The polytopes of all the link-obstacle pairs which may collide
+        are stacked, so every evaluation computes all of the constraints
+        and their gradients at once. The returned callback also has a
+        `batch` method to evaluate a (n_batch, n_k) batch of inputs
         '''
-        obs_constraints = list()
+        A_pairs = list()
+        b_pairs = list()
+        FO_pairs = list()
+        
+        # broad phase, only pairs whose bounding boxes overlap at some
+        # time step can collide
+        n_q = self.jrsInstance.n_q
+        overlap = self.broadphase(worldState.obstacles)
+        self.pair_stats = {
+            'pairs': n_q * len(worldState.obstacles),
+            'broadphase_culled': int((~overlap).sum()),
+            'exact_culled': 0,
+            'constraints': 0,
+        }
         
-        # obstacle avoidance constraints
-        for j in range(self.jrsInstance.n_q):
-            for obs in worldState.obstacles:    # for each obstacle
+        # obstacle avoidance constraints, where the polytope data of the
+        # obstacles which didn't change since the last cycle is reused
+        obs_keys = [self.obstacle_cache.obstacleKey(obs) for obs in worldState.obstacles]
+        self.obstacle_cache.prune(set(obs_keys))
+        clearance = self.clearance(worldState.obstacles) if self.reduction_policy.adaptive else None
+        reduced_FO = dict()
+        for j in range(n_q):
+            for (o, obs) in enumerate(worldState.obstacles):    # for each obstacle
+                if not overlap[j,o]:
+                    continue
                 
                 # first, check if constraints in necessary
-                O_buf = torch.cat((obs.Z.expand(100, -1, -1), self.FO[j].G, self.FO[j].Grest), dim=1)
-                A_obs, b_obs = batchZonotope(O_buf).polytope(self.obs_frs_combs)   # get polytope form
+                FO_buf = torch.cat((self.FO[j].G, self.FO[j].Grest), dim=1)
+                A_obs, b_obs = self.obstacle_cache.polytope(obs, FO_buf, obs_keys[o])   # get polytope form
                 h_overapprox = (A_obs@self.FO[j].c.unsqueeze(-1)).squeeze(-1) - b_obs
                 if not (torch.max(h_overapprox.nan_to_num(-torch.inf),-1)[0] < 1e-6).any():     # no collision
+                    self.pair_stats['exact_culled'] += 1
                     continue
                     
                 # reduce FO so that polytope has fewer directions to consider
-                self.FO[j] = self.FO[j].reduce_indep(3)
+                order = self.reduction_policy.order("constraint", j,
+                                                    None if clearance is None else clearance[j,o].item())
+                if (j, order) not in reduced_FO:
+                    reduced_FO[(j, order)] = self.FO[j].reduce_indep(order)
+                FO_j = reduced_FO[(j, order)]
                 
                 # now create constraints
-                FO_buf = self.FO[j].Grest       # will buffer by non-sliceable gens
-                O_buf = torch.cat((obs.Z.expand(100, -1, -1), FO_buf), dim=1)       # describes buffered obstacle zonotope
-                A_obs, b_obs = batchZonotope(O_buf).polytope(self.obs_frs_combs)    # get polytope form
-                
-                # constraint pz
-                FO_tmp = batchPolyZonotope(Z=self.FO[j].Z[...,:self.FO[j].n_dep_gens+1,:], n_dep_gens=self.FO[j].n_dep_gens, 
-                                           expMat=self.FO[j].expMat, id=self.FO[j].id)
-                obs_constraint_pz = A_obs@FO_tmp - b_obs
-                
-                # turn into function
-                obs_constraint_pz_slice = lambda k: obs_constraint_pz.cpu().center_slice_all_dep(k)
-                
-                # add gradients
-                grad_obs_constraint_pz_slice = lambda k: obs_constraint_pz.cpu().grad_center_slice_all_dep(k)
-                
-                # save
-                obs_constraints.append(lambda k: self.batch_obs_constraint(obs_constraint_pz_slice, grad_obs_constraint_pz_slice, k))
+                FO_buf = FO_j.Grest       # will buffer by non-sliceable gens
+                A_obs, b_obs = self.obstacle_cache.polytope(obs, FO_buf, obs_keys[o])    # get polytope form of the buffered obstacle
+                A_pairs.append(A_obs.cpu())
+                b_pairs.append(b_obs.cpu())
+                FO_pairs.append(FO_j)
+        
+        self.pair_stats['constraints'] = len(FO_pairs)
+        logger.debug(f"Obstacle pairs: {self.pair_stats}")
+        constraint = ObstacleConstraints(A_pairs, b_pairs, FO_pairs, self.num_parameters, self.smooth_beta)
         
         # create the constraint callback
-        return lambda k: self.eval_constraints(k, len(obs_constraints), obs_constraints, batch_size=100)
+        nlconCallback = lambda k: constraint(k)
+        nlconCallback.batch = constraint.batch
+        nlconCallback.pair_stats = self.pair_stats
+        return nlconCallback
     
-
-    def batch_obs_constraint(self, c: Callable, grad_c: Callable, k) -> tuple[float, list]:
+    
+    def broadphase(self, obstacles: list) -> torch.Tensor:
         '''
-        Made a separate function to handle the obstacle constraints,
-        because the gradient requires knowing the index causing
-        the max of the constraints
+        Test the axis-aligned bounding boxes of the forward occupancy of
+        each link against those of the obstacles at every time step
+        
+        Returns:
+            torch.Tensor: (n_q, n_obs) bool of the pairs which may overlap
         '''
-        h_obs, max_idx = torch.max(c(k).nan_to_num(-torch.inf), -1)
-        grad_eval = grad_c(k)
-        grad_h_obs = grad_eval[torch.arange(grad_eval.shape[0]),max_idx,:]
-        # grad_h_obs = [-grad[-h_obs,:] for grad in grad_eval]
-        return (-h_obs.numpy(), grad_h_obs.numpy())
+        n_q = self.jrsInstance.n_q
+        if len(obstacles) == 0:
+            return torch.zeros((n_q, 0), dtype=torch.bool)
         
+        # (n_q, n_obs, n_t) overlap at each time step
+        (FO_c, FO_r, obs_c, obs_r) = self.boxes(obstacles)
+        separation = (FO_c.unsqueeze(1) - obs_c[None,:,None,:]).abs()
+        overlap = torch.all(separation <= FO_r.unsqueeze(1) + obs_r[None,:,None,:], dim=-1)
+        return overlap.any(-1).cpu()
     
-    @staticmethod
-    def eval_constraints(k, n_c: int, obs_constraints: list[Callable], batch_size: int = 1):
-        h = np.zeros(n_c*batch_size)
-        grad_h = np.zeros((n_c*batch_size, k.size))
-        k_tensor = torch.as_tensor(k)
-        
-        for i in range(n_c):
-            h[i*batch_size:(i+1)*batch_size], grad_h[i*batch_size:(i+1)*batch_size,:] = obs_constraints[i](k_tensor)
-        
-        grad_heq = None
-        heq = None
-        return (h, heq, grad_h, grad_heq)
\ No newline at end of file
+    
+    def clearance(self, obstacles: list) -> torch.Tensor:
+        '''
+        Smallest distance over time from the center of the forward
+        occupancy of each link to the bounding box of each obstacle
+        
+        Returns:
+            torch.Tensor: (n_q, n_obs) distances
+        '''
+        n_q = self.jrsInstance.n_q
+        if len(obstacles) == 0:
+            return torch.zeros((n_q, 0), dtype=torch.double)
+        
+        (FO_c, _, obs_c, obs_r) = self.boxes(obstacles)
+        gap = ((FO_c.unsqueeze(1) - obs_c[None,:,None,:]).abs() - obs_r[None,:,None,:]).clamp(min=0)
+        return torch.linalg.norm(gap, dim=-1).amin(-1).cpu()
+    
+    
+    def boxes(self, obstacles: list) -> tuple[torch.Tensor, ...]:
+        '''
+        Centers and half widths of the (n_q, n_t, 3) axis-aligned bounding
+        boxes of the links and the (n_obs, 3) boxes of the obstacles
+        '''
+        # the links can have different numbers of generators
+        FO_Z = [self.FO[j].Z for j in range(self.jrsInstance.n_q)]
+        FO_c = torch.stack([Z[...,0,:] for Z in FO_Z])
+        FO_r = torch.stack([Z[...,1:,:].abs().sum(-2) for Z in FO_Z])
+        obs_Z = [obs.Z.to(FO_c) for obs in obstacles]
+        obs_c = torch.stack([Z[0] for Z in obs_Z])
+        obs_r = torch.stack([Z[1:].abs().sum(0) for Z in obs_Z])
+        return (FO_c, FO_r, obs_c, obs_r)
+
+
+
+class ObstacleConstraints:
+    '''
+    The obstacle avoidance constraints of all link-obstacle pairs
+    
+    For each pair and time step, the center of the sliceable part of the
+    forward occupancy, `c + sum_i G_i prod_j k_j^expMat[i,j]`, has to be
+    outside of the obstacle buffered by the rest of the forward occupancy,
+    given as the polytope `A x <= b`. The constraint is
+    `h = -max(A x - b) <= 0`. The pairs are padded to the same number of
+    halfspaces and generators, so all of them are evaluated at once
+    
+    If `smooth_beta` is given, the time steps of each pair are aggregated
+    into a single constraint `(1/beta) log sum_t exp(beta h_t) <= 0`. This
+    smooth maximum is an upper bound on the largest `h_t`, so it stays
+    conservative while it is at most `log(n_t)/beta` larger
+    '''
+    def __init__(self, A: list[torch.Tensor], b: list[torch.Tensor],
+                 FO: list[batchPolyZonotope], n_k: int, smooth_beta: float = None):
+        self.n_pairs = len(FO)
+        self.n_k = n_k
+        self.smooth_beta = smooth_beta
+        if self.n_pairs == 0:
+            return
+        
+        n_t = FO[0].c.shape[0]
+        n_h = max(A_obs.shape[-2] for A_obs in A)
+        n_gens = max(FO_j.n_dep_gens for FO_j in FO)
+        
+        # halfspaces, where padded and degenerate ones can never be active
+        self.A = torch.zeros((self.n_pairs, n_t, n_h, 3), dtype=torch.double)
+        self.b = torch.full((self.n_pairs, n_t, n_h), torch.inf, dtype=torch.double)
+        # sliceable part of the forward occupancy, where padded generators are zero
+        self.c = torch.zeros((self.n_pairs, n_t, 3), dtype=torch.double)
+        self.G = torch.zeros((self.n_pairs, n_t, n_gens, 3), dtype=torch.double)
+        self.expMat = torch.zeros((self.n_pairs, n_gens, n_k), dtype=torch.double)
+        
+        for (i, (A_obs, b_obs, FO_j)) in enumerate(zip(A, b, FO)):
+            invalid = torch.isnan(A_obs).any(-1) | torch.isnan(b_obs)
+            n_h_i = A_obs.shape[-2]
+            self.A[i,:,:n_h_i] = A_obs.masked_fill(invalid.unsqueeze(-1), 0)
+            self.b[i,:,:n_h_i] = b_obs.masked_fill(invalid, torch.inf)
+            
+            # the ids are matched to k in sorted order, like zonopy's
+            # center_slice_all_dep
+            Z = FO_j.Z.cpu()
+            n_dep = FO_j.n_dep_gens
+            n_ids = len(FO_j.id)
+            self.c[i] = Z[...,0,:]
+            self.G[i,:,:n_dep] = Z[...,1:n_dep+1,:]
+            self.expMat[i,:n_dep,:n_ids] = torch.as_tensor(FO_j.expMat).cpu()[:,torch.argsort(torch.as_tensor(FO_j.id))]
+    
+    
+    def __call__(self, k) -> tuple:
+        (h, heq, grad_h, grad_heq) = self.batch(np.asarray(k)[np.newaxis])
+        return (h[0], heq, grad_h[0], grad_heq)
+    
+    
+    def batch(self, k) -> tuple:
+        '''
+        Evaluate the constraints and their gradients for a (n_batch, n_k)
+        batch of inputs
+        '''
+        k = np.atleast_2d(k)
+        n_batch = k.shape[0]
+        if self.n_pairs == 0:
+            return (np.zeros((n_batch, 0)), None, np.zeros((n_batch, 0, k.shape[1])), None)
+        
+        k_tensor = torch.as_tensor(k[:,:self.n_k], dtype=torch.double)
+        # (n_batch, n_pairs, n_gens) and (n_batch, n_pairs, n_gens, n_k)
+        mono, grad_mono = monomials(k_tensor[:,None,:], self.expMat)
+        
+        # (n_batch, n_pairs, n_t, 3) center of the forward occupancy
+        x = self.c + torch.einsum('bpg,ptgd->bptd', mono, self.G)
+        # (n_batch, n_pairs, n_t, n_h) distance to each halfspace
+        dist = torch.einsum('pthd,bptd->bpth', self.A, x) - self.b
+        h_obs, max_idx = torch.max(dist, dim=-1)
+        
+        # the gradient follows the active halfspace
+        A_max = torch.gather(self.A.expand(n_batch, -1, -1, -1, -1), 3,
+                             max_idx[...,None,None].expand(-1, -1, -1, 1, 3)).squeeze(3)
+        grad_x = torch.einsum('ptgd,bpgi->bptdi', self.G, grad_mono)
+        grad_h_obs = torch.einsum('bptd,bptdi->bpti', A_max, grad_x)
+        h_obs = -h_obs
+        grad_h_obs = -grad_h_obs
+        
+        # aggregate the time steps of each pair with a smooth maximum,
+        # whose gradient weighs the time steps with their softmax
+        if self.smooth_beta is not None:
+            weights = torch.softmax(self.smooth_beta*h_obs, dim=-1)
+            grad_h_obs = torch.einsum('bpt,bpti->bpi', weights, grad_h_obs)
+            h_obs = torch.logsumexp(self.smooth_beta*h_obs, dim=-1) / self.smooth_beta
+        
+        h = h_obs.reshape(n_batch, -1).numpy()
+        grad_h = np.zeros((n_batch, h.shape[1], k.shape[1]))
+        grad_h[...,:self.n_k] = grad_h_obs.reshape(n_batch, -1, self.n_k).numpy()
+        return (h, None, grad_h, None)
\ No newline at end of file
@@ -1,10 +1,11 @@
 from rtd.entity.states import EntityState
 from rtd.planner.reachsets import ReachSetGenerator
 from armour.reachsets import IRSInstance, JRSGenerator
-from zonopy import polyZonotope
+from zonopy import batchPolyZonotope
 from zonopyrobots.dynamics.RNEA import pzrnea
 import torch
 import numpy as np
+import time
 
 # define top level module logger
 import logging
@@ -17,15 +18,25 @@ class IRSGenerator(ReachSetGenerator):
     InputReachableSet
     This generates the upper and lower bound reachable sets on the input,
     and creates an IRSInstance object
+    
+    The polynomial zonotope RNEA is run once for all time steps, with the
+    sets of each joint batched over time. If `use_robost_input` is set,
+    the nominal input is bounded by the norm of the disturbance between
+    the interval and nominal parameters, plus the input needed to
+    correct the `ultimate_bound` of the tracking error
     '''
-    def __init__(self, robot, jrsGenerator: JRSGenerator, use_robost_input: bool = True):
+    def __init__(self, robot, jrsGenerator: JRSGenerator, use_robost_input: bool = True,
+                 ultimate_bound: float = None):
         # initialize base classes
         ReachSetGenerator.__init__(self)
         # set properties
         self.cache_max_size = 1
         self.robot = robot
+        self.params = robot.params
         self.jrsGenerator: JRSGenerator = jrsGenerator
+        self.dependencies = [jrsGenerator]
         self.use_robost_input = use_robost_input
+        self.ultimate_bound = ultimate_bound
     
     
     def generateReachableSet(self, robotState: EntityState) -> dict[int, IRSInstance]:
@@ -39,70 +50,64 @@ class IRSGenerator(ReachSetGenerator):
         jrsInstance = self.jrsGenerator.getReachableSet(robotState, ignore_cache=False)[1]
         
         logger.info("Generating input reachable set!")
+        start_time = time.perf_counter()
         
-        # set up zeros and overapproximation of r
-        zero_cell: list[polyZonotope] = list()
-        r: list[polyZonotope] = list()
-        for j in range(jrsInstance.n_q):
-            _, _, u_zero = poly_zono_rnea(...)
-            zero_cell.append(u_zero)
-            _, _, u_r = poly_zono_rnea(...)
-            r.append(u_r)
+        # per joint sets batched over all the time steps
+        R = jrsInstance.R
+        R_T = [R_j.T for R_j in R]
         
-        # start RNEA
-        tau_nom: list[list[polyZonotope]] = list()
-        w: list[list[polyZonotope]] = list()
-        for i in range(jrsInstance.n_t):
-            # RNEA for nominal
-            _, _, u_pz = pzrnea(jrsInstance.R[i], jrsInstance.R.T[i], jrsInstance.dq[i],
-                                     jrsInstance.dq_a[i], jrsInstance.ddq_a[i], self.robot.info.params.pz_nominal, True)
-            tau_nom.append(u_pz)
-            
-            if self.use_robost_input:
-                # RNEA interval for robust input
-                f_pz, n_pz, u_pz = pzrnea(jrsInstance.R[i], jrsInstance.R.T[i], jrsInstance.dq[i],
-                                     jrsInstance.dq_a[i], jrsInstance.ddq_a[i], self.robot.info.params.pz_interval, True)
-                
-                # calculate w from robust controller
-                for j in range(jrsInstance.n_q):
-                    w.append(u_pz[j] - tau_nom[i][j])
-                    w[i][j] = w[i][j].reduce(self.robot.info.params.pz_interval.zono_order)
-                
-                # calculate v_cell
-                _, _, v_cell = pzrnea(jrsInstance.R[i], jrsInstance.R.T[i], zero_cell,
-                                              zero_cell, r, self.robot.info.params.pz_interval, False)
-                v: list[polyZonotope] = list()
-                for j in range(jrsInstance.n_q):
-                    v.append(0.5*r[j]*v_cell[j])
-                    v[i] = v[i].reduce(self.robot.info.params.pz_interval.zono_order)
-                
-                v_diff
+        # RNEA for nominal
+        _, _, tau_nom = pzrnea(R, R_T, jrsInstance.dq, jrsInstance.dq_a, jrsInstance.ddq_a,
+                               self.params.pz_nominal, True)
         
+        # (n_t,) bound on the robust input
+        v_norm = torch.zeros(jrsInstance.n_t, dtype=torch.double)
+        if self.use_robost_input:
+            # RNEA interval for robust input, where the disturbance w is
+            # bounded by the largest magnitude of its interval
+            _, _, u_int = pzrnea(R, R_T, jrsInstance.dq, jrsInstance.dq_a, jrsInstance.ddq_a,
+                                 self.params.pz_interval, True)
+            w_abs = torch.stack([self.abs_bound(u_int[j] - tau_nom[j]) for j in range(jrsInstance.n_q)], dim=-1)
+            v_norm = v_norm + torch.linalg.norm(w_abs, dim=-1)
+            
+            # input to correct the ultimate bound, M(q) r with no velocity
+            # and gravity
+            if self.ultimate_bound:
+                zero = [0*dq_j for dq_j in jrsInstance.dq]
+                r = [0*dq_j + self.ultimate_bound for dq_j in jrsInstance.dq]
+                _, _, v_cell = pzrnea(R, R_T, zero, zero, r, self.params.pz_interval, False)
+                v_abs = torch.stack([self.abs_bound(v_cell[j]) for j in range(jrsInstance.n_q)], dim=-1)
+                v_norm = v_norm + torch.linalg.norm(v_abs, dim=-1)
         
+        # compute total input tortatotope
+        u_ub: list[batchPolyZonotope] = list()
+        u_lb: list[batchPolyZonotope] = list()
+        torque_limits = self.robot.joint_torque_limits
         
-        v_norm = np.zeros(jrsInstance.n_t)
+        # input constraint setup, where the independent generators and the
+        # robust input are replaced by the buffer they add to the bounds
+        for j in range(jrsInstance.n_q):
+            n_dep = tau_nom[j].n_dep_gens
+            Z = tau_nom[j].Z
+            c = Z[...,:1,:]
+            G = Z[...,1:n_dep+1,:]
+            buf = torch.sum(torch.abs(Z[...,n_dep+1:,:]), dim=-2, keepdim=True) + v_norm.to(Z).reshape(-1, 1, 1)
+            # assign bounds for joint j
+            u_ub.append(batchPolyZonotope(Z=torch.cat((c + buf - torque_limits[1,j], G), dim=-2), n_dep_gens=n_dep,
+                                          expMat=tau_nom[j].expMat, id=tau_nom[j].id))
+            u_lb.append(batchPolyZonotope(Z=torch.cat((-(c - buf) + torque_limits[0,j], -G), dim=-2), n_dep_gens=n_dep,
+                                          expMat=tau_nom[j].expMat, id=tau_nom[j].id))
         
-        # compute total input tortatotope
-        u_ub: list[list[polyZonotope]] = list()
-        u_lb: list[list[polyZonotope]] = list()
+        logger.debug(f"Generated input reachable set in {time.perf_counter() - start_time} s")
         
-        # joint limit constraint setup
-        for i in range(jrsInstance.n_t):
-            u_ub.append(list())
-            u_lb.append(list())
-            
-            for j in range(jrsInstance.n_q):
-                u_ub_tmp = tau_nom[i][j] + v_norm[i]
-                u_lb_tmp = tau_nom[i][j] - v_norm[i]
-                u_ub_tmp = u_ub_tmp.reduce_indep(jrsInstance.k_id[-1])
-                u_lb_tmp = u_lb_tmp.reduce_indep(jrsInstance.k_id[-1])
-                u_ub_buf = torch.sum(torch.abs(u_ub_tmp.Grest))
-                u_lb_buf = -torch.sum(torch.abs(u_lb_tmp.Grest))
-                # assign bounds at [i][j]
-                u_ub[i].append(polyZonotope(Z=[u_ub_tmp.c + u_ub_buf, u_ub_tmp.G], n_dep_gens=u_ub_tmp.n_dep_gens,
-                                            expmat=u_ub_tmp.expMat, id=u_ub_tmp.id) - self.robot.joints[j].torque_limit[1])
-                u_lb[i].append(polyZonotope(Z=[u_lb_tmp.c + u_lb_buf, u_lb_tmp.G], n_dep_gens=u_lb_tmp.n_dep_gens,
-                                            expmat=u_lb_tmp.expMat, id=u_lb_tmp.id) - self.robot.joints[j].torque_limit[0])
-                
-        # Save the generated reachable sets into the JLSInstance
-        return {1: IRSInstance(u_ub, u_lb, jrsInstance)}
\ No newline at end of file
+        # Save the generated reachable sets into the IRSInstance
+        return {1: IRSInstance(u_ub, u_lb, jrsInstance)}
+    
+    
+    @staticmethod
+    def abs_bound(pz: batchPolyZonotope) -> torch.Tensor:
+        '''
+        (n_t,) bound on the magnitude of a one dimensional set at each time step
+        '''
+        interval = pz.to_interval()
+        return torch.maximum(interval.inf.abs(), interval.sup.abs()).reshape(-1)
@@ -1,7 +1,7 @@
 from rtd.entity.states import EntityState
 from rtd.planner.reachsets import ReachSetGenerator
 from armour.reachsets import JLSInstance, JRSGenerator
-from zonopy import polyZonotope
+from zonopy import batchPolyZonotope
 import torch
 import numpy as np
 
@@ -19,6 +19,7 @@ class JLSGenerator(ReachSetGenerator):
         self.cache_max_size = 1
         self.robot = robot
         self.jrsGenerator: JRSGenerator = jrsGenerator
+        self.dependencies = [jrsGenerator]
     
     
     def generateReachableSet(self, robotState: EntityState) -> dict[int, JLSInstance]:
@@ -42,34 +43,27 @@ class JLSGenerator(ReachSetGenerator):
         
         logger.info("Generating joint limit set!")
         
-        q_ub: list[list[polyZonotope]] = list()
-        q_lb: list[list[polyZonotope]] = list()
-        dq_ub: list[list[polyZonotope]] = list()
-        dq_lb: list[list[polyZonotope]] = list()
+        q_ub: list[batchPolyZonotope] = list()
+        q_lb: list[batchPolyZonotope] = list()
+        dq_ub: list[batchPolyZonotope] = list()
+        dq_lb: list[batchPolyZonotope] = list()
+        
+        # joint limit constraint setup, where each joint's sets are batched
+        # over all the time steps. The independent generators are replaced
+        # by the buffer they add to the bounds, which is the same as
+        # reducing them first for these one dimensional sets
+        for j in range(jrsInstance.n_q):
+            for (lim_pz, limits, ub, lb) in ((jrsInstance.q[j], joint_state_limits, q_ub, q_lb),
+                                             (jrsInstance.dq[j], joint_speed_limits, dq_ub, dq_lb)):
+                n_dep = lim_pz.n_dep_gens
+                c = lim_pz.Z[...,:1,:]
+                G = lim_pz.Z[...,1:n_dep+1,:]
+                buf = torch.sum(torch.abs(lim_pz.Z[...,n_dep+1:,:]), dim=-2, keepdim=True)
+                # assign bounds for joint j
+                ub.append(batchPolyZonotope(Z=torch.cat((c + buf - limits[1,j], G), dim=-2), n_dep_gens=n_dep,
+                                            expMat=lim_pz.expMat, id=lim_pz.id))
+                lb.append(batchPolyZonotope(Z=torch.cat((-(c - buf) + limits[0,j], -G), dim=-2), n_dep_gens=n_dep,
+                                            expMat=lim_pz.expMat, id=lim_pz.id))
         
-        # joint limit constraint setup
-        for i in range(jrsInstance.n_t):
-            q_ub.append(list())
-            q_lb.append(list())
-            dq_ub.append(list())
-            dq_lb.append(list())
-            
-            for j in range(jrsInstance.n_q):
-                q_lim_tmp = jrsInstance.q[i][j]
-                dq_lim_tmp = jrsInstance.dq[i][j]
-                q_lim_tmp = q_lim_tmp.reduce_indep(jrsInstance.k_id[-1])
-                dq_lim_tmp = dq_lim_tmp.reduce_indep(jrsInstance.k_id[-1])
-                q_buf = torch.sum(torch.abs(q_lim_tmp.Grest))
-                dq_buf = torch.sum(torch.abs(dq_lim_tmp.Grest))
-                # assign bounds at [i][j]
-                q_ub[i].append(polyZonotope(Z=[q_lim_tmp.c + q_buf, q_lim_tmp.G], n_dep_gens=q_lim_tmp.n_dep_gens,
-                                            expmat=q_lim_tmp.expMat, id=q_lim_tmp.id) - joint_state_limits[1,j])
-                q_lb[i].append(-1*polyZonotope(Z=[q_lim_tmp.c + q_buf, q_lim_tmp.G], n_dep_gens=q_lim_tmp.n_dep_gens,
-                                               expmat=q_lim_tmp.expMat, id=q_lim_tmp.id) + joint_state_limits[0,j])
-                dq_ub[i].append(polyZonotope(Z=[dq_lim_tmp.c + dq_buf, dq_lim_tmp.G], n_dep_gens=dq_lim_tmp.n_dep_gens,
-                                             expmat=dq_lim_tmp.expMat, id=dq_lim_tmp.id) - joint_speed_limits[1,j])
-                dq_lb[i].append(-1*polyZonotope(Z=[dq_lim_tmp.c + dq_buf, dq_lim_tmp.G], n_dep_gens=dq_lim_tmp.n_dep_gens,
-                                                expmat=dq_lim_tmp.expMat, id=dq_lim_tmp.id) + joint_speed_limits[0,j])
-                
         # Save the generated reachable sets into the JLSInstance
         return {1: JLSInstance(q_ub, q_lb, dq_ub, dq_lb, jrsInstance)}
\ No newline at end of file
@@ -1,10 +1,15 @@
 from rtd.entity.states import EntityState
 from rtd.planner.reachsets import ReachSetGenerator
 from armour.reachsets import JRSInstance
-import zonopyrobots as zpr
 # from zonopy.joint_reachable_set.gen_jrs import JrsGenerator as ZonoJRSGenerator
 # import zonopy.trajectories as zpt
 import numpy as np
+import torch
+import hashlib
+import tempfile
+import importlib.metadata
+import inspect
+import os
 
 # define top level module logger
 import logging
@@ -16,25 +21,67 @@ class JRSGenerator(ReachSetGenerator):
     '''
     JointReachableSetsOnline
     This does the online computation of joint reachable sets. It then
-    generates a JRSInstance object
+    generates a JRSInstance object. If a `cache_dir` is given, the computed
+    sets are also saved there as plain tensors, keyed by `cacheKey`, and
+    loaded back by any generator for the same robot, settings and version
+    of zonopy, including ones in other processes
     '''
+    # outputs of zonopy's JRS generator which are used by the JRSInstance
+    jrs_keys = ('q_ref', 'qd_ref', 'qdd_ref', 'q', 'qd', 'qd_aux', 'qdd_aux', 'R_ref', 'R')
+    # zonopy types which can be saved to the cache directory
+    saved_types = ('polyZonotope', 'batchPolyZonotope', 'matPolyZonotope', 'batchMatPolyZonotope')
+    # version of the saved format
+    save_version = 2
+    # torch 2.1 added memory mapped loading, where only the tensors which
+    # are used get paged in
+    load_mmap = 'mmap' in inspect.signature(torch.load).parameters
+    
     def __init__(self, robot, taylor_degree: int = 1, add_ultimate_bound: bool = True,
-                 traj_type: str = "piecewise"):
+                 traj_type: str = "piecewise", cache_dir: str = None):
         # initialize base classes
         ReachSetGenerator.__init__(self)
         # set properties
         self.cache_max_size = 1
+        self.robot = robot.params
+        self.robot_hash = self.urdfHash(robot.urdf)
+        self.cache_dir = cache_dir
+        self.library_versions = self.libraryVersions()
         #self.controller = robot.controller
         self.taylor_degree = taylor_degree
         self.add_ultimate_bound = add_ultimate_bound
         self.traj_type = traj_type
-        # initialize zonopy's JRSGenerator
+        # initialize zonopy's JRSGenerator, where zonopy-robots is
+        # installed separately so it's only needed here
+        import zonopyrobots as zpr
         traj_class = zpr.trajectory.PiecewiseArmTrajectory if traj_type=="piecewise" else zpr.trajectory.BernsteinArmTrajectory
         self._jrnsgen = zpr.JrsGenerator(robot.params, traj_class, k_r=None, # k_r=self.controller.k_r
                                          ultimate_bound=None, # ultimate_bound=self.controller.ultimate_bound
                                          batched=True, unique_tid=False)
     
     
+    def cacheIdentity(self) -> tuple:
+        '''
+        The robot and the JRS settings change the generated sets
+        '''
+        return ReachSetGenerator.cacheIdentity(self) + (self.robot_hash, self.traj_type,
+                                                        self.taylor_degree, self.add_ultimate_bound,
+                                                        self.save_version, self.library_versions)
+    
+    
+    @staticmethod
+    def libraryVersions() -> tuple:
+        '''
+        Versions of zonopy and zonopyrobots, which generate the sets
+        '''
+        versions = list()
+        for name in ('zonopy', 'zonopyrobots'):
+            try:
+                versions.append(importlib.metadata.version(name))
+            except importlib.metadata.PackageNotFoundError:
+                versions.append(None)
+        return tuple(versions)
+    
+    
     def generateReachableSet(self, robotState: EntityState) -> dict[int, JRSInstance]:
         '''
         Obtains the relevant reachable set for the robotstate provided
@@ -46,8 +93,22 @@ class JRSGenerator(ReachSetGenerator):
         logger.info("Generating joint reachable set!")
         logger.info("The following message is from create_jrs_online")
         
-        # generate it online
-        zonojrs = self._jrnsgen.gen_JRS(robotState.position, robotState.velocity, robotState.acceleration, self.taylor_degree)
+        # the parameter range depends on the velocity the set is
+        # generated for
+        g_k_orig = np.minimum(np.maximum(np.pi/24, np.abs(robotState.velocity/3)), np.pi/3)
+        
+        # load it from the cache directory or generate it online. With a
+        # cache tolerance, the saved set may be for a nearby state, so it
+        # comes with the parameter range it was generated with
+        zonojrs = None
+        if self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, f"jrs-{self.cacheKey(robotState, dict())}.pt")
+            zonojrs = self.loadJRS(path)
+        if zonojrs is None:
+            zonojrs = self._jrnsgen.gen_JRS(robotState.position, robotState.velocity, robotState.acceleration, self.taylor_degree)
+            zonojrs = dict(zonojrs, g_k_orig=g_k_orig)
+            if self.cache_dir is not None:
+                self.saveJRS(path, zonojrs)
         rs.q_des = zonojrs['q_ref']
         rs.dq_des = zonojrs['qd_ref']
         rs.ddq_des = zonojrs['qdd_ref']
@@ -69,11 +130,124 @@ class JRSGenerator(ReachSetGenerator):
             'n_q': n_q,
             'n_k': n_k,
             'c_k_orig': np.zeros(n_k),
-            'g_k_orig': np.minimum(np.maximum(np.pi/24, np.abs(robotState.velocity/3)), np.pi/3),
+            'g_k_orig': np.asarray(zonojrs['g_k_orig'], dtype=float),
             'c_k_bernstein': np.zeros(n_q),
             'g_k_bernstein': np.pi/36 * np.ones(n_q),
         }
          
         # initialize this particular instance and run
         rs.initialize(self.traj_type)
-        return {1: rs}
\ No newline at end of file
+        return {1: rs}
+    
+    
+    @classmethod
+    def saveJRS(cls, path: str, zonojrs: dict):
+        '''
+        Save the outputs of zonopy's JRS generator to `path`, as the
+        tensors of each set. The file is written next to it first and
+        then moved in place, so other processes never see a partially
+        written set
+        '''
+        try:
+            saved = {key: [cls.packSet(pz) for pz in zonojrs[key]] for key in cls.jrs_keys}
+            saved['g_k_orig'] = torch.as_tensor(zonojrs['g_k_orig'], dtype=torch.double)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    torch.save(saved, f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except Exception:
+            logger.warning(f"Failed to save the joint reachable set to {path}", exc_info=True)
+    
+    
+    @classmethod
+    def loadJRS(cls, path: str, set_types: dict[str, type] = None) -> dict | None:
+        '''
+        Load the outputs of zonopy's JRS generator saved at `path`, memory
+        mapped if the installed torch supports it. The sets are rebuilt
+        with `set_types` as in `unpackSet`. Returns None if there is no
+        valid set saved there
+        '''
+        if not os.path.isfile(path):
+            return None
+        try:
+            if set_types is None:
+                set_types = cls.setTypes()
+            load_args = {'mmap': True} if cls.load_mmap else dict()
+            saved = torch.load(path, map_location='cpu', weights_only=True, **load_args)
+            zonojrs = {key: [cls.unpackSet(packed, set_types) for packed in saved[key]] for key in cls.jrs_keys}
+            zonojrs['g_k_orig'] = saved['g_k_orig'].numpy()
+        except Exception:
+            logger.warning(f"Failed to load the joint reachable set from {path}", exc_info=True)
+            return None
+        logger.info(f"Loaded joint reachable set from {path}")
+        return zonojrs
+    
+    
+    @classmethod
+    def packSet(cls, pz) -> dict:
+        '''
+        The type name and tensors of a zonopy polynomial zonotope
+        '''
+        name = type(pz).__name__
+        if name not in cls.saved_types:
+            raise TypeError(f"Can't save sets of type {name}!")
+        return {
+            'type': name,
+            'Z': pz.Z,
+            'n_dep_gens': int(pz.n_dep_gens),
+            'expMat': pz.expMat,
+            'id': torch.as_tensor(pz.id),
+        }
+    
+    
+    @classmethod
+    def setTypes(cls) -> dict[str, type]:
+        '''
+        The zonopy types of the saved sets, by name
+        '''
+        import zonopy as zp
+        return {name: getattr(zp, name) for name in cls.saved_types}
+    
+    
+    @classmethod
+    def unpackSet(cls, packed: dict, set_types: dict[str, type] = None):
+        '''
+        Rebuild the zonopy polynomial zonotope packed by `packSet`, using
+        the type of the same name from `set_types`, or zonopy's types if
+        it isn't given
+        '''
+        if packed['type'] not in cls.saved_types:
+            raise TypeError(f"Can't load sets of type {packed['type']}!")
+        if set_types is None:
+            set_types = cls.setTypes()
+        pz_type = set_types[packed['type']]
+        return pz_type(packed['Z'], n_dep_gens=packed['n_dep_gens'], expMat=packed['expMat'],
+                       id=packed['id'].numpy(), compress=0, copy_Z=False)
+    
+    
+    @staticmethod
+    def urdfHash(urdf) -> str:
+        '''
+        Hash of the kinematic and inertial properties of the robot's URDF
+        '''
+        key = hashlib.sha1()
+        key.update(repr(urdf.name).encode())
+        for joint in urdf.joints:
+            limit = joint.limit
+            key.update(repr((joint.name, joint.joint_type, joint.parent, joint.child)).encode())
+            key.update(np.asarray(joint.origin, dtype=np.float64).tobytes())
+            key.update(np.asarray(joint.axis, dtype=np.float64).tobytes())
+            if limit is not None:
+                key.update(repr((limit.lower, limit.upper, limit.effort, limit.velocity)).encode())
+        for link in urdf.links:
+            key.update(repr(link.name).encode())
+            if link.inertial is not None:
+                key.update(repr(link.inertial.mass).encode())
+                key.update(np.asarray(link.inertial.inertia, dtype=np.float64).tobytes())
+                key.update(np.asarray(link.inertial.origin, dtype=np.float64).tobytes())
+        return key.hexdigest()
\ No newline at end of file
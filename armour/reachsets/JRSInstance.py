@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, NamedTuple
 from rtd.planner.reachsets import ReachSetInstance
 from rtd.sim.world import WorldState
 import numpy as np
@@ -62,4 +62,31 @@ class JRSInstance(ReachSetInstance):
         Returns a function handle for the nlconstraint generated
         where the function's return type is [c, ceq, gc, gceq]
         '''
-        return None
\ No newline at end of file
+        return None
+
+
+
+class JRSParams(NamedTuple):
+    '''
+    The parts of a JRSInstance a trajectory needs to scale its parameters,
+    kept by trajectories instead of the instance so the tensors of the
+    reachable sets can be freed once a plan is done
+    '''
+    n_q: int
+    input_range: Boundsnp
+    output_range: Boundsnp
+    
+    
+    @staticmethod
+    def fromInstance(jrsInstance: 'JRSInstance | JRSParams') -> 'JRSParams':
+        '''
+        Copy the scaling of a JRSInstance into read-only arrays. JRSParams
+        and None are returned as they are
+        '''
+        if jrsInstance is None or isinstance(jrsInstance, JRSParams):
+            return jrsInstance
+        input_range = np.array(jrsInstance.input_range, dtype=np.double)
+        output_range = np.array(jrsInstance.output_range, dtype=np.double)
+        input_range.flags.writeable = False
+        output_range.flags.writeable = False
+        return JRSParams(int(jrsInstance.n_q), input_range, output_range)
@@ -0,0 +1,141 @@
+import torch
+import numpy as np
+import hashlib
+import threading
+
+# define top level module logger
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+class ObstaclePolytopeCache:
+    '''
+    Cache of the parts of the obstacle polytopes that don't depend on the
+    forward occupancy
+    
+    The halfspaces of a 3D zonotope are normal to the cross products of
+    each pair of its generators. For an obstacle buffered by the forward
+    occupancy, the normals of the obstacle's own generator pairs and their
+    contribution to the offsets stay the same every planning cycle, so they
+    are stored by the hash of the obstacle's `Z`. Entries of obstacles which
+    aren't seen in a cycle are dropped with `prune`. The generator pairs
+    are read from the shared `combs` table of `FOGenerator` when it is
+    large enough
+    '''
+    def __init__(self, combs: tuple[torch.Tensor, ...] = None):
+        # hash of Z: (center, generators, normals, offsets of the normals)
+        self._entries: dict[str, tuple[torch.Tensor, ...]] = dict()
+        # pairs of generator indices, by number of generators
+        self.combs = combs
+        self._lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+    
+    
+    @staticmethod
+    def obstacleKey(obs) -> str:
+        '''
+        Hash of the content of an obstacle's zonotope
+        '''
+        Z = np.ascontiguousarray(obs.Z.detach().cpu().numpy(), dtype=np.float64)
+        return hashlib.sha1(str(Z.shape).encode() + Z.tobytes()).hexdigest()
+    
+    
+    def obstacleData(self, obs, key: str = None) -> tuple[torch.Tensor, ...]:
+        '''
+        Get the center, generators, normals of the generator pairs and
+        their offsets for the obstacle, computing them if the obstacle
+        changed or is new
+        '''
+        if key is None:
+            key = self.obstacleKey(obs)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return self._entries[key]
+        
+        Z = obs.Z.detach().cpu().to(dtype=torch.double)
+        c = Z[0]
+        G = Z[1:]
+        normals = self.pairNormals(G, G, triangular=True)
+        offsets = (normals @ G.T).abs().sum(-1)
+        data = (c, G, normals, offsets)
+        with self._lock:
+            self._entries[key] = data
+            self.misses += 1
+        return data
+    
+    
+    def prune(self, keys: set[str]):
+        '''
+        Drop the entries of all obstacles except the given ones
+        '''
+        with self._lock:
+            for key in set(self._entries) - set(keys):
+                del self._entries[key]
+    
+    
+    def polytope(self, obs, G_buf: torch.Tensor, key: str = None) -> tuple[torch.Tensor, torch.Tensor]:
+        '''
+        Halfspace representation `A x <= b` of the obstacle buffered by
+        the generators `G_buf`, like zonopy's `batchZonotope.polytope`
+        of the concatenated zonotope. Halfspaces from parallel generators
+        are NaN
+        
+        Arguments:
+            obs: Obstacle with a (n_obs_gens+1, 3) zonotope `Z`
+            G_buf: torch.Tensor: (n_t, n_buf_gens, 3) generators to buffer the obstacle with
+            key: str: Optional precomputed `obstacleKey` of the obstacle
+        
+        Returns:
+            (A: torch.Tensor, b: torch.Tensor): the (n_t, n_h, 3) normals and (n_t, n_h) offsets
+        '''
+        (c, G_obs, normals_obs, offsets_obs) = (t.to(G_buf) for t in self.obstacleData(obs, key))
+        n_t = G_buf.shape[0]
+        
+        # normals of the obstacle-buffer and buffer-buffer generator pairs
+        normals = torch.cat((normals_obs.expand(n_t, -1, -1),
+                             self.pairNormals(G_obs.expand(n_t, -1, -1), G_buf),
+                             self.pairNormals(G_buf, G_buf, triangular=True)), dim=-2)
+        
+        # offsets, where only the obstacle normals reuse their obstacle part
+        n_obs_normals = normals_obs.shape[0]
+        offsets = (normals @ G_buf.transpose(-1, -2)).abs().sum(-1)
+        offsets[:,:n_obs_normals] += offsets_obs
+        offsets[:,n_obs_normals:] += (normals[:,n_obs_normals:] @ G_obs.T).abs().sum(-1)
+        
+        d = normals @ c
+        A = torch.cat((normals, -normals), dim=-2)
+        b = torch.cat((d + offsets, -d + offsets), dim=-1)
+        return A, b
+    
+    
+    def pairIndices(self, n: int) -> tuple[torch.Tensor, torch.Tensor]:
+        '''
+        Indices (i, j) of the pairs i < j of `n` generators, from the
+        shared table if it covers `n` generators
+        '''
+        if self.combs is not None and 1 < n <= len(self.combs):
+            return self.combs[n-1].T
+        return torch.triu_indices(n, n, 1)
+    
+    
+    def pairNormals(self, G1: torch.Tensor, G2: torch.Tensor, triangular: bool = False) -> torch.Tensor:
+        '''
+        Unit normals of the planes spanned by the generators of `G1` and
+        `G2`, for every pair or only the pairs i < j if `triangular`
+        
+        Arguments:
+            G1: torch.Tensor: (..., n_1, 3) generators
+            G2: torch.Tensor: (..., n_2, 3) generators
+        
+        Returns:
+            torch.Tensor: (..., n_pairs, 3) normals
+        '''
+        if triangular:
+            (i, j) = self.pairIndices(G1.shape[-2])
+            normals = torch.linalg.cross(G1[...,i,:], G2[...,j,:])
+        else:
+            normals = torch.linalg.cross(G1.unsqueeze(-2), G2.unsqueeze(-3)).flatten(-3, -2)
+        return normals / torch.linalg.norm(normals, dim=-1, keepdim=True)
@@ -0,0 +1,115 @@
+from rtd.functional.polynomials import monomials
+import torch
+import numpy as np
+
+
+
+class PolyZonotopeConstraints:
+    '''
+    Constraints `h(k) <= 0` given by the supremum of one dimensional
+    polynomial zonotopes sliced at `k`
+    
+    Each constraint is `h_i(k) = c_i + sum_j G_ij prod_l k_l^expMat[i,j,l] + r_i`,
+    where `r_i` is the radius of the independent generators. The
+    coefficients of all constraints are stacked and padded to the same
+    number of dependent generators, so all the constraints and their
+    full Jacobian are evaluated with one vectorized monomial evaluation
+    '''
+    def __init__(self, c: torch.Tensor, G: torch.Tensor, expMat: torch.Tensor, radius: torch.Tensor):
+        '''
+        Arguments:
+            c: torch.Tensor: (n_c,) centers
+            G: torch.Tensor: (n_c, n_gens) dependent generators, zero where padded
+            expMat: torch.Tensor: (n_c, n_gens, n_k) exponents of each of the parameters
+            radius: torch.Tensor: (n_c,) radii of the independent generators
+        '''
+        self.c = c
+        self.G = G
+        self.expMat = expMat
+        self.radius = radius
+        self.n_c = c.shape[0]
+        self.n_k = expMat.shape[-1]
+    
+    
+    @staticmethod
+    def fromPolyZonotopes(pzs: list, n_k: int) -> 'PolyZonotopeConstraints':
+        '''
+        Stack one dimensional polyZonotopes, where the ids are matched to
+        the parameters in sorted order like zonopy's `slice_all_dep`
+        '''
+        n_c = len(pzs)
+        n_gens = max((pz.n_dep_gens for pz in pzs), default=0)
+        c = torch.zeros(n_c, dtype=torch.double)
+        G = torch.zeros((n_c, n_gens), dtype=torch.double)
+        expMat = torch.zeros((n_c, n_gens, n_k), dtype=torch.double)
+        radius = torch.zeros(n_c, dtype=torch.double)
+        
+        for (i, pz) in enumerate(pzs):
+            n_dep = pz.n_dep_gens
+            n_ids = len(pz.id)
+            c[i] = pz.c.cpu().reshape(-1)[0]
+            G[i,:n_dep] = pz.G.cpu().reshape(-1)
+            expMat[i,:n_dep,:n_ids] = torch.as_tensor(pz.expMat).cpu()[:,torch.argsort(torch.as_tensor(pz.id))]
+            radius[i] = pz.Grest.cpu().abs().sum()
+        return PolyZonotopeConstraints(c, G, expMat, radius)
+    
+    
+    @staticmethod
+    def fromBatchPolyZonotopes(bpzs: list, n_k: int, prune: bool = True) -> 'PolyZonotopeConstraints':
+        '''
+        Stack the batch elements of one dimensional batchPolyZonotopes,
+        where the ids are matched to the parameters in sorted order like
+        zonopy's `slice_all_dep`. If `prune` is set, only the elements
+        whose interval reaches zero, and so may be active, are kept
+        '''
+        c = list()
+        G = list()
+        expMat = list()
+        radius = list()
+        
+        for bpz in bpzs:
+            n_dep = bpz.n_dep_gens
+            n_ids = len(bpz.id)
+            Z = bpz.Z.cpu().reshape(-1, bpz.Z.shape[-2])
+            bpz_c = Z[:,0]
+            bpz_G = Z[:,1:n_dep+1]
+            bpz_radius = Z[:,n_dep+1:].abs().sum(-1)
+            if prune:
+                active = bpz_c + bpz_G.abs().sum(-1) + bpz_radius >= 0
+                (bpz_c, bpz_G, bpz_radius) = (bpz_c[active], bpz_G[active], bpz_radius[active])
+            
+            bpz_expMat = torch.zeros((n_dep, n_k), dtype=torch.double)
+            bpz_expMat[:,:n_ids] = torch.as_tensor(bpz.expMat).cpu()[:,torch.argsort(torch.as_tensor(bpz.id))]
+            c.append(bpz_c)
+            G.append(bpz_G)
+            expMat.append(bpz_expMat.expand(bpz_c.shape[0], -1, -1))
+            radius.append(bpz_radius)
+        
+        # pad to the same number of dependent generators
+        n_gens = max((bpz_G.shape[-1] for bpz_G in G), default=0)
+        pad = lambda t, dim: torch.nn.functional.pad(t, (0, 0)*dim + (0, n_gens - t.shape[-1-dim]))
+        return PolyZonotopeConstraints(torch.cat(c) if c else torch.zeros(0, dtype=torch.double),
+                                       torch.cat([pad(t, 0) for t in G]) if G else torch.zeros((0, 0), dtype=torch.double),
+                                       torch.cat([pad(t, 1) for t in expMat]) if expMat else torch.zeros((0, 0, n_k), dtype=torch.double),
+                                       torch.cat(radius) if radius else torch.zeros(0, dtype=torch.double))
+    
+    
+    def __call__(self, k) -> tuple:
+        (h, heq, grad_h, grad_heq) = self.batch(np.asarray(k)[np.newaxis])
+        return (h[0], heq, grad_h[0], grad_heq)
+    
+    
+    def batch(self, k) -> tuple:
+        '''
+        Evaluate the constraints and their (n_c, n_k) gradients for a
+        (n_batch, n_k) batch of inputs
+        '''
+        k = np.atleast_2d(k)
+        n_batch = k.shape[0]
+        k_tensor = torch.as_tensor(k[:,:self.n_k], dtype=torch.double)
+        mono, grad_mono = monomials(k_tensor[:,None,:], self.expMat)
+        
+        h = self.c + torch.einsum('cg,bcg->bc', self.G, mono) + self.radius
+        grad_h = np.zeros((n_batch, self.n_c, k.shape[1]))
+        grad_h[...,:self.n_k] = torch.einsum('cg,bcgi->bci', self.G, grad_mono).numpy()
+        return (h.numpy(), None, grad_h, None)
@@ -0,0 +1,91 @@
+from rtd.util.mixins import Options
+
+# define top level module logger
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+class ReductionPolicy(Options):
+    '''
+    Orders of the zonotope reductions in the forward occupancy pipeline
+    
+    There are three stages. The `kinematics` order is used by the forward
+    kinematics and the forward occupancy of every link. The `occupancy`
+    order further reduces the forward occupancy of a link when it is
+    generated, or not at all if it is None. The `constraint` order reduces
+    the forward occupancy of a link before the obstacle polytopes are
+    built, so it sets the number of halfspaces of each constraint.
+    
+    The `occupancy` and `constraint` orders can be set per link index with
+    `link_orders`, such as `{0: {"constraint": 5}}`. If `far_distance` is
+    set, link-obstacle pairs where the center of the forward occupancy
+    stays at least that far from the bounding box of the obstacle use
+    `far_order` as their constraint order instead
+    '''
+    STAGES = ("kinematics", "occupancy", "constraint")
+    
+    
+    @staticmethod
+    def defaultoptions() -> dict:
+        return {
+            "kinematics_order": 20,
+            "occupancy_order": None,
+            "constraint_order": 3,
+            "link_orders": {},
+            "far_distance": None,
+            "far_order": 1,
+        }
+    
+    
+    def __init__(self, **options):
+        # initialize base classes
+        Options.__init__(self)
+        # initialize using given options
+        options = self.mergeoptions(options)
+        self.kinematics_order: int = options["kinematics_order"]
+        self.occupancy_order: int = options["occupancy_order"]
+        self.constraint_order: int = options["constraint_order"]
+        self.link_orders: dict[int, dict[str, int]] = options["link_orders"]
+        self.far_distance: float = options["far_distance"]
+        self.far_order: int = options["far_order"]
+    
+    
+    @property
+    def adaptive(self) -> bool:
+        '''
+        If the constraint order depends on the clearance of the pairs
+        '''
+        return self.far_distance is not None
+    
+    
+    def order(self, stage: str, link: int = None, clearance: float = None) -> int | None:
+        '''
+        Get the reduction order of a stage
+        
+        Arguments:
+            stage: str: One of `kinematics`, `occupancy` or `constraint`
+            link: int: Optional index of the link, for the per link orders
+            clearance: float: Optional distance from the center of the
+                link's forward occupancy to the obstacle, for the constraint stage
+        
+        Returns:
+            int | None: The order, or None if the stage doesn't reduce
+        '''
+        match stage:
+            case "kinematics":
+                return self.kinematics_order
+            case "occupancy":
+                order = self.occupancy_order
+            case "constraint":
+                if self.adaptive and clearance is not None and clearance >= self.far_distance:
+                    return self.far_order
+                order = self.constraint_order
+            case _:
+                raise ValueError(f"stage must be one of {self.STAGES}!")
+        return self.link_orders.get(link, dict()).get(stage, order)
+    
+    
+    def __str__(self) -> str:
+        return (f"Reduction policy {repr(self)} with options:\n" +
+                "".join(f"   {key}: {value}\n" for (key, value) in self.getoptions().items()))
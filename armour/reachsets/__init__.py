@@ -1,8 +1,27 @@
-from armour.reachsets.JRSInstance import JRSInstance
+from armour.reachsets.PolyZonotopeConstraints import PolyZonotopeConstraints
+from armour.reachsets.JRSInstance import JRSInstance, JRSParams
 from armour.reachsets.JRSGenerator import JRSGenerator
-from armour.reachsets.JLSInstance import JLSInstance
-from armour.reachsets.JLSGenerator import JLSGenerator
-from armour.reachsets.IRSInstance import IRSInstance
-from armour.reachsets.IRSGenerator import IRSGenerator
-from armour.reachsets.FOInstance import FOInstance
-from armour.reachsets.FOGenerator import FOGenerator
\ No newline at end of file
+from armour.reachsets.ObstaclePolytopeCache import ObstaclePolytopeCache
+from armour.reachsets.ReductionPolicy import ReductionPolicy
+
+# the rest of the reachable sets are built with zonopy, which is installed
+# separately, so without it only the classes above can be used
+_zonopy_classes = ("JLSInstance", "JLSGenerator", "IRSInstance", "IRSGenerator",
+                   "FOInstance", "FOGenerator")
+try:
+    from armour.reachsets.JLSInstance import JLSInstance
+    from armour.reachsets.JLSGenerator import JLSGenerator
+    from armour.reachsets.IRSInstance import IRSInstance
+    from armour.reachsets.IRSGenerator import IRSGenerator
+    from armour.reachsets.FOInstance import FOInstance
+    from armour.reachsets.FOGenerator import FOGenerator
+except ModuleNotFoundError as e:
+    if e.name not in ("zonopy", "zonopyrobots"):
+        raise
+    _zonopy_error = e
+    
+    def __getattr__(name: str):
+        if name in _zonopy_classes:
+            raise ModuleNotFoundError(f"{__name__}.{name} needs {_zonopy_error.name}, which isn't installed",
+                                      name=_zonopy_error.name) from _zonopy_error
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,9 @@
 from rtd.entity.states import EntityState
 from rtd.planner.reachsets import ReachSetInstance
-from rtd.planner.trajectory import TrajectoryFactory, InvalidTrajectory
+from rtd.planner.trajectory import Trajectory, TrajectoryFactory, InvalidTrajectory
 from rtd.planner.trajopt import TrajOptProps
 from armour.reachsets import JRSInstance
+from rtd.functional.vectools import rescale
 from armour.trajectory import PiecewiseArmTrajectory, ZeroHoldArmTrajectory, BernsteinArmTrajectory
 from rtd.util.mixins.Typings import Vecnp
 
@@ -47,4 +48,36 @@ class ArmTrajectoryFactory(TrajectoryFactory):
         
         if trajectoryParams is not None:
             trajectory.setParameters(trajectoryParams)
-        return trajectory
\ No newline at end of file
+        return trajectory
+    
+    
+    def getInitialGuess(self, trajectory: Trajectory, robotState: EntityState,
+                        rsInstances: dict[str, ReachSetInstance] = None,
+                        jrsInstance: JRSInstance = None) -> Vecnp | None:
+        '''
+        Re-express the previous trajectory in the parameters of the JRS
+        of the new state. A piecewise trajectory keeps its acceleration,
+        and a bernstein trajectory keeps its final position, which is
+        made relative to the new start position
+        '''
+        if trajectory is None or not trajectory.validate():
+            return None
+        if jrsInstance is None:
+            try:
+                jrsInstance = rsInstances["jrs"]
+            except:
+                return None
+        
+        if isinstance(trajectory, PiecewiseArmTrajectory):
+            value = trajectory.q_ddot.reshape(-1)
+        elif isinstance(trajectory, BernsteinArmTrajectory):
+            value = trajectory.q_end.reshape(-1) - robotState.position
+        else:
+            return None
+        if value.size != jrsInstance.n_q:
+            return None
+        
+        # invert the scaling of the new JRS, clamping to its input range
+        jout = jrsInstance.output_range
+        jin = jrsInstance.input_range
+        return rescale(value, jin[0], jin[1], jout[0], jout[1])
\ No newline at end of file
@@ -1,16 +1,18 @@
 from rtd.planner.trajectory import Trajectory, InvalidTrajectory
 from rtd.entity.states import ArmRobotState, EntityState
 from rtd.planner.trajopt import TrajOptProps
-from rtd.functional.vectools import rescale
-from armour.reachsets import JRSInstance
+from rtd.functional.vectools import rescale, rescale_gradient
+from armour.reachsets import JRSInstance, JRSParams
 from armour.legacy import bernstein_to_poly, match_deg5_bernstein_coefficients
+from rtd.functional.polynomials import horner
+from functools import lru_cache
 import numpy as np
-from rtd.util.mixins.Typings import Vecnp
+from rtd.util.mixins.Typings import Vecnp, Matnp
 
 
 
 class BernsteinArmTrajectory(Trajectory):
-    def __init__(self, trajOptProps: TrajOptProps, startState: ArmRobotState, jrsInstance: JRSInstance):
+    def __init__(self, trajOptProps: TrajOptProps, startState: ArmRobotState, jrsInstance: JRSInstance | JRSParams):
         # initialize base classes
         Trajectory.__init__(self)
         # set properties
@@ -19,27 +21,27 @@ class BernsteinArmTrajectory(Trajectory):
         # trajectory
         self.alpha = None
         self.q_end = None
-        # The JRS which contains the center and range to scale the
-        # parameters
-        self.jrsInstance = None
+        self.q_goal_grad = None
+        # The scaling of the JRS which contains the center and range to
+        # scale the parameters, without keeping the JRS itself alive
+        self.jrsParams: JRSParams = JRSParams.fromInstance(jrsInstance)
         # other properties
         self.trajOptProps = trajOptProps
         self.startState = startState
-        self.jrsInstance = jrsInstance
     
     
     def setParameters(self, trajectoryParams: Vecnp, startState: ArmRobotState = None,
-                      jrsInstance: JRSInstance = None):
+                      jrsInstance: JRSInstance | JRSParams = None):
         '''
         A validated method to set the parameters for the trajectory
         '''
         self.trajectoryParams = trajectoryParams
-        if self.trajectoryParams.size > self.jrsInstance.n_q:
-            self.trajectoryParams = self.trajectoryParams[:self.jrsInstance.n_q]
+        if self.trajectoryParams.size > self.jrsParams.n_q:
+            self.trajectoryParams = self.trajectoryParams[:self.jrsParams.n_q]
         if startState is not None:
             self.startState = startState
         if jrsInstance is not None:
-            self.jrsInstance = jrsInstance
+            self.jrsParams = JRSParams.fromInstance(jrsInstance)
         
         # perform internal update
         self.internalUpdate()
@@ -51,11 +53,11 @@ class BernsteinArmTrajectory(Trajectory):
         '''
         # non-empty
         valid = (self.trajectoryParams is not None)
-        valid &= (self.jrsInstance is not None)
+        valid &= (self.jrsParams is not None)
         valid &= (self.startState is not None)
         
         # trajectory params makes sense
-        valid &= (self.trajectoryParams.size == self.jrsInstance.n_q)
+        valid &= (self.trajectoryParams.size == self.jrsParams.n_q)
         
         # throw error if wanted
         if not valid and throwOnError:
@@ -72,28 +74,47 @@ class BernsteinArmTrajectory(Trajectory):
             return
         
         # get the desired final position
-        jout = self.jrsInstance.output_range
-        jin = self.jrsInstance.input_range
+        jout = self.jrsParams.output_range
+        jin = self.jrsParams.input_range
         q_goal = rescale(self.trajectoryParams, jout[0], jout[1], jin[0], jin[1])
-        q_goal = self.startState.q + q_goal
-        
-        n_q = self.jrsInstance.n_q
-        self.alpha = np.zeros((n_q, 6))
-        for j in range(n_q):
-            beta = match_deg5_bernstein_coefficients([
-                self.startState.position[j],
-                self.startState.velocity[j],
-                self.startState.acceleration[j],
-                q_goal[j],
-                0, 0],
-                self.trajOptProps.horizonTime
-            )
-            self.alpha[j,:] = bernstein_to_poly(beta, 6)
+        q_goal = self.startState.position + q_goal
+        self.q_goal_grad = rescale_gradient(self.trajectoryParams, jout[0], jout[1], jin[0], jin[1])
+        
+        self.alpha = self.polyCoefficients(q_goal)
         
         # precompute end position
         self.q_end = q_goal
     
     
+    def polyCoefficients(self, q_goal: Matnp) -> np.ndarray:
+        '''
+        Monomial coefficients of the trajectory of every joint from the
+        start state to the (..., n_q) goal positions, as a (..., n_q, 6)
+        array, with one product with the precomputed coefficient matrix
+        '''
+        constraints = np.zeros(np.shape(q_goal) + (6,))
+        constraints[...,0] = self.startState.position
+        constraints[...,1] = self.startState.velocity
+        constraints[...,2] = self.startState.acceleration
+        constraints[...,3] = q_goal
+        return constraints @ self.coefficientMatrix(self.trajOptProps.horizonTime).T
+    
+    
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def coefficientMatrix(horizonTime: float) -> Matnp:
+        '''
+        The (6, 6) matrix taking the initial and final position, velocity
+        and acceleration of a joint to the monomial coefficients of its
+        degree 5 bernstein trajectory over the scaled time, computed once
+        per horizon from the linear maps of the legacy conversions
+        '''
+        matrix = np.stack([bernstein_to_poly(match_deg5_bernstein_coefficients(e, horizonTime), 6)
+                           for e in np.eye(6)], axis=-1)
+        matrix.flags.writeable = False
+        return matrix
+    
+    
     def getCommand(self, time: Vecnp) -> EntityState:
         # Do a parameter check and time check, and throw if anything is
         # invalid.
@@ -105,21 +126,10 @@ class BernsteinArmTrajectory(Trajectory):
         t_size = t_shifted.size
         horizon_mask = t_shifted < self.trajOptProps.horizonTime
         t_masked_scaled = t_shifted[horizon_mask] / self.trajOptProps.horizonTime
-        t_masked_size = t_masked_scaled.size
-        n_q = self.jrsInstance.n_q
-        
-        # original implementation adapted
-        q_des = np.zeros((n_q, t_masked_size))
-        q_dot_des = np.zeros((n_q, t_masked_size))
-        q_ddot_des = np.zeros((n_q, t_masked_size))
-        
-        for j in range(n_q):
-            for coef_idx in range(6):
-                q_des[j,:] += self.alpha[j,coef_idx]*np.power(t_masked_scaled, coef_idx)
-                if coef_idx > 0:
-                    q_dot_des[j,:] += coef_idx*self.alpha[j,coef_idx]*np.power(t_masked_scaled, coef_idx-1)
-                if coef_idx > 1:
-                    q_ddot_des[j,:] += coef_idx*(coef_idx-1)*self.alpha[j,coef_idx]*np.power(t_masked_scaled, coef_idx-2)
+        n_q = self.jrsParams.n_q
+        
+        # evaluate the polynomials and their derivatives for all joints
+        (q_des, q_dot_des, q_ddot_des) = self.evalPolynomials(self.alpha, t_masked_scaled)
         
         # move to a combined state variable
         pos_idx = np.arange(n_q)
@@ -138,4 +148,103 @@ class BernsteinArmTrajectory(Trajectory):
         command.time = time
         command.state = state
         
-        return command
\ No newline at end of file
+        return command
+    
+    
+    def getCommandBatch(self, trajectoryParams: Matnp, time: Vecnp) -> np.ndarray:
+        '''
+        Computes the states for a (n_batch, n_params) batch of parameters
+        at the given times in one vectorized computation, without
+        changing the parameters of this trajectory.
+        Returns a (n_batch, 3*n_q, n_time) array
+        '''
+        if self.startState is None or self.jrsParams is None:
+            raise InvalidTrajectory("Called trajectory object does not have a start state and JRS!")
+        n_q = self.jrsParams.n_q
+        trajectoryParams = np.atleast_2d(trajectoryParams)[:,:n_q]
+        t_shifted = np.atleast_1d(np.asarray(time - self.startState.time))
+        if trajectoryParams.shape[1] != n_q:
+            raise InvalidTrajectory("Called trajectory object does not have complete parameterization!")
+        if np.any(t_shifted < 0):
+            raise InvalidTrajectory("Invalid time provided to BernsteinArmTrajectory")
+        
+        horizon_mask = t_shifted < self.trajOptProps.horizonTime
+        t_masked_scaled = t_shifted[horizon_mask] / self.trajOptProps.horizonTime
+        
+        # get the desired final positions
+        jout = self.jrsParams.output_range
+        jin = self.jrsParams.input_range
+        q_goal = self.startState.position + rescale(trajectoryParams, jout[0], jout[1], jin[0], jin[1])
+        
+        # evaluate the polynomials and their derivatives for all of the
+        # trajectories at once
+        (q_des, q_dot_des, q_ddot_des) = self.evalPolynomials(self.polyCoefficients(q_goal), t_masked_scaled)
+        
+        # move to a combined state variable, holding the goal after the horizon
+        state = np.zeros((trajectoryParams.shape[0], n_q*3, t_shifted.size))
+        state[:,:n_q,horizon_mask] = q_des
+        state[:,n_q:2*n_q,horizon_mask] = q_dot_des / self.trajOptProps.horizonTime
+        state[:,2*n_q:,horizon_mask] = q_ddot_des / self.trajOptProps.horizonTime**2
+        state[:,:n_q,np.logical_not(horizon_mask)] = q_goal[...,np.newaxis]
+        return state
+    
+    
+    def getPositionGradient(self, time: Vecnp) -> Matnp:
+        '''
+        Computes the derivative of the position of each joint at the
+        given times with respect to the trajectory parameter of that
+        joint, as each joint only depends on its own parameter.
+        Returns a (n_q, n_time) array
+        '''
+        self.validate(throwOnError=True)
+        # chain with the derivative of the goal
+        return self.q_goal_grad[...,np.newaxis] * self.positionTimeGradient(time)
+    
+    
+    def getPositionGradientBatch(self, trajectoryParams: Matnp, time: Vecnp) -> np.ndarray:
+        '''
+        Computes `getPositionGradient` for a (n_batch, n_params) batch of
+        parameters. Returns a (n_batch, n_q, n_time) array
+        '''
+        if self.startState is None or self.jrsParams is None:
+            raise InvalidTrajectory("Called trajectory object does not have a start state and JRS!")
+        trajectoryParams = np.atleast_2d(trajectoryParams)[:,:self.jrsParams.n_q]
+        jout = self.jrsParams.output_range
+        jin = self.jrsParams.input_range
+        q_goal_grad = rescale_gradient(trajectoryParams, jout[0], jout[1], jin[0], jin[1])[...,np.newaxis]
+        return q_goal_grad * self.positionTimeGradient(time)
+    
+    
+    def positionTimeGradient(self, time: Vecnp) -> Vecnp:
+        '''
+        Derivative of the position of a joint at the given times with
+        respect to its goal position, which is the same for any parameters
+        '''
+        t_shifted = np.atleast_1d(np.asarray(time - self.startState.time))
+        if np.any(t_shifted < 0):
+            raise InvalidTrajectory("Invalid time provided to BernsteinArmTrajectory")
+        
+        horizon_mask = t_shifted < self.trajOptProps.horizonTime
+        t_masked_scaled = t_shifted[horizon_mask] / self.trajOptProps.horizonTime
+        
+        # the monomial coefficients are linear in the goal position
+        alpha_grad = self.coefficientMatrix(self.trajOptProps.horizonTime)[:,3]
+        
+        # position derivative with respect to the goal, which is held
+        # after the horizon
+        grad = np.ones(t_shifted.size)
+        grad[horizon_mask] = horner(alpha_grad, t_masked_scaled)
+        return grad
+    
+    
+    @staticmethod
+    def evalPolynomials(alpha: np.ndarray, t: Vecnp) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Evaluate the (..., 6) monomial coefficients and their first and
+        second derivatives at the scaled times with Horner's scheme,
+        returning the (..., n_time) values of each
+        '''
+        coef_idx = np.arange(6)
+        return (horner(alpha, t),
+                horner(alpha[...,1:]*coef_idx[1:], t),
+                horner(alpha[...,2:]*coef_idx[2:]*coef_idx[1:-1], t))
\ No newline at end of file
@@ -1,8 +1,8 @@
 from rtd.planner.trajectory import Trajectory, InvalidTrajectory
 from rtd.planner.trajopt import TrajOptProps
 from rtd.entity.states import ArmRobotState
-from armour.reachsets import JRSInstance
-from rtd.functional.vectools import rescale
+from armour.reachsets import JRSInstance, JRSParams
+from rtd.functional.vectools import rescale, rescale_gradient
 import numpy as np
 from rtd.util.mixins.Typings import Vec, Mat, Vecnp, Matnp, Bound, Bounds, Boundsnp
 
@@ -13,7 +13,7 @@ class PiecewiseArmTrajectory(Trajectory):
     PiecewiseArmTrajectory
     The original ArmTD trajectory with piecewise accelerations
     '''
-    def __init__(self, trajOptProps: TrajOptProps, startState: ArmRobotState, jrsInstance: JRSInstance):
+    def __init__(self, trajOptProps: TrajOptProps, startState: ArmRobotState, jrsInstance: JRSInstance | JRSParams):
         '''
         The PiecewiseArmTrajectory constructor, which simply sets parameters and
         attempts to call internalUpdate, a helper function made for this
@@ -26,28 +26,30 @@ class PiecewiseArmTrajectory(Trajectory):
         self.vectorized = True
         self.trajOptProps = trajOptProps
         self.startState = startState
-        self.jrsInstance = jrsInstance
+        # only the scaling of the JRS, so the JRS itself can be freed
+        self.jrsParams: JRSParams = JRSParams.fromInstance(jrsInstance)
         # precomputed values
         self.q_ddot: float = None
         self.q_peak: float = None
         self.q_dot_peak: float = None
         self.q_ddot_to_stop: float = None
         self.q_end: float = None
+        self.q_ddot_grad: float = None
     
     
     def setParameters(self, trajectoryParams: Vecnp, startState: ArmRobotState = None,
-                      jrsInstance: JRSInstance = None):
+                      jrsInstance: JRSInstance | JRSParams = None):
         '''
         Set the parameters of the trajectory, with a focus on the
         parameters as the state should be set from the constructor
         '''
         self.trajectoryParams = trajectoryParams
-        if self.trajectoryParams.size > self.jrsInstance.n_q:
-            self.trajectoryParams = self.trajectoryParams[:self.jrsInstance.n_q]
+        if self.trajectoryParams.size > self.jrsParams.n_q:
+            self.trajectoryParams = self.trajectoryParams[:self.jrsParams.n_q]
         if startState is not None:
             self.startState = startState
         if jrsInstance is not None:
-            self.jrsInstance = jrsInstance
+            self.jrsParams = JRSParams.fromInstance(jrsInstance)
         
         # perform internal update
         self.internalUpdate()
@@ -59,11 +61,11 @@ class PiecewiseArmTrajectory(Trajectory):
         '''
         # non-empty
         valid = (self.trajectoryParams is not None)
-        valid &= (self.jrsInstance is not None)
+        valid &= (self.jrsParams is not None)
         valid &= (self.startState is not None)
         
         # trajectory params makes sense
-        valid &= (self.trajectoryParams.size == self.jrsInstance.n_q)
+        valid &= (self.trajectoryParams.size == self.jrsParams.n_q)
         
         # throw error if wanted
         if not valid and throwOnError:
@@ -80,9 +82,10 @@ class PiecewiseArmTrajectory(Trajectory):
         q_dot_0 = self.startState.velocity[...,np.newaxis]
         
         # scale the parameters
-        jout = self.jrsInstance.output_range
-        jin = self.jrsInstance.input_range
+        jout = self.jrsParams.output_range
+        jin = self.jrsParams.input_range
         self.q_ddot = rescale(self.trajectoryParams, jout[0], jout[1], jin[0], jin[1])[...,np.newaxis]
+        self.q_ddot_grad = rescale_gradient(self.trajectoryParams, jout[0], jout[1], jin[0], jin[1])[...,np.newaxis]
         
         # compute the peak parameters
         self.q_peak = q_0 + q_dot_0*self.trajOptProps.planTime + 0.5*self.q_ddot*self.trajOptProps.planTime**2
@@ -113,8 +116,8 @@ class PiecewiseArmTrajectory(Trajectory):
         t_stop_vals = t_shifted[t_stop_mask] - self.trajOptProps.planTime
 
         # Create the combined state variable
-        t_size = time.size
-        n_q = self.jrsInstance.n_q
+        t_size = t_shifted.size
+        n_q = self.jrsParams.n_q
         pos_idx = np.arange(n_q)
         vel_idx = pos_idx + n_q
         acc_idx = vel_idx + n_q
@@ -145,4 +148,111 @@ class PiecewiseArmTrajectory(Trajectory):
         command.time = time
         command.state = state
         
-        return command
\ No newline at end of file
+        return command
+    
+    
+    def getCommandBatch(self, trajectoryParams: Matnp, time: Vecnp) -> np.ndarray:
+        '''
+        Computes the states for a (n_batch, n_params) batch of parameters
+        at the given times in one vectorized computation, without
+        changing the parameters of this trajectory.
+        Returns a (n_batch, 3*n_q, n_time) array
+        '''
+        if self.startState is None or self.jrsParams is None:
+            raise InvalidTrajectory("Called trajectory object does not have a start state and JRS!")
+        n_q = self.jrsParams.n_q
+        trajectoryParams = np.atleast_2d(trajectoryParams)[:,:n_q]
+        t_shifted = np.atleast_1d(np.asarray(time - self.startState.time))
+        if trajectoryParams.shape[1] != n_q:
+            raise InvalidTrajectory("Called trajectory object does not have complete parameterization!")
+        if np.any(t_shifted < 0):
+            raise InvalidTrajectory("Invalid time provided to PiecewiseArmTrajectory")
+        
+        # Mask the first and second half of the trajectory
+        t_plan = self.trajOptProps.planTime
+        t_plan_mask = t_shifted < t_plan
+        t_stop_mask = (t_shifted < self.trajOptProps.horizonTime) ^ t_plan_mask
+        t_hold_mask = np.logical_not(t_plan_mask|t_stop_mask)
+        t_plan_vals = t_shifted[t_plan_mask]
+        t_stop_vals = t_shifted[t_stop_mask] - t_plan
+        
+        # Compute the parameters of each trajectory, as (n_batch, n_q, 1)
+        q_0 = self.startState.position[...,np.newaxis]
+        q_dot_0 = self.startState.velocity[...,np.newaxis]
+        jout = self.jrsParams.output_range
+        jin = self.jrsParams.input_range
+        q_ddot = rescale(trajectoryParams, jout[0], jout[1], jin[0], jin[1])[...,np.newaxis]
+        q_peak = q_0 + q_dot_0*t_plan + 0.5*q_ddot*t_plan**2
+        q_dot_peak = q_dot_0 + q_ddot*t_plan
+        q_ddot_to_stop = (0-q_dot_peak) / (self.trajOptProps.horizonTime-t_plan)
+        q_end = q_peak + q_dot_peak*t_plan + 0.5*q_ddot_to_stop*t_plan**2
+        
+        # Compute the combined state of each trajectory
+        state = np.zeros((trajectoryParams.shape[0], n_q*3, t_shifted.size))
+        pos = state[:,:n_q]
+        vel = state[:,n_q:2*n_q]
+        acc = state[:,2*n_q:]
+        pos[...,t_plan_mask] = q_0 + q_dot_0*t_plan_vals + 0.5*q_ddot*t_plan_vals**2
+        vel[...,t_plan_mask] = q_dot_0 + q_ddot*t_plan_vals
+        acc[...,t_plan_mask] = q_ddot
+        pos[...,t_stop_mask] = q_peak + q_dot_peak*t_stop_vals + 0.5*q_ddot_to_stop*t_stop_vals**2
+        vel[...,t_stop_mask] = q_dot_peak + q_ddot_to_stop*t_stop_vals
+        acc[...,t_stop_mask] = q_ddot_to_stop
+        pos[...,t_hold_mask] = q_end
+        return state
+    
+    
+    def getPositionGradient(self, time: Vecnp) -> Matnp:
+        '''
+        Computes the derivative of the position of each joint at the
+        given times with respect to the trajectory parameter of that
+        joint, as each joint only depends on its own parameter.
+        Returns a (n_q, n_time) array
+        '''
+        self.validate(throwOnError=True)
+        # chain with the derivative of the acceleration
+        return self.q_ddot_grad * self.positionTimeGradient(time)
+    
+    
+    def getPositionGradientBatch(self, trajectoryParams: Matnp, time: Vecnp) -> np.ndarray:
+        '''
+        Computes `getPositionGradient` for a (n_batch, n_params) batch of
+        parameters. Returns a (n_batch, n_q, n_time) array
+        '''
+        if self.startState is None or self.jrsParams is None:
+            raise InvalidTrajectory("Called trajectory object does not have a start state and JRS!")
+        trajectoryParams = np.atleast_2d(trajectoryParams)[:,:self.jrsParams.n_q]
+        jout = self.jrsParams.output_range
+        jin = self.jrsParams.input_range
+        q_ddot_grad = rescale_gradient(trajectoryParams, jout[0], jout[1], jin[0], jin[1])[...,np.newaxis]
+        return q_ddot_grad * self.positionTimeGradient(time)
+    
+    
+    def positionTimeGradient(self, time: Vecnp) -> Vecnp:
+        '''
+        Derivative of the position of a joint at the given times with
+        respect to its acceleration, which is the same for any parameters
+        '''
+        t_shifted = np.atleast_1d(np.asarray(time - self.startState.time))
+        if np.any(t_shifted < 0):
+            raise InvalidTrajectory("Invalid time provided to PiecewiseArmTrajectory")
+        
+        # Mask the first and second half of the trajectory
+        t_plan = self.trajOptProps.planTime
+        t_plan_mask = t_shifted < t_plan
+        t_stop_mask = (t_shifted < self.trajOptProps.horizonTime) ^ t_plan_mask
+        t_plan_vals = t_shifted[t_plan_mask]
+        t_stop_vals = t_shifted[t_stop_mask] - t_plan
+        
+        # derivatives of the peak and stopping parameters with respect
+        # to the acceleration
+        q_peak_grad = 0.5*t_plan**2
+        q_dot_peak_grad = t_plan
+        q_ddot_to_stop_grad = -q_dot_peak_grad / (self.trajOptProps.horizonTime-t_plan)
+        q_end_grad = q_peak_grad + q_dot_peak_grad*t_plan + 0.5*q_ddot_to_stop_grad*t_plan**2
+        
+        # position derivative with respect to the acceleration
+        grad = np.full(t_shifted.size, q_end_grad)
+        grad[t_plan_mask] = 0.5*t_plan_vals**2
+        grad[t_stop_mask] = q_peak_grad + q_dot_peak_grad*t_stop_vals + 0.5*q_ddot_to_stop_grad*t_stop_vals**2
+        return grad
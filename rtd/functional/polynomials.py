@@ -0,0 +1,50 @@
+import torch
+
+
+
+def monomials(k: torch.Tensor, expMat: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+    '''
+    Evaluates the monomials prod_j k_j^expMat[i,j] and their gradients
+    with respect to k, broadcasting over any leading dimensions
+    
+    The gradient is computed from the products of the other factors, so it
+    is exact even where elements of k are zero
+    
+    Arguments:
+        k: torch.Tensor: (..., n_k) values of the variables
+        expMat: torch.Tensor: (..., n_mono, n_k) exponents of each monomial
+    
+    Returns:
+        (mono: torch.Tensor, grad_mono: torch.Tensor): the (..., n_mono)
+        monomials and their (..., n_mono, n_k) gradients
+    '''
+    k = k.unsqueeze(-2)
+    factors = k**expMat
+    mono = torch.prod(factors, dim=-1)
+    
+    # product of all factors but the j-th, from the exclusive cumulative
+    # products to the left and to the right of it
+    ones = torch.ones_like(factors[...,:1])
+    left = torch.cumprod(torch.cat((ones, factors[...,:-1]), dim=-1), dim=-1)
+    right = torch.cumprod(torch.cat((ones, factors.flip(-1)[...,:-1]), dim=-1), dim=-1).flip(-1)
+    derivative = torch.where(expMat > 0, expMat * k**(expMat - 1).clamp(min=0), torch.zeros_like(factors))
+    grad_mono = left * right * derivative
+    return mono, grad_mono
+
+
+def horner(coefs, t):
+    '''
+    Evaluates polynomials with Horner's scheme, broadcasting the
+    coefficients over the times
+    
+    Arguments:
+        coefs: (..., n_coefs) monomial coefficients in increasing degree
+        t: (n_t,) times to evaluate at
+    
+    Returns:
+        (..., n_t) values of the polynomials
+    '''
+    value = coefs[...,-1:] * t**0
+    for i in range(coefs.shape[-1]-2, -1, -1):
+        value = value*t + coefs[...,i:i+1]
+    return value
@@ -7,8 +7,10 @@ from rtd.util.mixins.Typings import Vecnp
 def rescale(vec: Vecnp, scale_min: float, scale_max: float,
             input_min: float = None, input_max: float = None, modify: bool = False) -> Vecnp:
     '''
-    clamps vec in the range [input_min, input_max], then rescales
-    elements of vec to land in the range [scale_min, scale_max].
+    clamps vec in the range [input_min, input_max], then linearly
+    rescales elements of vec from [input_min, input_max] to land in
+    the range [scale_min, scale_max]. If the input range isn't given,
+    the range of the values in vec is used instead.
     Modifies the original vec if modify=True
     '''
     # avoid modifying original
@@ -17,19 +19,33 @@ def rescale(vec: Vecnp, scale_min: float, scale_max: float,
     
     # clamp
     if input_min is not None:
-        vec = np.maximum(vec, input_min)
+        np.maximum(vec, input_min, out=vec)
+    else:
+        input_min = vec.min()
     if input_max is not None:
-        vec = np.minimum(vec, input_max)
+        np.minimum(vec, input_max, out=vec)
+    else:
+        input_max = vec.max()
     
     # rescale
-    scale_range = scale_max - scale_min
-    vec -= vec.min()                # vec = [0,vec.max()]
-    vec *= (scale_range/vec.max())  # vec = [0, scale_max - scale_min]
-    vec += scale_min                # vec = [scale_min, scale_max]
+    vec -= input_min                                        # vec = [0, input_max - input_min]
+    vec *= (scale_max - scale_min)/(input_max - input_min)  # vec = [0, scale_max - scale_min]
+    vec += scale_min                                        # vec = [scale_min, scale_max]
     
     return vec
 
 
+def rescale_gradient(vec: Vecnp, scale_min: float, scale_max: float,
+                     input_min: float, input_max: float) -> Vecnp:
+    '''
+    elementwise derivative of `rescale(vec, scale_min, scale_max,
+    input_min, input_max)` with respect to vec, which is zero for
+    the elements that get clamped
+    '''
+    unclamped = np.logical_and(vec >= input_min, vec <= input_max)
+    return unclamped * (scale_max - scale_min)/(input_max - input_min)
+
+
 def axang2rotm(axis: Vecnp, angle: float):
     r = Rotation.from_rotvec(angle * axis)
     return r.as_matrix()
\ No newline at end of file
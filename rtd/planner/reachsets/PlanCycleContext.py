@@ -0,0 +1,120 @@
+from rtd.planner.reachsets import ReachSetInstance
+from rtd.entity.states import EntityState
+from contextlib import contextmanager
+from typing import Callable
+import threading
+
+
+
+class PlanCycleContext:
+    '''
+    Memoization of the reachable sets generated within one planning cycle
+    
+    While a context is active, any request to a `ReachSetGenerator` for the
+    same generator and `cacheKey` of the robot state and extra arguments
+    returns the very same instances, regardless of `ignore_cache`. This ensures sets which other
+    generators build on (such as the JRS) are only generated once per plan.
+    A context is activated on the thread generating a set, so requests
+    made by a generator to its own dependencies are memoized as well. Use
+    it as a context manager to release all instances at the end of a cycle
+    '''
+    _active = threading.local()
+    
+    
+    def __init__(self):
+        # (generator id, cache key) to generated instances
+        self._instances: dict[tuple, dict[int, ReachSetInstance]] = dict()
+        # keep the generators alive so their ids stay unique in this cycle
+        self._keyed: list = list()
+        # per key locks so concurrent requests generate a set only once
+        self._keyLocks: dict[tuple, threading.Lock] = dict()
+        self._lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+    
+    
+    def __enter__(self) -> 'PlanCycleContext':
+        return self
+    
+    
+    def __exit__(self, *exc_info):
+        self.release()
+    
+    
+    def release(self):
+        '''
+        Drop all memoized instances at the end of the planning cycle
+        '''
+        with self._lock:
+            self._instances.clear()
+            self._keyed.clear()
+            self._keyLocks.clear()
+    
+    
+    def getReachableSet(self, generator, robotState: EntityState, generate: Callable,
+                        options: dict) -> dict[int, ReachSetInstance]:
+        '''
+        Return the memoized reachable set of `generator` for `robotState`
+        and `options`, calling `generate` with this context active to
+        create it if this is the first request of the cycle
+        
+        Arguments:
+            generator: ReachSetGenerator: The generator the set is requested from
+            robotState: EntityState: State the set is generated for
+            generate: Callable: Function with no arguments generating the set
+            options: dict: Extra arguments the set is generated with
+        
+        Returns:
+            dict: A dict of problem id to `ReachSetInstance` pairs
+        '''
+        key = (id(generator), generator.cacheKey(robotState, options))
+        with self._lock:
+            if key in self._instances:
+                self.hits += 1
+                return self._instances[key]
+            keyLock = self._keyLocks.setdefault(key, threading.Lock())
+        
+        with keyLock:
+            # another thread may have generated it while we waited
+            with self._lock:
+                if key in self._instances:
+                    self.hits += 1
+                    return self._instances[key]
+            
+            with self.activate():
+                reachableset = generate()
+            
+            with self._lock:
+                self._instances[key] = reachableset
+                self._keyed.append(generator)
+                self.misses += 1
+        return reachableset
+    
+    
+    @contextmanager
+    def activate(self):
+        '''
+        Make this the active context of the current thread
+        '''
+        stack = PlanCycleContext._stack()
+        stack.append(self)
+        try:
+            yield self
+        finally:
+            stack.pop()
+    
+    
+    @staticmethod
+    def current() -> 'PlanCycleContext | None':
+        '''
+        Returns the context active on the current thread, if any
+        '''
+        stack = PlanCycleContext._stack()
+        return stack[-1] if stack else None
+    
+    
+    @staticmethod
+    def _stack() -> list['PlanCycleContext']:
+        if not hasattr(PlanCycleContext._active, 'stack'):
+            PlanCycleContext._active.stack = list()
+        return PlanCycleContext._active.stack
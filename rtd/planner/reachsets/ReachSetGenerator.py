@@ -1,6 +1,11 @@
 from abc import ABCMeta, abstractmethod
-from rtd.planner.reachsets import ReachSetInstance
+from rtd.planner.reachsets import ReachSetInstance, PlanCycleContext
 from rtd.entity.states import EntityState
+from collections import OrderedDict
+import numpy as np
+import torch
+import hashlib
+import threading
 
 
 
@@ -9,18 +14,33 @@ class ReachSetGenerator(metaclass=ABCMeta):
     Base class for the generation of reacheable sets for the planner
     
     The ReachSetGenerator class interfaces out the generation of reachable
-    sets for the RTD planner. It contains a built-in cache which is enabled
-    if `cache_max_size > 0`. Caching is based on the id of the robot's state
-    and any extra arguments passed through the `getReachableSet` method. This
-    class can be used to encapsulate reachable sets generated offline, or the
+    sets for the RTD planner. It contains a built-in LRU cache which is
+    enabled if `cache_max_size > 0`, and can further be limited to
+    `cache_max_bytes` of tensors and arrays. Caching is based on the values
+    of the robot's state, rounded to `cache_tolerance` if set, any extra
+    arguments passed through the `getReachableSet` method and the
+    `cacheIdentity` of the generator. This class can be used to encapsulate reachable sets generated offline, or the
     online computation of reachable sets. It acts as a generator for a single
-    instance of ReachableSet
+    instance of ReachableSet. Generators which build on top of the reachable
+    sets of other generators should list them in `dependencies` so that the
+    planner can generate independent sets concurrently
     '''
     def __init__(self):
         self.cache_max_size: float = None
-        # a list of length < cache_max_size that stores
-        # (hash, reachableset) pairs
-        self._cache: list[tuple[str, dict[int, ReachSetInstance]]] = list()
+        # limit on the estimated size of the cached sets, if any
+        self.cache_max_bytes: float = None
+        # states within this tolerance share a cache entry, if set
+        self.cache_tolerance: float = None
+        # an LRU of length <= cache_max_size that stores
+        # hash: (reachableset, size in bytes) pairs
+        self._cache: OrderedDict[str, tuple[dict[int, ReachSetInstance], int]] = OrderedDict()
+        self._cache_bytes: int = 0
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+        # guards the cache so concurrent requests generate a set only once
+        self._cache_lock = threading.RLock()
+        # other generators whose reachable sets are used to generate this one
+        self.dependencies: list[ReachSetGenerator] = list()
     
     
     @abstractmethod
@@ -42,8 +62,8 @@ class ReachSetGenerator(metaclass=ABCMeta):
         pass
     
     
-    def getReachableSet(self, robotState: EntityState,
-                        ignore_cache: bool = False, **options) -> dict[int, ReachSetInstance]:
+    def getReachableSet(self, robotState: EntityState, ignore_cache: bool = False,
+                        context: PlanCycleContext = None, **options) -> dict[int, ReachSetInstance]:
         '''
         Get a reachable set instance for the given robot state and passthrough arguments
         
@@ -52,35 +72,136 @@ class ReachSetGenerator(metaclass=ABCMeta):
         call `generateReachableSet` as needed. This is useful if we
         need to use one reachable set in another reachable set and we
         don't want to regenerate it online. It performs caching based
-        on the id of the provided robotState and and the string cast
-        of any additional arguments. If we don't want to use the cache
+        on `cacheKey`, so any state with the same values returns the
+        same instances. If we don't want to use the cache
         on one call, setting `ignore_cache` to true will bypass caching
-        altogether
+        altogether. If a `PlanCycleContext` is given or active on this
+        thread, the instances it already holds for this generator and state
+        are returned regardless of `ignore_cache`
         
         Arguments:
             robotState: EntityState: Some state of used for generation / keying
             ignore_cache: bool: If set true, the cache is completely ignored
+            context: PlanCycleContext: Context of the current planning cycle
         
         Returns:
             dict: A dict of problem id to `ReachSetInstance` pairs
         '''
+        # within a planning cycle, every request for the same state
+        # gets the same instances
+        if context is None:
+            context = PlanCycleContext.current()
+        if context is not None:
+            return context.getReachableSet(self, robotState,
+                lambda: self._getCachedReachableSet(robotState, ignore_cache, **options), options)
+        return self._getCachedReachableSet(robotState, ignore_cache, **options)
+    
+    
+    def cacheIdentity(self) -> tuple:
+        '''
+        Properties of the generator which change the sets it generates,
+        such as the robot or the trajectory type, made part of the cache
+        key. Generators with such properties should extend this
+        '''
+        return (type(self).__qualname__,)
+    
+    
+    def cacheKey(self, robotState: EntityState, options: dict) -> str:
+        '''
+        Hash of the values of the robot's state, the extra arguments
+        and the identity of the generator. If `cache_tolerance` is set,
+        the values are rounded to multiples of it first
+        
+        Arguments:
+            robotState: EntityState: Some state of used for generation
+            options: dict: Extra arguments the set is generated with
+        
+        Returns:
+            str: The key of the reachable set in the cache
+        '''
+        values = [getattr(robotState, attr, None) for attr in ('position', 'velocity', 'acceleration')]
+        if all(value is None for value in values):
+            values = [getattr(robotState, 'state', None)]
+        
+        key = hashlib.sha1()
+        key.update(repr(self.cacheIdentity()).encode())
+        key.update(repr(sorted(options.items())).encode())
+        for value in values:
+            if value is None:
+                key.update(b'None')
+                continue
+            value = np.asarray(value, dtype=np.float64)
+            if self.cache_tolerance is not None:
+                value = np.round(value / self.cache_tolerance).astype(np.int64)
+            else:
+                # so that -0.0 and 0.0 share a key
+                value = value + 0.0
+            key.update(str(value.shape).encode())
+            key.update(np.ascontiguousarray(value).tobytes())
+        return key.hexdigest()
+    
+    
+    def _getCachedReachableSet(self, robotState: EntityState,
+                               ignore_cache: bool = False, **options) -> dict[int, ReachSetInstance]:
         # if we don't want to use the cache or don't have a cache,
         # return a newly generated reachableset
         if ignore_cache or self.cache_max_size < 1:
             return self.generateReachableSet(robotState, **options)
         
-        # create hash of the input argument based on the robotState id
-        # and string representation of the keyword arguments
-        cache_hash = str(id(robotState)) + str(options)
+        cache_hash = self.cacheKey(robotState, options)
         
-        # search cache if hash exists and return if it does
-        for rs in self._cache:
-            if rs[0] == cache_hash:
-                return rs[1]
+        with self._cache_lock:
+            # return and refresh the entry if it exists
+            if cache_hash in self._cache:
+                self._cache.move_to_end(cache_hash)
+                self.cache_hits += 1
+                return self._cache[cache_hash][0]
+            
+            # otherwise generate a reachableset and add it to the cache
+            reachableset = self.generateReachableSet(robotState, **options)
+            self.cache_misses += 1
+            size = self.estimateSize(reachableset)
+            self._cache[cache_hash] = (reachableset, size)
+            self._cache_bytes += size
+            
+            # evict the least recently used sets over the limits, but
+            # always keep the newest one
+            while len(self._cache) > 1 and (len(self._cache) > self.cache_max_size
+                    or (self.cache_max_bytes is not None and self._cache_bytes > self.cache_max_bytes)):
+                (_, (_, evicted_size)) = self._cache.popitem(last=False)
+                self._cache_bytes -= evicted_size
+            return reachableset
+    
+    
+    def clearCache(self):
+        '''
+        Remove all the reachable sets from the cache
+        '''
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+    
+    
+    @staticmethod
+    def estimateSize(obj, _seen: set = None) -> int:
+        '''
+        Estimate of the memory held by the tensors and arrays reachable
+        from `obj` through containers and object attributes
+        '''
+        if _seen is None:
+            _seen = set()
+        if id(obj) in _seen:
+            return 0
+        _seen.add(id(obj))
         
-        # otherwise generate a reachableset and add it to the cache
-        reachableset = self.generateReachableSet(robotState, **options)
-        self._cache.append((cache_hash, reachableset))
-        if len(self._cache) > self.cache_max_size:
-            self._cache.pop(0)
-        return reachableset
\ No newline at end of file
+        if isinstance(obj, torch.Tensor):
+            return obj.element_size() * obj.nelement()
+        if isinstance(obj, np.ndarray):
+            return obj.nbytes
+        if isinstance(obj, dict):
+            return sum(ReachSetGenerator.estimateSize(value, _seen) for value in obj.values())
+        if isinstance(obj, (list, tuple, set)):
+            return sum(ReachSetGenerator.estimateSize(value, _seen) for value in obj)
+        if hasattr(obj, '__dict__') and not callable(obj):
+            return ReachSetGenerator.estimateSize(vars(obj), _seen)
+        return 0
\ No newline at end of file
@@ -1,2 +1,3 @@
 from rtd.planner.reachsets.ReachSetInstance import ReachSetInstance
+from rtd.planner.reachsets.PlanCycleContext import PlanCycleContext
 from rtd.planner.reachsets.ReachSetGenerator import ReachSetGenerator
\ No newline at end of file
@@ -1,7 +1,9 @@
 from abc import ABCMeta, abstractmethod
 from rtd.entity.states import EntityState
 from rtd.planner.trajopt import TrajOptProps
-from rtd.util.mixins.Typings import Vecnp
+from rtd.util.mixins.Typings import Vecnp, Matnp
+import numpy as np
+import copy
 
 
 
@@ -78,6 +80,30 @@ class Trajectory(metaclass=ABCMeta):
             EntityState: Desired state at the given time
         '''
         pass
+    
+    
+    def getCommandBatch(self, trajectoryParams: Matnp, time: Vecnp) -> np.ndarray:
+        '''
+        Computes the states to track for a batch of parameters
+        
+        The parameters of this trajectory are left unchanged. By default,
+        a single copy of this trajectory is set to each of the parameters
+        in turn, so trajectories should override this with a vectorized
+        computation where they can
+        
+        Arguments:
+            trajectoryParams: Matnp: (n_batch, n_params) parameters to evaluate
+            time: Vecnp: Times to calculate the desired states at
+        
+        Returns:
+            np.ndarray: (n_batch, n_states, n_time) desired states
+        '''
+        trajectory = copy.copy(self)
+        states = list()
+        for k in np.atleast_2d(trajectoryParams):
+            trajectory.setParameters(k)
+            states.append(np.reshape(trajectory.getCommand(time).state, (-1, np.size(time))))
+        return np.stack(states)
 
 
 class InvalidTrajectory(Exception):
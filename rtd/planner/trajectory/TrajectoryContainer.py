@@ -10,19 +10,65 @@ class BadTrajectoryException(Exception):
 
 
 class TrajectoryContainer:
-    def __init__(self):
-        # vector of start times for each trajectory
-        # last element is always inf to ensure the last trajectory is always used
-        self._startTimes: list[float] = np.array([np.inf], np.double)
+    '''
+    Container of the trajectories of an agent, where each trajectory is
+    active from its start time until the start time of the next one
+    
+    The start times are stored in a buffer which grows by doubling, so
+    appending a trajectory takes amortized constant time, and the
+    trajectory active at each queried time is found with `searchsorted`.
+    If a `retention_horizon` is given, trajectories which ended more than
+    that long before the start of the newest trajectory are dropped, so
+    memory and query times stay bounded for long running agents
+    '''
+    def __init__(self, retention_horizon: float = None):
+        # how long to keep trajectories after they ended, or forever if None
+        self.retention_horizon: float = retention_horizon
+        
+        # buffer of the start times of each trajectory, where the stored
+        # trajectories are those from _head to _count and the entry after
+        # the last one is always inf to ensure it is always used
+        self._startTimes: np.ndarray = np.full(8, np.inf, dtype=np.double)
         
-        # list of trajectories corresponding to the start times
-        self._trajectories: list[Trajectory] = np.array([], dtype=Trajectory)
+        # list of trajectories corresponding to the start times, where
+        # the retired trajectories before _head are None
+        self._trajectories: list[Trajectory] = list()
+        self._head: int = 0
+        self._count: int = 0
+        # number of trajectories retired since the last clear, where the
+        # initial trajectory is the first to go
+        self._retired: int = 0
+        
+        # the initial trajectory, kept to reset the container
+        self._initialTrajectory: Trajectory = None
+    
+    
+    def __len__(self) -> int:
+        return self._count - self._head
+    
+    
+    @property
+    def startTimes(self) -> np.ndarray:
+        '''
+        The start times of the stored trajectories
+        '''
+        return self._startTimes[self._head:self._count]
+    
+    
+    @property
+    def trajectories(self) -> list[Trajectory]:
+        '''
+        The stored trajectories, from the oldest to the newest
+        '''
+        return self._trajectories[self._head:self._count]
     
     
     def setInitialTrajectory(self, initialTrajectory: Trajectory):
         '''
         Sets the initial trajectory for the container.
         This method must be called before any other method is called.
+        If the initial trajectory was already retired, the container
+        has to be cleared before it can be replaced.
         
         Parameters
         ----------
@@ -33,13 +79,15 @@ class TrajectoryContainer:
             raise BadTrajectoryException("Provided initial trajectory does not start at 0!")
         if not initialTrajectory.validate():
             raise BadTrajectoryException("Provided initial trajectory is invalid!")
+        if self._retired > 0:
+            raise BadTrajectoryException("The initial trajectory was already retired, clear the container first!")
         
+        self._initialTrajectory = initialTrajectory
         if not self.isValid(False):
-            self._startTimes = np.array([initialTrajectory.startTime, np.inf], dtype=np.double)
-            self._trajectories = np.array([initialTrajectory], dtype=Trajectory)
+            self._append(initialTrajectory, initialTrajectory.startTime)
         else:
-            self._startTimes[0] = initialTrajectory.startTime
-            self._trajectories[0] = initialTrajectory
+            self._startTimes[self._head] = initialTrajectory.startTime
+            self._trajectories[self._head] = initialTrajectory
     
     
     def clear(self):
@@ -49,8 +97,12 @@ class TrajectoryContainer:
         If not, a warning is thrown.
         '''
         if self.isValid():
-            self._startTimes = np.array([0, np.inf], np.double)
-            self._trajectories = np.array([self._trajectories[0]], dtype=Trajectory)
+            self._startTimes = np.full(8, np.inf, dtype=np.double)
+            self._trajectories = list()
+            self._head = 0
+            self._count = 0
+            self._retired = 0
+            self._append(self._initialTrajectory, 0)
         else:
             print("Warning: clear() for TrajectoryContainer was called before valid initial trajectory was set!")
     
@@ -69,7 +121,7 @@ class TrajectoryContainer:
         valid : bool
             whether the container is valid or not
         '''
-        valid = len(self._trajectories)>=1 and len(self._startTimes)==1+len(self._trajectories)
+        valid = len(self) >= 1
         if not valid and errorIfInvalid:
             raise BadTrajectoryException("Initial trajectory for the container has not been set!")
         return valid
@@ -79,7 +131,8 @@ class TrajectoryContainer:
         '''
         Sets a new trajectory for the container to the end.
         The new trajectory must start at a time greater than equal to
-        the end of the last trajectory.
+        the start of the last trajectory. Trajectories which ended before
+        the retention horizon are retired.
         
         Parameters
         ----------
@@ -91,16 +144,54 @@ class TrajectoryContainer:
         self.isValid(True)
         
         # add the trajectory if it is valid
-        if trajectory.validate() and trajectory.startTime>=self._startTimes[-2]:
-            self._startTimes[-1] = trajectory.startTime
-            np.append(self._startTimes, np.inf)
-            np.append(self._trajectories, trajectory)
+        if trajectory.validate() and trajectory.startTime>=self._startTimes[self._count-1]:
+            self._append(trajectory, trajectory.startTime)
+            if self.retention_horizon is not None:
+                self.retire(trajectory.startTime - self.retention_horizon)
         elif errorIfInvalid:
             raise BadTrajectoryException("Provided trajectory starts before the end of the last trajectory!")
         else:
             print("Warning: Invalid trajectory provided to TrajectoryContainer")
     
     
+    def retire(self, time: float):
+        '''
+        Drops the trajectories which ended at or before the given time,
+        always keeping the newest trajectory. Queries before the start of
+        the oldest kept trajectory use the oldest kept trajectory.
+        
+        Parameters
+        ----------
+        time : float
+            the time before which trajectories are no longer needed
+        '''
+        # the trajectories whose successor started at or before the time
+        ended = np.searchsorted(self._startTimes[self._head+1:self._count], time, side='right')
+        self._trajectories[self._head:self._head+ended] = [None]*ended
+        self._head += ended
+        self._retired += ended
+        
+        # compact the buffers once most of them is retired
+        if self._head > self._count // 2:
+            self._startTimes[:self._count-self._head+1] = self._startTimes[self._head:self._count+1]
+            self._startTimes[self._count-self._head+1:] = np.inf
+            del self._trajectories[:self._head]
+            self._count -= self._head
+            self._head = 0
+    
+    
+    def _append(self, trajectory: Trajectory, startTime: float):
+        '''
+        Appends the trajectory and its start time, doubling the buffer
+        of start times if it is full
+        '''
+        if self._count + 1 >= self._startTimes.size:
+            self._startTimes = np.concatenate((self._startTimes, np.full(self._startTimes.size, np.inf)))
+        self._startTimes[self._count] = startTime
+        self._trajectories.append(trajectory)
+        self._count += 1
+    
+    
     def getCommand(self, time: float | list[float]) -> list[EntityState]:
         '''
         Generates a command based on the time.
@@ -108,7 +199,8 @@ class TrajectoryContainer:
         at the time. If the time is before the start of the first trajectory,
         then the command is generated based on the initial trajectory. If the
         time is after the last trajectory, then the command is generated based
-        on the last trajectory. 
+        on the last trajectory. The times of each vectorized trajectory are
+        evaluated together, and share the resulting command.
         
         Parameters
         ----------
@@ -120,21 +212,27 @@ class TrajectoryContainer:
         commands : NDArray[EntityState]
             the generated commands
         '''
-        time = np.array(toSequence(time))
+        time = np.array(toSequence(time), dtype=np.double)
         self.isValid(True)
         
+        # find the trajectory active at each time
+        owner = np.searchsorted(self.startTimes, time, side='right') - 1
+        np.maximum(owner, 0, out=owner)
+        
+        # group the times by their trajectory
+        order = np.argsort(owner, kind='stable')
+        (owners, first) = np.unique(owner[order], return_index=True)
+        
         # generate an output trajectory based on the provided time
-        ncommands = len(time)
-        commands = np.empty(ncommands, dtype=EntityState)
-        commands[-1] = self._trajectories[0].getCommand(np.array([0]))
-        
-        for i in range(self._startTimes.size-1):
-            mask = np.logical_and(time>=self._startTimes[i], time<=self._startTimes[i+1])
-            if np.sum(mask) == 0:
-                continue
-            elif self._trajectories[i].vectorized:
-                commands[mask] = self._trajectories[i].getCommand(time[mask])
+        commands = np.empty(time.size, dtype=EntityState)
+        for (i, group) in zip(owners, np.split(order, first[1:])):
+            trajectory = self._trajectories[self._head + i]
+            if trajectory.vectorized:
+                command = trajectory.getCommand(time[group])
+                for j in group:
+                    commands[j] = command
             else:
-                commands[mask] = (self._trajectories[j].getCommand(time[j]) for j in np.argwhere(mask).T[0])
+                for j in group:
+                    commands[j] = trajectory.getCommand(time[j])
         
-        return commands
\ No newline at end of file
+        return commands
@@ -3,7 +3,8 @@ from rtd.entity.states import EntityState
 from rtd.planner.trajopt import TrajOptProps
 from rtd.planner.trajectory import Trajectory
 from rtd.planner.reachsets import ReachSetInstance
-from rtd.util.mixins.Typings import Vecnp
+from rtd.util.mixins.Typings import Vecnp, Matnp
+import numpy as np
 
 
 
@@ -38,4 +39,48 @@ class TrajectoryFactory(metaclass=ABCMeta):
         Returns:
             Trajectory: Desired Trajectory Object
         '''
-        pass
\ No newline at end of file
+        pass
+    
+    
+    def getInitialGuess(self, trajectory: Trajectory, robotState: EntityState,
+                        rsInstances: dict[str, ReachSetInstance] = None) -> Vecnp | None:
+        '''
+        Re-express a previously planned trajectory as parameters for a
+        new plan starting at `robotState`, to warm start the optimization
+        
+        By default the parameters of the previous trajectory are reused
+        as they are. Factories whose parameters depend on the start state
+        or the reachable sets should override this
+        
+        Arguments:
+            trajectory: Trajectory: The previously planned trajectory
+            robotState: EntityState: Initial state of the robot for the new plan
+            rsInstances: dict: Optional dict holding instances of reachablesets for the new state
+        
+        Returns:
+            Vecnp | None: The initial guess, or None if the trajectory can't be used
+        '''
+        if trajectory is None or not trajectory.validate():
+            return None
+        return trajectory.trajectoryParams
+    
+    
+    def getCommandBatch(self, robotState: EntityState, trajectoryParams: Matnp, time: Vecnp,
+                        rsInstances: dict[str, ReachSetInstance] = None, **options) -> np.ndarray:
+        '''
+        Computes the states of the trajectories of a batch of parameters
+        
+        A single unparameterized trajectory is created for the state,
+        which evaluates the whole batch with its `getCommandBatch`
+        
+        Arguments:
+            robotState: EntityState: Initial state of the robot
+            trajectoryParams: Matnp: (n_batch, n_params) parameters to evaluate
+            time: Vecnp: Times to calculate the desired states at
+            rsInstances: dict: Optional dict holding instances of reachablesets for the given state
+        
+        Returns:
+            np.ndarray: (n_batch, n_states, n_time) desired states
+        '''
+        trajectory = self.createTrajectory(robotState, rsInstances, **options)
+        return trajectory.getCommandBatch(trajectoryParams, time)
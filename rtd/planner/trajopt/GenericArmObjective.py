@@ -4,7 +4,8 @@ from rtd.planner.reachsets import ReachSetInstance
 from rtd.planner.trajopt import Objective, TrajOptProps
 from rtd.planner.trajectory import TrajectoryFactory, Trajectory
 import numpy as np
-from rtd.util.mixins.Typings import Vecnp
+from scipy.optimize import approx_fprime
+from rtd.util.mixins.Typings import Vecnp, Matnp
 
 
 
@@ -35,17 +36,62 @@ class GenericArmObjective(Objective):
         # factory we were given
         trajectoryObj = self.trajectoryFactory.createTrajectory(robotState, reachableSets)
         
-        # create and return the function handle
-        return lambda trajectoryParams: self.evalTrajectory(trajectoryParams, trajectoryObj, q_des, robotState.time + self.t_cost)
+        # create and return the function handle, which can evaluate a
+        # batch of parameters at once if the trajectory supports it
+        objective = lambda trajectoryParams: self.evalTrajectory(trajectoryParams, trajectoryObj, q_des, robotState.time + self.t_cost)
+        if hasattr(trajectoryObj, 'getPositionGradientBatch'):
+            objective.batch = lambda trajectoryParams: self.evalTrajectoryBatch(trajectoryParams, trajectoryObj, q_des, robotState.time + self.t_cost)
+        return objective
     
     
     @staticmethod
-    def evalTrajectory(trajectoryParams: Vecnp, trajectoryObj: Trajectory, q_des, t_cost: float | Vecnp) -> float:
+    def evalTrajectory(trajectoryParams: Vecnp, trajectoryObj: Trajectory, q_des, t_cost: float | Vecnp) -> tuple[float, Vecnp]:
         '''
         Helper function purely accessible to this class without any class state
         which a handle can be made to to evaluate the trajectory for the cost.
-        Should work for any generic arm trajectory in joint space
+        Should work for any generic arm trajectory in joint space. Returns
+        the cost and its gradient with respect to the parameters, which is
+        exact if the trajectory provides `getPositionGradient` and
+        approximated with finite differences otherwise
         '''
         trajectoryObj.setParameters(trajectoryParams)
         plan = trajectoryObj.getCommand(t_cost)
-        return np.sum(np.power(plan.position - q_des, 2))
\ No newline at end of file
+        error = np.reshape(plan.position, (np.size(q_des), -1)) - np.reshape(q_des, (-1, 1))
+        cost = np.sum(np.power(error, 2))
+        
+        if not hasattr(trajectoryObj, 'getPositionGradient'):
+            def evalCost(k):
+                trajectoryObj.setParameters(k)
+                position = trajectoryObj.getCommand(t_cost).position
+                return np.sum(np.power(np.reshape(position, error.shape) - np.reshape(q_des, (-1, 1)), 2))
+            grad = approx_fprime(trajectoryParams, evalCost)
+            trajectoryObj.setParameters(trajectoryParams)
+            return (cost, grad)
+        
+        # each joint only depends on its own parameter, and any extra
+        # parameters don't contribute to the cost
+        position_grad = trajectoryObj.getPositionGradient(t_cost)
+        grad = np.zeros(np.size(trajectoryParams))
+        grad[:error.shape[0]] = np.sum(2*error*position_grad, axis=1)
+        return (cost, grad)
+    
+    
+    @staticmethod
+    def evalTrajectoryBatch(trajectoryParams: Matnp, trajectoryObj: Trajectory, q_des,
+                            t_cost: float | Vecnp) -> tuple[Vecnp, Matnp]:
+        '''
+        Evaluate the cost and its gradient for a (n_batch, n_params) batch
+        of parameters, for trajectories with `getCommandBatch` and
+        `getPositionGradientBatch` which put the positions first in the
+        state. Returns the (n_batch,) costs and (n_batch, n_params) gradients
+        '''
+        trajectoryParams = np.atleast_2d(trajectoryParams)
+        n_q = np.size(q_des)
+        states = trajectoryObj.getCommandBatch(trajectoryParams, t_cost)
+        error = states[:,:n_q,:] - np.reshape(q_des, (-1, 1))
+        cost = np.sum(np.power(error, 2), axis=(1, 2))
+        
+        position_grad = trajectoryObj.getPositionGradientBatch(trajectoryParams, t_cost)
+        grad = np.zeros(trajectoryParams.shape)
+        grad[:,:n_q] = np.sum(2*error*position_grad, axis=-1)
+        return (cost, grad)
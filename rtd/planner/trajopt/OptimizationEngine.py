@@ -10,7 +10,8 @@ class OptimizationEngine(metaclass=ABCMeta):
     '''
     @abstractmethod
     def performOptimization(self, initialGuess: Vecnp, objectiveCallback: Callable,
-            constraintCallback: Callable, bounds: dict) -> tuple[bool, Vecnp, float]:
+            constraintCallback: Callable, bounds: dict, deadline: float = None,
+            solveInfo: dict = None) -> tuple[bool, Vecnp, float]:
         '''
         Use the given optimizer to perform the optimization
         Vecnp
@@ -19,6 +20,8 @@ class OptimizationEngine(metaclass=ABCMeta):
             objectiveCallback: A callback for the objective function of this specific optimization
             constraintCallback: A callback for the nonlinear constraints, where the return time is expected to be [c, ceq, gc, gceq].
             bounds: A dict containing input and output bounds
+            deadline: Optional `time.perf_counter()` time by which the optimization has to return
+            solveInfo: Optional dict to fill with statistics about the solve
         
         Returns:
             (success: bool, parameters: Vecnp, cost: float): `success`
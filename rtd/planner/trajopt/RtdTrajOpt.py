@@ -4,10 +4,15 @@ from rtd.planner.reachsets import ReachSetGenerator
 from rtd.sim.world import WorldState
 from rtd.entity.states import EntityState
 from rtd.planner.trajectory import Trajectory
-from rtd.planner.reachsets import ReachSetInstance
+from rtd.planner.reachsets import ReachSetInstance, PlanCycleContext
 import numpy as np
 from typing import Callable
+from collections import OrderedDict
+from rtd.util.mixins import Options
 from rtd.util.mixins.Typings import Vecnp
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
 
 # define top level module logger
 import logging
@@ -15,14 +20,41 @@ logger = logging.getLogger(__name__)
 
 
 
-class RtdTrajOpt:
+class SolveCancelled(Exception):
+    '''
+    An exception raised inside of the objective to abort an optimization
+    once another problem has already found a good enough solution
+    '''
+    pass
+
+
+
+class RtdTrajOpt(Options):
     '''
     Core trajectory optimization routine for RTD
     
     This object handles the necessary calls to perform the actual trajectory
     optimization when requested. It calls the generators for the reachble
-    sets and combines all the resulting nonlinear constraints in the end
+    sets and combines all the resulting nonlinear constraints in the end.
+    Independent reachable sets can be generated concurrently by setting the
+    `parallel_reachsets` option, and if the generators return more than one
+    problem, they can be solved concurrently by setting `parallel_solve`
     '''
+    @staticmethod
+    def defaultoptions() -> dict:
+        return {
+            "parallel_solve": False,
+            "parallel_reachsets": False,
+            "max_workers": None,
+            "good_enough_cost": None,
+            "constraint_buffer_size": 16,
+            "cutting_planes": False,
+            "working_set_size": 32,
+            "max_cutting_plane_rounds": 10,
+            "violation_tol": 1e-6,
+        }
+    
+    
     def __init__(self, trajOptProps: TrajOptProps, reachableSets: dict[str, ReachSetGenerator],
                  objective: Objective, optimizationEngine: OptimizationEngine,
                  trajectoryFactory: TrajectoryFactory, **options):
@@ -40,7 +72,29 @@ class RtdTrajOpt:
             objective: Objective
             optimizationEngine: OptimizationEngine
             trajectoryFactory: TrajectoryFactory
+            options: `parallel_solve` to solve the problems on a thread pool of
+                `max_workers` threads, which only overlaps the work done
+                outside of the GIL, such as torch or large numpy
+                operations. The scipy engine's callbacks are python and
+                hold the GIL, so it gets little to no speedup from it
+                (8 problems on 4 threads took about as long as solving them
+                one after the other), and the constraint closures can't be
+                sent to a process pool. Use `parallel_reachsets` to generate
+                the reachable sets which don't depend on each other concurrently,
+                `good_enough_cost` to cancel the remaining problems once
+                one is solved with a cost at or below it, and
+                `constraint_buffer_size` for the number of constraint
+                evaluations remembered per problem. If `cutting_planes` is
+                set, each problem is first solved with only the
+                `working_set_size` most critical inequality constraints,
+                adding the violated ones and re-solving for at most
+                `max_cutting_plane_rounds` (at least 1) rounds, until none is violated
+                by more than `violation_tol`
         '''
+        # initialize base classes
+        Options.__init__(self)
+        # initialize using given options
+        self.mergeoptions(options)
         self.trajOptProps: TrajOptProps = trajOptProps
         self.reachableSets: dict[str, ReachSetGenerator] = reachableSets
         self.objective: Objective = objective
@@ -57,7 +111,8 @@ class RtdTrajOpt:
             The returned `info` dict has the following entries:
             worldState, robotState, rsInstances, nlconCallbacks,
             objectiveCallback, waypoint, bounds, num_parameters, guess,
-            trajectory, cost
+            warm_start, trajectory, cost, parameters, successes, solution_idx, cancelled,
+            reachset_memo, constraint_memo, solve_info, deadline_missed
         
         Arguments:
             robotState: EntityState: State of the robot.
@@ -74,84 +129,63 @@ class RtdTrajOpt:
             trajectory or empty. `cost` is the final cost of the
             objective used. `info` is a dict of optimization data.
         '''
-        # generate reachable set
+        options = self.getoptions()
+        
+        # the whole planning cycle has to finish within the timeout
+        deadline = None
+        if self.trajOptProps.doTimeout:
+            deadline = time.perf_counter() + self.trajOptProps.timeoutTime
+        
+        # generate reachable set, sharing the sets generated for this
+        # state between the generators for the rest of the cycle
         logger.info("Generating reachable sets and nonlinear constraints")
-        rsInstances_dict: dict[int, dict[str, ReachSetInstance]] = dict()
+        with PlanCycleContext() as context:
+            rsInstances_dict = self.generateReachableSets(robotState, rsAdditionalArgs, context)
         
-        for (rs_name, rs_gen) in self.reachableSets.items():
-            logger.debug(f"Generating {rs_name}")
-            
-            # get additional arguments for current reachset
-            rs_args = dict()
-            if rs_name in rsAdditionalArgs:
-                logger.debug(f"Passing additional arguments to generate {rs_name}")
-                rs_args = rsAdditionalArgs[rs_name]
-            
-            # generate reachset
-            rsInstances = rs_gen.getReachableSet(robotState, ignore_cache=False, **rs_args)
-            
-            # save in rsInstances
-            for (rs_id, rs) in rsInstances.items():
-                if rs_id not in rsInstances_dict:
-                    rsInstances_dict[rs_id] = dict()
-                rsInstances_dict[rs_id][rs_name] = rs
-            
-            
-        # generate nonlinear constraints
-        successes: dict[int, bool] = dict()
-        parameters: dict[int, Vecnp] = dict()
-        costs: dict[int, float] = dict()
-        
-        for (rs_id, rsInstances) in rsInstances_dict.items():
-            logger.info(f"Solving problem {rs_id}")
-            logger.debug("Generating nonlinear constraints")
-            nlconCallbacks = {rs_name: rs.genNLConstraint(worldState) for (rs_name, rs) in rsInstances.items()}
-            
-            # validate that rs sizes are all equal
-            logger.debug("Validating sizes")
-            num_parameters = {rs.num_parameters for rs in rsInstances.values()}
-            if len(num_parameters) != 1:
-                raise Exception("Reachable set parameter sizes don't match!")
-            # get num_parameters[0] from num_parameters={num_parameters}
-            for n_params in num_parameters:
-                num_parameters = n_params
-            
-            # compute bounds
-            logger.debug("Computing bounds")
-            param_bounds = np.ones((num_parameters, 2)) * (-np.inf, np.inf)
-            for rs in rsInstances.values():
-                new_bounds = rs.input_range*np.ones((1, num_parameters))
-                # Ensure bounds are the intersect of the intervals for the
-                # parameters
-                param_bounds[:,0] = np.maximum(param_bounds[:,0], new_bounds[0])
-                param_bounds[:,1] = np.minimum(param_bounds[:,1], new_bounds[1])
-            
-            # combine nlconCallbacks
-            constraintCallback = self.merge_constraints(nlconCallbacks)
-            
-            # create bounds
-            bounds = {
-                'param_limits': param_bounds,
-                'output_limits': list()
-            }
-            
-            # create the objective
-            objectiveCallback = self.objective.genObjective(robotState, waypoint, rsInstances)
-            
-            # if initial guess is none or invalid, make zero
-            try:
-                guess = initialGuess.trajectoryParams()
-            except Exception:
-                guess = list()
+        
+        # solve each of the problems, either one after the other or
+        # concurrently on a pool of worker threads
+        solve = lambda rs_id, cancelEvent: self.solveProblem(rs_id, rsInstances_dict[rs_id], robotState,
+                                                             worldState, waypoint, initialGuess, cancelEvent,
+                                                             deadline)
+        problems: dict[int, dict] = dict()
+        cancelEvent = threading.Event()
+        
+        if options["parallel_solve"] and len(rsInstances_dict) > 1:
+            logger.info(f"Solving {len(rsInstances_dict)} problems in parallel")
+            with ThreadPoolExecutor(max_workers=options["max_workers"]) as executor:
+                futures = {executor.submit(solve, rs_id, cancelEvent): rs_id for rs_id in rsInstances_dict}
+                for future in as_completed(futures):
+                    # the problems cancelled before they started are
+                    # recorded below
+                    if future.cancelled():
+                        continue
+                    problems[futures[future]] = future.result()
+                    if self.isGoodEnough(problems[futures[future]]):
+                        # stop the problems which haven't started yet
+                        # and signal the running ones to give up
+                        logger.info(f"Problem {futures[future]} is good enough, cancelling the rest")
+                        cancelEvent.set()
+                        for f in futures:
+                            f.cancel()
             
-            # optimize
-            logger.info("Optimizing!")
-            success, parameter, cost = self.optimizationEngine.performOptimization(
-                guess, objectiveCallback, constraintCallback, bounds)
-
-            successes[rs_id] = success
-            parameters[rs_id] = parameter
-            costs[rs_id] = cost
+            # keep track of any problems that never got to run
+            for (future, rs_id) in futures.items():
+                if future.cancelled():
+                    problems[rs_id] = self.cancelledProblem()
+        else:
+            for rs_id in rsInstances_dict:
+                if cancelEvent.is_set():
+                    problems[rs_id] = self.cancelledProblem()
+                    continue
+                problems[rs_id] = solve(rs_id, cancelEvent)
+                if self.isGoodEnough(problems[rs_id]):
+                    logger.info(f"Problem {rs_id} is good enough, skipping the rest")
+                    cancelEvent.set()
+        
+        successes: dict[int, bool] = {rs_id: problem['success'] for (rs_id, problem) in problems.items()}
+        parameters: dict[int, Vecnp] = {rs_id: problem['parameter'] for (rs_id, problem) in problems.items()}
+        costs: dict[int, float] = {rs_id: problem['cost'] for (rs_id, problem) in problems.items()}
         
         # select the best cost
         min_cost = np.inf
@@ -167,39 +201,382 @@ class RtdTrajOpt:
             rsInstances = rsInstances_dict[min_idx]
             parameter = parameters[min_idx]
             trajectory = self.trajectoryFactory.createTrajectory(robotState, rsInstances, parameter)
+            problem = problems[min_idx]
         else:
+            # report the first problem which ran, or the first problem
+            # if none did
             trajectory = None
+            ran = [rs_id for rs_id in rsInstances_dict if not problems[rs_id]['cancelled']]
+            problem = problems[ran[0] if ran else next(iter(rsInstances_dict))]
         
         info = {
             'worldState': worldState,
             'robotState': robotState,
             'rsInstances': rsInstances_dict,
-            'nlconCallbacks': nlconCallbacks,
-            'objectiveCallback': objectiveCallback,
+            'nlconCallbacks': problem['nlconCallbacks'],
+            'objectiveCallback': problem['objectiveCallback'],
             'waypoint': waypoint,
-            'bounds': bounds,
-            'num_parameters': num_parameters,
-            'guess': guess,
+            'bounds': problem['bounds'],
+            'num_parameters': problem['num_parameters'],
+            'guess': problem['guess'],
+            'warm_start': problem['warm_start'],
             'trajectory': trajectory,
-            'cost': cost,
+            'cost': problem['cost'],
             'parameters': parameters,
             'successes': successes,
             'solution_idx': min_idx,
+            'cancelled': [rs_id for (rs_id, problem) in problems.items() if problem['cancelled']],
+            'reachset_memo': {'hits': context.hits, 'misses': context.misses},
+            'constraint_memo': problem['constraint_memo'],
+            'solve_info': {rs_id: problem['solve_info'] for (rs_id, problem) in problems.items()},
+            'deadline_missed': any(problem['solve_info'].get('deadline_missed', False) for problem in problems.values()),
+        }
+        
+        return (trajectory, problem['cost'], info)
+    
+    
+    def generateReachableSets(self, robotState: EntityState, rsAdditionalArgs: dict[dict],
+                              context: PlanCycleContext = None) -> dict[int, dict[str, ReachSetInstance]]:
+        '''
+        Generate all the reachable sets for the given state
+        
+        The generators are run level by level following their declared
+        `dependencies`, so every set is generated after the sets it
+        builds on. If the `parallel_reachsets` option is set, the
+        generators within a level are run concurrently on worker threads
+        
+        Arguments:
+            robotState: EntityState: State of the robot
+            rsAdditionalArgs: additional arguments to pass to the reachable sets, by set name
+            context: PlanCycleContext: Context of the current planning cycle, passed to the generators
+        
+        Returns:
+            dict: A dict of problem id to dicts of set name to `ReachSetInstance` pairs
+        '''
+        options = self.getoptions()
+        
+        def generate(rs_name: str) -> dict[int, ReachSetInstance]:
+            logger.debug(f"Generating {rs_name}")
+            
+            # get additional arguments for current reachset
+            rs_args = dict()
+            if rs_name in rsAdditionalArgs:
+                logger.debug(f"Passing additional arguments to generate {rs_name}")
+                rs_args = rsAdditionalArgs[rs_name]
+            
+            # generate reachset
+            return self.reachableSets[rs_name].getReachableSet(robotState, ignore_cache=False,
+                                                               context=context, **rs_args)
+        
+        generated: dict[str, dict[int, ReachSetInstance]] = dict()
+        for level in self.reachableSetLevels():
+            if options["parallel_reachsets"] and len(level) > 1:
+                logger.debug(f"Generating {level} in parallel")
+                with ThreadPoolExecutor(max_workers=options["max_workers"]) as executor:
+                    generated.update(zip(level, executor.map(generate, level)))
+            else:
+                for rs_name in level:
+                    generated[rs_name] = generate(rs_name)
+        
+        # save in rsInstances, keeping the order of the generators
+        rsInstances_dict: dict[int, dict[str, ReachSetInstance]] = dict()
+        for rs_name in self.reachableSets:
+            for (rs_id, rs) in generated[rs_name].items():
+                if rs_id not in rsInstances_dict:
+                    rsInstances_dict[rs_id] = dict()
+                rsInstances_dict[rs_id][rs_name] = rs
+        
+        return rsInstances_dict
+    
+    
+    def reachableSetLevels(self) -> list[list[str]]:
+        '''
+        Sort the reachable set generators into levels of the dependency
+        graph, where each generator only depends on generators of the
+        earlier levels. Dependencies which aren't one of this trajopt's
+        generators are left for the generator to handle on its own
+        
+        Returns:
+            list[list[str]]: names of the generators in each level
+        '''
+        names = {id(rs_gen): rs_name for (rs_name, rs_gen) in self.reachableSets.items()}
+        remaining = {rs_name: {names[id(dep)] for dep in rs_gen.dependencies if id(dep) in names}
+                     for (rs_name, rs_gen) in self.reachableSets.items()}
+        
+        levels: list[list[str]] = list()
+        while remaining:
+            level = [rs_name for (rs_name, deps) in remaining.items() if not deps]
+            if not level:
+                raise Exception(f"Reachable sets {list(remaining)} have circular dependencies!")
+            levels.append(level)
+            for rs_name in level:
+                del remaining[rs_name]
+            for deps in remaining.values():
+                deps.difference_update(level)
+        
+        return levels
+    
+    
+    def solveProblem(self, rs_id: int, rsInstances: dict[str, ReachSetInstance], robotState: EntityState,
+                     worldState: WorldState, waypoint, initialGuess: Trajectory = None,
+                     cancelEvent: threading.Event = None, deadline: float = None) -> dict:
+        '''
+        Generate the constraints, bounds and objective for a single
+        problem and run the optimization engine on it
+        
+        Note:
+            The returned dict has the following entries:
+            success, parameter, cost, cancelled, nlconCallbacks,
+            objectiveCallback, bounds, num_parameters, guess, warm_start,
+            constraint_memo, solve_info
+        
+        Arguments:
+            rs_id: int: Id of the problem being solved
+            rsInstances: dict[str, ReachSetInstance]: Reachable set instances of the problem, by set name
+            robotState: EntityState: State of the robot
+            worldState: WorldState: Observed state of the world for the reachable sets
+            waypoint: Waypoint we want to optimize to
+            initialGuess: Trajectory: Past trajectory to use as an initial guess
+            cancelEvent: threading.Event: Once set, the optimization gives up as soon as possible
+            deadline: float: Optional `time.perf_counter()` time by which the optimization has to return
+        
+        Returns:
+            dict: The results of the optimization for this problem
+        '''
+        logger.info(f"Solving problem {rs_id}")
+        logger.debug("Generating nonlinear constraints")
+        nlconCallbacks = {rs_name: rs.genNLConstraint(worldState) for (rs_name, rs) in rsInstances.items()}
+        
+        # validate that rs sizes are all equal
+        logger.debug("Validating sizes")
+        num_parameters = {rs.num_parameters for rs in rsInstances.values()}
+        if len(num_parameters) != 1:
+            raise Exception("Reachable set parameter sizes don't match!")
+        # get num_parameters[0] from num_parameters={num_parameters}
+        for n_params in num_parameters:
+            num_parameters = n_params
+        
+        # compute bounds
+        logger.debug("Computing bounds")
+        param_bounds = np.ones((num_parameters, 2)) * (-np.inf, np.inf)
+        for rs in rsInstances.values():
+            new_bounds = rs.input_range*np.ones((1, num_parameters))
+            # Ensure bounds are the intersect of the intervals for the
+            # parameters
+            param_bounds[:,0] = np.maximum(param_bounds[:,0], new_bounds[0])
+            param_bounds[:,1] = np.minimum(param_bounds[:,1], new_bounds[1])
+        
+        # combine nlconCallbacks
+        constraintCallback = self.merge_constraints(nlconCallbacks, self.getoptions()["constraint_buffer_size"])
+        
+        # create bounds
+        bounds = {
+            'param_limits': param_bounds,
+            'output_limits': list()
         }
         
-        return (trajectory, cost, info)
+        # create the objective
+        objectiveCallback = self.objective.genObjective(robotState, waypoint, rsInstances)
+        
+        # warm start from the previous trajectory re-expressed for this
+        # problem, falling back to the default guess if it's invalid or
+        # infeasible
+        guess = list()
+        warm_start = False
+        if initialGuess is not None:
+            try:
+                seed = self.trajectoryFactory.getInitialGuess(initialGuess, robotState, rsInstances)
+            except Exception:
+                logger.debug("Failed to re-express the initial guess", exc_info=True)
+                seed = None
+            if seed is not None:
+                # drop any parameters past the ones of this problem
+                seed = np.asarray(seed, dtype=float)[:num_parameters]
+                seed = np.clip(seed, param_bounds[:seed.size,0], param_bounds[:seed.size,1])
+                seed = np.concatenate((seed, np.zeros(num_parameters - seed.size)))
+                (h, heq, _, _) = constraintCallback(seed)
+                if np.all(h <= 0) and np.all(np.abs(heq) <= 1e-6):
+                    guess = seed
+                    warm_start = True
+                else:
+                    logger.debug("Initial guess is infeasible, using the default guess")
+        
+        # let the optimizer bail out on the next evaluation if we've
+        # been asked to stop
+        if cancelEvent is not None:
+            objective = objectiveCallback
+            def checkCancelled():
+                if cancelEvent.is_set():
+                    raise SolveCancelled(f"Problem {rs_id} was cancelled")
+            def objectiveCallback(k):
+                checkCancelled()
+                return objective(k)
+            if hasattr(objective, 'batch'):
+                def batch(K):
+                    checkCancelled()
+                    return objective.batch(K)
+                objectiveCallback.batch = batch
+        
+        # optimize
+        logger.info("Optimizing!")
+        cancelled = False
+        solveInfo = dict()
+        try:
+            if self.getoptions()["cutting_planes"]:
+                success, parameter, cost = self.optimizeWorkingSet(
+                    guess, objectiveCallback, constraintCallback, bounds, deadline, solveInfo)
+            else:
+                success, parameter, cost = self.optimizationEngine.performOptimization(
+                    guess, objectiveCallback, constraintCallback, bounds, deadline=deadline, solveInfo=solveInfo)
+        except SolveCancelled:
+            logger.info(f"Problem {rs_id} cancelled")
+            success, parameter, cost = (False, None, np.inf)
+            cancelled = True
+        
+        return {
+            'success': success,
+            'parameter': parameter,
+            'cost': cost,
+            'cancelled': cancelled,
+            'nlconCallbacks': nlconCallbacks,
+            'objectiveCallback': objectiveCallback,
+            'bounds': bounds,
+            'num_parameters': num_parameters,
+            'guess': guess,
+            'warm_start': warm_start,
+            'constraint_memo': {'hits': constraintCallback.hits, 'misses': constraintCallback.misses},
+            'solve_info': solveInfo,
+        }
+    
+    
+    def optimizeWorkingSet(self, guess: Vecnp, objectiveCallback: Callable, constraintCallback: Callable,
+                           bounds: dict, deadline: float = None, solveInfo: dict = None) -> tuple[bool, Vecnp, float]:
+        '''
+        Run the optimization engine with a cutting-plane loop over the
+        inequality constraints
+        
+        The first solve only uses the `working_set_size` constraints with
+        the largest values at the initial guess. After each solve, the full
+        set of constraints is evaluated at the result, and any violated
+        constraint is added to the working set before re-solving from the
+        result. The solution is only successful if it satisfies all of
+        the constraints
+        
+        Arguments:
+            guess: Vecnp: Initial guess, which may be shorter than the parameters
+            objectiveCallback: Callable: Objective of the problem
+            constraintCallback: Callable: The merged callback of all the constraints
+            bounds: dict: Bounds of the problem
+            deadline: float: Optional `time.perf_counter()` time by which the optimization has to return
+            solveInfo: dict: Optional dict filled like the optimization engine does, along with
+                `cutting_plane_rounds` and `working_set_size`
+        
+        Returns:
+            (success: bool, parameters: Vecnp, cost: float): The results of the optimization
+        '''
+        options = self.getoptions()
+        if options["max_cutting_plane_rounds"] < 1:
+            raise ValueError("max_cutting_plane_rounds must be at least 1!")
+        if solveInfo is None:
+            solveInfo = dict()
+        
+        # complete the initial guess like the optimization engines do, and
+        # give the engine the completed guess so the working set is ranked
+        # at the point it actually starts from
+        param_limits = bounds['param_limits']
+        guess = np.asarray(guess, dtype=float)
+        start = np.zeros(param_limits.shape[0])
+        start[:guess.size] = guess
+        if self.trajOptProps.randomInit:
+            start[guess.size:] = np.random.uniform(param_limits[guess.size:,0], param_limits[guess.size:,1])
+        guess = start
+        
+        # start with the most critical constraints at the initial guess
+        h = constraintCallback(start)[0]
+        rows = np.argsort(-h)[:options["working_set_size"]]
+        
+        (success, parameter, cost) = (False, guess, np.inf)
+        for rounds in range(1, options["max_cutting_plane_rounds"] + 1):
+            roundInfo = dict()
+            workingSet = self.working_set_constraints(constraintCallback, rows)
+            (success, parameter, cost) = self.optimizationEngine.performOptimization(
+                guess, objectiveCallback, workingSet, bounds, deadline=deadline, solveInfo=roundInfo)
+            for (key, value) in roundInfo.items():
+                if key in ('iterations', 'solve_time'):
+                    solveInfo[key] = solveInfo.get(key, 0) + value
+                elif key == 'deadline_missed':
+                    solveInfo[key] = solveInfo.get(key, False) or value
+                elif key not in solveInfo or solveInfo[key] is None:
+                    solveInfo[key] = value
+            
+            # an infeasible working set means the full set is infeasible
+            if not success:
+                break
+            
+            # add any violated constraint and re-solve from the result
+            h = constraintCallback(parameter)[0]
+            violated = np.setdiff1d(np.flatnonzero(h > options["violation_tol"]), rows)
+            if violated.size == 0:
+                break
+            logger.debug(f"Adding {violated.size} violated constraints to the working set")
+            rows = np.union1d(rows, violated)
+            guess = parameter
+        
+        # the result has to satisfy the complete set of constraints
+        if success and np.any(constraintCallback(parameter)[0] > options["violation_tol"]):
+            logger.info("Cutting plane loop ended with violated constraints")
+            success = False
+        
+        solveInfo['cutting_plane_rounds'] = rounds
+        solveInfo['working_set_size'] = rows.size
+        return (success, parameter, cost)
+    
+    
+    def isGoodEnough(self, problem: dict) -> bool:
+        '''
+        Whether the solved problem is successful with a cost at or
+        below the `good_enough_cost` option, in which case the
+        remaining problems don't need to be solved
+        '''
+        good_enough_cost = self.getoptions()["good_enough_cost"]
+        return (good_enough_cost is not None and problem['success']
+                and problem['cost'] <= good_enough_cost)
+    
+    
+    @staticmethod
+    def cancelledProblem() -> dict:
+        '''
+        Results for a problem which was cancelled before it could run
+        '''
+        return {
+            'success': False,
+            'parameter': None,
+            'cost': np.inf,
+            'cancelled': True,
+            'nlconCallbacks': None,
+            'objectiveCallback': None,
+            'bounds': None,
+            'num_parameters': None,
+            'guess': None,
+            'warm_start': False,
+            'constraint_memo': None,
+            'solve_info': dict(),
+        }
              
 
     class merge_constraints:
         '''
         A functor for computing the constraints
-        for a given input, with lookup for speed
+        for a given input, with an LRU memo keyed
+        on the exact bytes of the input for speed
         optimizations
         '''
         def __init__(self, nlconCallbacks: dict[str, Callable], buffer_size=16):
-            self.buffer: list[float, tuple] = list()
+            self.buffer: OrderedDict[bytes, tuple] = OrderedDict()
             self.buffer_size = buffer_size
             self.nlconCallbacks = nlconCallbacks
+            self.hits: int = 0
+            self.misses: int = 0
         
         
         def __call__(self, k):
@@ -236,16 +613,63 @@ class RtdTrajOpt:
             return res
         
         
+        def batch(self, K) -> tuple:
+            '''
+            Merge the constraints for a (n_batch, n_k) batch of
+            inputs, using the `batch` method of the constraint
+            callbacks if they have one, and evaluating the inputs
+            one at a time otherwise. Returns the values and
+            gradients of each input stacked along the first axis
+            '''
+            K = np.atleast_2d(K)
+            (n_batch, n_k) = K.shape
+            h = [np.empty((n_batch, 0))]
+            heq = [np.empty((n_batch, 0))]
+            grad_h = [np.empty((n_batch, 0, n_k))]
+            grad_heq = [np.empty((n_batch, 0, n_k))]
+            
+            for nlconCb in self.nlconCallbacks.values():
+                if nlconCb is None:
+                    continue
+                
+                if hasattr(nlconCb, 'batch'):
+                    (rs_h, rs_heq, rs_grad_h, rs_grad_heq) = nlconCb.batch(K)
+                else:
+                    stack = lambda values: None if values[0] is None else np.stack(values)
+                    (rs_h, rs_heq, rs_grad_h, rs_grad_heq) = map(stack, zip(*(nlconCb(k) for k in K)))
+                if rs_h is not None:
+                    h.append(rs_h)
+                if rs_heq is not None:
+                    heq.append(rs_heq)
+                if rs_grad_h is not None:
+                    grad_h.append(rs_grad_h)
+                if rs_grad_heq is not None:
+                    grad_heq.append(rs_grad_heq)
+            
+            return (np.concatenate(h, axis=1), np.concatenate(heq, axis=1),
+                    np.concatenate(grad_h, axis=1), np.concatenate(grad_heq, axis=1))
+        
+        
+        @staticmethod
+        def bufferKey(k) -> bytes:
+            '''
+            Key of the given input in the buffer. Copies the
+            values, as optimizers may modify `k` in place
+            '''
+            return np.ascontiguousarray(k, dtype=np.float64).tobytes()
+        
+        
         def updateBuffer(self, k, res):
             '''
-            Ensure buffer size < buffer_size and add
-            input-output pair into buffer
+            Add the input-output pair into the buffer,
+            evicting the least recently used pairs to
+            keep at most buffer_size pairs
             '''
-            if len(self.buffer) > self.buffer_size:
-                self.buffer.pop(0)
-                self.buffer.append((k, res))
-            else:
-                self.buffer.append((k, res))
+            if self.buffer_size < 1:
+                return
+            self.buffer[self.bufferKey(k)] = res
+            while len(self.buffer) > self.buffer_size:
+                self.buffer.popitem(last=False)
         
         
         def findBuffer(self, k) -> tuple | None:
@@ -254,7 +678,31 @@ class RtdTrajOpt:
             exists in the buffer, otherwise return
             None
             '''
-            for i in self.buffer:
-                if np.all(i[0] == k):
-                    return i[1]
-            return None
\ No newline at end of file
+            res = self.buffer.get(key := self.bufferKey(k))
+            if res is None:
+                self.misses += 1
+                return None
+            self.buffer.move_to_end(key)
+            self.hits += 1
+            return res
+    
+    
+    class working_set_constraints:
+        '''
+        A functor restricting the inequality constraints
+        of a merged constraint callback to the `rows` of
+        the working set, keeping all equality constraints
+        '''
+        def __init__(self, constraintCallback: Callable, rows: Vecnp):
+            self.constraintCallback = constraintCallback
+            self.rows = rows
+        
+        
+        def __call__(self, k) -> tuple:
+            (h, heq, grad_h, grad_heq) = self.constraintCallback(k)
+            return (h[self.rows], heq, grad_h[self.rows], grad_heq)
+        
+        
+        def batch(self, K) -> tuple:
+            (h, heq, grad_h, grad_heq) = self.constraintCallback.batch(K)
+            return (h[:,self.rows], heq, grad_h[:,self.rows], grad_heq)
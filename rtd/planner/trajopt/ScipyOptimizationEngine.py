@@ -1,32 +1,65 @@
 from rtd.planner.trajopt import OptimizationEngine, TrajOptProps
+from rtd.util.mixins import Options
 from scipy.optimize import minimize
 import numpy as np
+import time
 from typing import Callable
 from rtd.util.mixins.Typings import Vecnp
 
+# define top level module logger
+import logging
+logger = logging.getLogger(__name__)
 
 
-class ScipyOptimizationEngine(OptimizationEngine):
+
+class DeadlineExceeded(Exception):
+    '''
+    An exception raised inside of the callbacks to abort an optimization
+    once its wall-clock budget has run out
+    '''
+    pass
+
+
+
+class ScipyOptimizationEngine(OptimizationEngine, Options):
     '''
-    Optimization Engine based on scipy.optimize.fsolve
+    Optimization Engine based on scipy.optimize.minimize with SLSQP
+    
+    If `doTimeout` is set in the `TrajOptProps`, each solve is given a
+    wall-clock budget of `timeoutTime`. Once it runs out, the best feasible
+    iterate seen so far is returned, or a failure if there was none
     '''
+    @staticmethod
+    def defaultoptions() -> dict:
+        return {
+            "feasibility_tol": 1e-6,
+        }
+    
+    
     def __init__(self, trajOptProps: TrajOptProps, **options):
         # initialize base classes
         OptimizationEngine.__init__(self)
+        Options.__init__(self)
+        # initialize using given options
+        options = self.mergeoptions(options)
         # initialize other attributes
         self.trajOptProps: TrajOptProps = trajOptProps
+        self.feasibility_tol: float = options["feasibility_tol"]
     
     
     def performOptimization(self, initialGuess: Vecnp, objectiveCallback: Callable,
-            constraintCallback: Callable, bounds: dict) -> tuple[bool, Vecnp, float]:
+            constraintCallback: Callable, bounds: dict, deadline: float = None,
+            solveInfo: dict = None) -> tuple[bool, Vecnp, float]:
         '''
         Use scipy solve to perform the optimization
         
         Arguments:
             initialGuess: An initial guess Vecnp used for the optimization. May not be the correct size
-            objectiveCallback: A callback for the objective function of this specific optimization
+            objectiveCallback: A callback for the objective function of this specific optimization, returning the cost and its gradient
             constraintCallback: A callback for the nonlinear constraints, where the return time is expected to be [c, ceq, gc, gceq].
             bounds: A dict containing input and output bounds
+            deadline: Optional `time.perf_counter()` time by which the optimization has to return
+            solveInfo: Optional dict which is filled with `deadline_missed`, `time_to_first_feasible`, `solve_time` and `iterations`
         
         Returns:
             (success: bool, parameters: Vecnp, cost: float): `success`
@@ -34,6 +67,13 @@ class ScipyOptimizationEngine(OptimizationEngine):
             `parameters` are the trajectory parameters to use. `cost` is
             the final cost for the parameters found
         '''
+        start_time = time.perf_counter()
+        if self.trajOptProps.doTimeout:
+            solve_deadline = start_time + self.trajOptProps.timeoutTime
+            deadline = solve_deadline if deadline is None else min(deadline, solve_deadline)
+        if solveInfo is None:
+            solveInfo = dict()
+        
         # how many extra variables we need
         n_remainder = np.size(bounds["param_limits"], 0) - len(initialGuess)
         # get bounds
@@ -42,37 +82,106 @@ class ScipyOptimizationEngine(OptimizationEngine):
         # generate random values if requested, otherwise zeros for any
         # thing not in our initial guess
         if self.trajOptProps.randomInit:
-            initial_extra = np.random.uniform(lb[-n_remainder:], ub[-n_remainder:])
+            initial_extra = np.random.uniform(lb[len(initialGuess):], ub[len(initialGuess):])
         else:
             initial_extra = np.zeros(n_remainder)
         
         # build initial guess
         initialGuess = np.concatenate((initialGuess, initial_extra))
         
+        # keep track of the best feasible iterate, so we have something
+        # to return if we run out of time
+        best = {
+            'parameters': None,
+            'cost': np.inf,
+            'time_to_first_feasible': None,
+            'iterations': 0,
+        }
+        
+        def checkDeadline():
+            if deadline is not None and time.perf_counter() > deadline:
+                raise DeadlineExceeded()
+        
+        # the last evaluated point and its cost, as SLSQP reports its
+        # iterates after evaluating them
+        last = {
+            'parameters': None,
+            'cost': np.inf,
+        }
+        
+        def objective(k):
+            checkDeadline()
+            (cost, grad) = objectiveCallback(k)
+            last['parameters'] = np.copy(k)
+            last['cost'] = cost
+            return (cost, grad)
+        
+        def recordIterate(k):
+            best['iterations'] += 1
+            if last['parameters'] is not None and np.array_equal(k, last['parameters']):
+                cost = last['cost']
+            else:
+                (cost, _) = objectiveCallback(k)
+            if cost < best['cost'] and self.isFeasible(k, constraintCallback, lb, ub):
+                best['parameters'] = np.copy(k)
+                best['cost'] = cost
+                if best['time_to_first_feasible'] is None:
+                    best['time_to_first_feasible'] = time.perf_counter() - start_time
+            checkDeadline()
+        
         # optimization call
         ineqConstraint = lambda k: -constraintCallback(k)[0]
         eqConstraint = lambda k: constraintCallback(k)[1]
         ineqConstraintJac = lambda k: -constraintCallback(k)[2]
         eqConstraintJac = lambda k: constraintCallback(k)[3]
         
-        result = minimize(
-            fun=objectiveCallback,
-            x0=initialGuess,
-            method='SLSQP',
-            #jac=True,   # use second return of fun as jacobean
-            bounds=bounds["param_limits"],
-            constraints = [
-                {
-                    "type": 'eq',
-                    "fun": eqConstraint,
-                    "jac": eqConstraintJac,
-                },
-                {
-                    "type": 'ineq',
-                    "fun": ineqConstraint,
-                    "jac": ineqConstraintJac,
-                },          
-            ],
-        )
+        try:
+            result = minimize(
+                fun=objective,
+                x0=initialGuess,
+                method='SLSQP',
+                jac=True,   # use second return of fun as jacobean
+                bounds=bounds["param_limits"],
+                constraints = [
+                    {
+                        "type": 'eq',
+                        "fun": eqConstraint,
+                        "jac": eqConstraintJac,
+                    },
+                    {
+                        "type": 'ineq',
+                        "fun": ineqConstraint,
+                        "jac": ineqConstraintJac,
+                    },          
+                ],
+                callback=recordIterate,
+            )
+            output = (result.success, result.x, result.fun)
+            deadline_missed = False
+        except DeadlineExceeded:
+            # fall back to the best feasible iterate, or fail so that
+            # the agent keeps braking
+            if best['parameters'] is not None:
+                logger.warning(f"Optimization timed out, using best feasible iterate with cost {best['cost']}")
+                output = (True, best['parameters'], best['cost'])
+            else:
+                logger.warning("Optimization timed out without finding a feasible iterate")
+                output = (False, initialGuess, np.inf)
+            deadline_missed = True
         
-        return (result.success, result.x, result.fun)
\ No newline at end of file
+        solveInfo['deadline_missed'] = deadline_missed
+        solveInfo['time_to_first_feasible'] = best['time_to_first_feasible']
+        solveInfo['solve_time'] = time.perf_counter() - start_time
+        solveInfo['iterations'] = best['iterations']
+        return output
+    
+    
+    def isFeasible(self, k: Vecnp, constraintCallback: Callable, lb: Vecnp, ub: Vecnp) -> bool:
+        '''
+        Whether the parameters `k` satisfy the bounds and the nonlinear
+        constraints up to `feasibility_tol`
+        '''
+        (h, heq, _, _) = constraintCallback(k)
+        tol = self.feasibility_tol
+        return bool(np.all(k >= lb - tol) and np.all(k <= ub + tol)
+                    and np.all(h <= tol) and np.all(np.abs(heq) <= tol))
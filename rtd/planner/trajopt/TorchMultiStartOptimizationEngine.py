@@ -0,0 +1,232 @@
+from rtd.planner.trajopt import OptimizationEngine, TrajOptProps
+from rtd.util.mixins import Options
+import numpy as np
+import torch
+import time
+from typing import Callable
+from rtd.util.mixins.Typings import Vecnp
+
+# define top level module logger
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+class TorchMultiStartOptimizationEngine(OptimizationEngine, Options):
+    '''
+    Optimization Engine running a batch of starts at once with an augmented
+    Lagrangian method in torch
+    
+    Each iteration takes a projected gradient step on the augmented
+    Lagrangian of every start, with a step size adapted per start, and all
+    starts are evaluated together. If the objective or constraint callbacks
+    have a `batch` method taking a (n_starts, n_params) array, it is used to
+    evaluate the whole batch in one call, otherwise the starts are evaluated
+    one at a time. The lowest cost feasible point seen across all starts is
+    returned
+    
+    Each round of multiplier updates ends early once every start is
+    stationary, and the optimization stops once a round improves the best
+    feasible cost by less than `cost_tol`. As a first order method it is
+    slower than SLSQP on small convex problems, but the starts let it get
+    out of the local minima a single start from the initial guess falls in
+    '''
+    @staticmethod
+    def defaultoptions() -> dict:
+        return {
+            "num_starts": 32,
+            "outer_iterations": 10,
+            "inner_iterations": 20,
+            "penalty": 10.0,
+            "penalty_growth": 2.0,
+            "initial_step": 0.1,
+            "feasibility_tol": 1e-6,
+            "gradient_tol": 1e-6,
+            "cost_tol": 1e-6,
+        }
+    
+    
+    def __init__(self, trajOptProps: TrajOptProps, **options):
+        # initialize base classes
+        OptimizationEngine.__init__(self)
+        Options.__init__(self)
+        # initialize using given options
+        options = self.mergeoptions(options)
+        # initialize other attributes
+        self.trajOptProps: TrajOptProps = trajOptProps
+        self.num_starts: int = options["num_starts"]
+        self.outer_iterations: int = options["outer_iterations"]
+        self.inner_iterations: int = options["inner_iterations"]
+        self.penalty: float = options["penalty"]
+        self.penalty_growth: float = options["penalty_growth"]
+        self.initial_step: float = options["initial_step"]
+        self.feasibility_tol: float = options["feasibility_tol"]
+        self.gradient_tol: float = options["gradient_tol"]
+        self.cost_tol: float = options["cost_tol"]
+    
+    
+    def performOptimization(self, initialGuess: Vecnp, objectiveCallback: Callable,
+            constraintCallback: Callable, bounds: dict, deadline: float = None,
+            solveInfo: dict = None) -> tuple[bool, Vecnp, float]:
+        '''
+        Use a batched augmented Lagrangian method to perform the optimization
+        
+        Arguments:
+            initialGuess: An initial guess Vecnp used as the first start. May not be the correct size
+            objectiveCallback: A callback for the objective function of this specific optimization, returning the cost and its gradient
+            constraintCallback: A callback for the nonlinear constraints, where the return time is expected to be [c, ceq, gc, gceq].
+            bounds: A dict containing input and output bounds
+            deadline: Optional `time.perf_counter()` time by which the optimization has to return
+            solveInfo: Optional dict which is filled with `deadline_missed`, `time_to_first_feasible`, `solve_time` and `iterations`
+        
+        Returns:
+            (success: bool, parameters: Vecnp, cost: float): `success`
+            is if a feasible solution was found. `parameters` are the
+            trajectory parameters to use. `cost` is the final cost for
+            the parameters found
+        '''
+        start_time = time.perf_counter()
+        if self.trajOptProps.doTimeout:
+            solve_deadline = start_time + self.trajOptProps.timeoutTime
+            deadline = solve_deadline if deadline is None else min(deadline, solve_deadline)
+        if solveInfo is None:
+            solveInfo = dict()
+        
+        # get bounds, where the starts are sampled from a finite box
+        lb = torch.as_tensor(bounds["param_limits"][:,0], dtype=torch.double)
+        ub = torch.as_tensor(bounds["param_limits"][:,1], dtype=torch.double)
+        sample_lb = torch.where(torch.isinf(lb), -torch.ones_like(lb), lb)
+        sample_ub = torch.where(torch.isinf(ub), torch.ones_like(ub), ub)
+        
+        # the initial guess, completed like the scipy engine does, is the
+        # first start and the rest are sampled uniformly
+        n_params = lb.numel()
+        guess = torch.zeros(n_params, dtype=torch.double)
+        guess[:len(initialGuess)] = torch.as_tensor(np.asarray(initialGuess, dtype=float))
+        if self.trajOptProps.randomInit:
+            guess[len(initialGuess):] = sample_lb[len(initialGuess):] + torch.rand(n_params-len(initialGuess),
+                dtype=torch.double) * (sample_ub[len(initialGuess):] - sample_lb[len(initialGuess):])
+        x = sample_lb + torch.rand((self.num_starts, n_params), dtype=torch.double) * (sample_ub - sample_lb)
+        x[0] = guess
+        x = torch.clamp(x, lb, ub)
+        
+        # evaluate the starts
+        best = {
+            'parameters': None,
+            'cost': np.inf,
+            'time_to_first_feasible': None,
+        }
+        def evaluate(x: torch.Tensor) -> tuple[torch.Tensor, ...]:
+            evaluation = self.evalBatch(x, objectiveCallback, constraintCallback)
+            (f, _, h, heq, _, _) = evaluation
+            feasible = torch.all(h <= self.feasibility_tol, dim=1) & torch.all(heq.abs() <= self.feasibility_tol, dim=1)
+            if torch.any(feasible):
+                idx = torch.argmin(torch.where(feasible, f, torch.inf))
+                if f[idx] < best['cost']:
+                    best['parameters'] = x[idx].numpy().copy()
+                    best['cost'] = f[idx].item()
+                    if best['time_to_first_feasible'] is None:
+                        best['time_to_first_feasible'] = time.perf_counter() - start_time
+            return evaluation
+        
+        evaluation = evaluate(x)
+        lam = torch.zeros_like(evaluation[2])
+        mu = torch.zeros_like(evaluation[3])
+        rho = self.penalty
+        step = torch.full((self.num_starts, 1), self.initial_step, dtype=torch.double)
+        
+        iterations = 0
+        deadline_missed = False
+        for _ in range(self.outer_iterations):
+            L, grad_L = self.augmentedLagrangian(evaluation, lam, mu, rho)
+            previous_cost = best['cost']
+            for _ in range(self.inner_iterations):
+                if deadline is not None and time.perf_counter() > deadline:
+                    deadline_missed = True
+                    break
+                
+                # stop once every start is stationary
+                projected_grad = torch.linalg.norm(x - torch.clamp(x - grad_L, lb, ub), dim=1)
+                if torch.all(projected_grad <= self.gradient_tol):
+                    break
+                iterations += 1
+                
+                # take a projected gradient step for every start and only
+                # keep it for the starts where it decreased the lagrangian
+                x_new = torch.clamp(x - step*grad_L, lb, ub)
+                evaluation_new = evaluate(x_new)
+                L_new, grad_L_new = self.augmentedLagrangian(evaluation_new, lam, mu, rho)
+                accept = (L_new < L).unsqueeze(-1)
+                step = torch.where(accept, 1.5*step, 0.5*step)
+                x = torch.where(accept, x_new, x)
+                L = torch.where(accept.squeeze(-1), L_new, L)
+                grad_L = torch.where(accept, grad_L_new, grad_L)
+                evaluation = tuple(torch.where(accept.view((-1,) + (1,)*(new.dim()-1)), new, old)
+                                   for (new, old) in zip(evaluation_new, evaluation))
+            if deadline_missed:
+                logger.warning("Optimization timed out")
+                break
+            
+            # done once a round no longer improves the best feasible point
+            if previous_cost - best['cost'] <= self.cost_tol*max(1.0, abs(best['cost'])):
+                break
+            
+            # update the multipliers and the penalty
+            (_, _, h, heq, _, _) = evaluation
+            lam = torch.clamp(lam + rho*h, min=0)
+            mu = mu + rho*heq
+            rho *= self.penalty_growth
+        
+        solveInfo['deadline_missed'] = deadline_missed
+        solveInfo['time_to_first_feasible'] = best['time_to_first_feasible']
+        solveInfo['solve_time'] = time.perf_counter() - start_time
+        solveInfo['iterations'] = iterations
+        
+        if best['parameters'] is None:
+            return (False, guess.numpy(), np.inf)
+        return (True, best['parameters'], best['cost'])
+    
+    
+    @staticmethod
+    def augmentedLagrangian(evaluation: tuple[torch.Tensor, ...], lam: torch.Tensor, mu: torch.Tensor,
+                            rho: float) -> tuple[torch.Tensor, torch.Tensor]:
+        '''
+        Value and gradient of the augmented Lagrangian of each start for
+        the inequality multipliers `lam`, equality multipliers `mu` and
+        penalty `rho`
+        '''
+        (f, grad_f, h, heq, grad_h, grad_heq) = evaluation
+        w = torch.clamp(lam + rho*h, min=0)
+        v = mu + rho*heq
+        L = (f + torch.sum(w**2 - lam**2, dim=1)/(2*rho)
+             + torch.sum(mu*heq, dim=1) + 0.5*rho*torch.sum(heq**2, dim=1))
+        grad_L = (grad_f + torch.einsum('bm,bmn->bn', w, grad_h)
+                  + torch.einsum('bm,bmn->bn', v, grad_heq))
+        return L, grad_L
+    
+    
+    @staticmethod
+    def evalBatch(x: torch.Tensor, objectiveCallback: Callable,
+                  constraintCallback: Callable) -> tuple[torch.Tensor, ...]:
+        '''
+        Evaluate the objective, constraints and their gradients for a
+        batch of parameters, using the `batch` methods of the callbacks
+        if they have them
+        
+        Returns:
+            (f, grad_f, h, heq, grad_h, grad_heq) for the batch
+        '''
+        k = x.numpy()
+        if hasattr(objectiveCallback, 'batch'):
+            (f, grad_f) = objectiveCallback.batch(k)
+        else:
+            (f, grad_f) = zip(*(objectiveCallback(k_i) for k_i in k))
+        
+        if hasattr(constraintCallback, 'batch'):
+            (h, heq, grad_h, grad_heq) = constraintCallback.batch(k)
+        else:
+            (h, heq, grad_h, grad_heq) = zip(*(constraintCallback(k_i) for k_i in k))
+        
+        as_tensor = lambda a: torch.as_tensor(np.asarray(a, dtype=float))
+        return (as_tensor(f), as_tensor(grad_f), as_tensor(h), as_tensor(heq),
+                as_tensor(grad_h), as_tensor(grad_heq))
@@ -3,4 +3,5 @@ from rtd.planner.trajopt.Objective import Objective
 from rtd.planner.trajopt.GenericArmObjective import GenericArmObjective
 from rtd.planner.trajopt.OptimizationEngine import OptimizationEngine
 from rtd.planner.trajopt.ScipyOptimizationEngine import ScipyOptimizationEngine
+from rtd.planner.trajopt.TorchMultiStartOptimizationEngine import TorchMultiStartOptimizationEngine
 from rtd.planner.trajopt.RtdTrajOpt import RtdTrajOpt
\ No newline at end of file
@@ -0,0 +1,108 @@
+'''
+Sweep the zonotope reduction orders of the forward occupancy on recorded
+scenes and report the latency against the conservativeness of each setting
+
+Scenes are a list of `(robotState, worldState)` pairs saved with
+`torch.save`, for example by appending the arguments of
+`planner.planTrajectory` in the planner callback of the planner demo and
+saving the list at the end of the run. For every combination of orders,
+the forward occupancy and its obstacle constraints are generated for
+each scene, and the constraints are evaluated at random parameters. The
+conservativeness is the fraction of these parameters rejected by the
+constraints, so lower is better, as every setting is sound. The
+obstacle polytope cache is cleared before every repeat, so the times
+are those of the first planning cycle with the obstacles.
+
+Example:
+    python tune_reduction.py scenes.pt --urdf kinova.urdf --kinematics-orders 2 5 10 20 --constraint-orders 1 2 3 5
+'''
+if __name__ == '__main__':
+    #-------------------- imports --------------------#
+    print("Loading modules...")
+    from armour.agent import ArmourAgentInfo
+    from armour.reachsets import JRSGenerator, FOGenerator, ReductionPolicy
+    from rtd.planner.reachsets import PlanCycleContext
+    from urchin import URDF
+    import itertools
+    import argparse
+    import time
+    import numpy as np
+    import torch
+    
+    
+    
+    #-------------------- arguments --------------------#
+    parser = argparse.ArgumentParser(description="Sweep the zonotope reduction orders of the forward occupancy")
+    parser.add_argument("scenes", help="file of recorded (robotState, worldState) pairs saved with torch.save")
+    parser.add_argument("--urdf", required=True, help="URDF of the robot the scenes were recorded with")
+    parser.add_argument("--traj-type", default="piecewise", help="trajectory type, piecewise or bernstein")
+    parser.add_argument("--kinematics-orders", type=int, nargs="+", default=[2, 5, 10, 20])
+    parser.add_argument("--occupancy-orders", type=int, nargs="+", default=None)
+    parser.add_argument("--constraint-orders", type=int, nargs="+", default=[1, 2, 3, 5])
+    parser.add_argument("--far-distances", type=float, nargs="+", default=None,
+                        help="also sweep the adaptive rule, with far pairs at order 1")
+    parser.add_argument("--samples", type=int, default=1000, help="random parameters per scene")
+    parser.add_argument("--repeats", type=int, default=3, help="timed repeats of each scene")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    
+    
+    #-------------------- setup --------------------#
+    scenes = torch.load(args.scenes, weights_only=False)
+    print(f"Loaded {len(scenes)} scenes")
+    robot = ArmourAgentInfo(URDF.load(args.urdf))
+    jrsGenerator = JRSGenerator(robot, traj_type=args.traj_type)
+    rng = np.random.default_rng(args.seed)
+    
+    policies = list()
+    for (kinematics_order, occupancy_order, constraint_order, far_distance) in itertools.product(
+            args.kinematics_orders, args.occupancy_orders or [None], args.constraint_orders,
+            [None] + (args.far_distances or [])):
+        policies.append(ReductionPolicy(kinematics_order=kinematics_order, occupancy_order=occupancy_order,
+                                        constraint_order=constraint_order, far_distance=far_distance))
+    
+    
+    
+    #-------------------- sweep --------------------#
+    # per policy, the total generation, constraint and evaluation times,
+    # the rejected and total samples, and the number of constraints
+    results = {i: np.zeros(6) for i in range(len(policies))}
+    for (s, (robotState, worldState)) in enumerate(scenes):
+        print(f"Scene {s+1}/{len(scenes)}")
+        # the JRS is generated once per scene and shared by all policies
+        with PlanCycleContext() as context, context.activate():
+            jrsGenerator.getReachableSet(robotState, ignore_cache=True)
+            for (i, policy) in enumerate(policies):
+                foGenerator = FOGenerator(robot, jrsGenerator, reduction_policy=policy)
+                for _ in range(args.repeats):
+                    # every repeat starts without the obstacle polytopes of
+                    # the last one, so they're all timed the same way
+                    foGenerator.obstacle_cache.prune(set())
+                    t0 = time.perf_counter()
+                    instance = foGenerator.generateReachableSet(robotState)[1]
+                    t1 = time.perf_counter()
+                    constraint = instance.genNLConstraint(worldState)
+                    t2 = time.perf_counter()
+                    (lb, ub) = instance.input_range
+                    k = lb + rng.random((args.samples, instance.num_parameters)) * (ub - lb)
+                    h = constraint.batch(k)[0]
+                    t3 = time.perf_counter()
+                    results[i][:3] += (t1 - t0, t2 - t1, t3 - t2)
+                results[i][3] += np.sum(np.any(h > 0, axis=-1))
+                results[i][4] += args.samples
+                results[i][5] += h.shape[-1]
+    
+    
+    
+    #-------------------- report --------------------#
+    runs = len(scenes) * args.repeats
+    print(f"\n{'kin':>4} {'occ':>4} {'con':>4} {'far':>6} | {'fo [ms]':>8} {'con [ms]':>8} "
+          f"{'eval [ms]':>9} {'total [ms]':>10} | {'rows':>7} {'rejected':>8}")
+    for i in sorted(results, key=lambda i: results[i][:3].sum()):
+        (t_fo, t_con, t_eval, rejected, samples, rows) = results[i]
+        policy = policies[i]
+        print(f"{policy.kinematics_order:>4} {str(policy.occupancy_order):>4} {policy.constraint_order:>4} "
+              f"{str(policy.far_distance):>6} | {1000*t_fo/runs:>8.2f} {1000*t_con/runs:>8.2f} "
+              f"{1000*t_eval/runs:>9.2f} {1000*(t_fo+t_con+t_eval)/runs:>10.2f} | "
+              f"{rows/len(scenes):>7.1f} {rejected/samples:>8.3f}")
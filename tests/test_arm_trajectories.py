@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from rtd.entity.states import ArmRobotState
+from rtd.planner.trajectory import Trajectory
+from rtd.planner.trajopt import TrajOptProps, GenericArmObjective
+from armour.reachsets import JRSParams
+from armour.trajectory import ArmTrajectoryFactory, BernsteinArmTrajectory
+from armour.legacy import bernstein_to_poly, match_deg5_bernstein_coefficients
+
+
+
+TRAJ_TYPES = ("piecewise", "bernstein")
+
+
+def make_problem(traj_type: str):
+    rng = np.random.default_rng(0)
+    n_q = 3
+    startState = ArmRobotState(np.arange(n_q), np.arange(n_q, 2*n_q), np.arange(2*n_q, 3*n_q))
+    startState.time = 0.3
+    startState.state = rng.normal(size=(3*n_q, 1))
+    jrsParams = JRSParams(n_q, np.array([[-1.0]*n_q, [1.0]*n_q]), np.array([[-0.5, -1.0, -2.0], [0.5, 1.0, 2.0]]))
+    trajOptProps = TrajOptProps(planTime=0.5, horizonTime=1.0, timeForCost=0.6)
+    factory = ArmTrajectoryFactory(trajOptProps, traj_type)
+    # times before, around the braking and past the horizon
+    time = np.array([0.3, 0.5, 0.79, 0.81, 1.0, 1.29, 1.31, 2.0])
+    # one extra parameter, which the trajectories ignore
+    params = rng.uniform(-1, 1, (6, n_q + 1))
+    return (startState, jrsParams, trajOptProps, factory, time, params)
+
+
+
+@pytest.mark.parametrize("traj_type", TRAJ_TYPES)
+def test_command_batch_matches_loop(traj_type):
+    (startState, jrsParams, _, factory, time, params) = make_problem(traj_type)
+    batch = factory.getCommandBatch(startState, params, time, jrsInstance=jrsParams)
+    # the default implementation sets the parameters of a copy one at a time
+    trajectory = factory.createTrajectory(startState, jrsInstance=jrsParams)
+    looped = Trajectory.getCommandBatch(trajectory, params, time)
+    assert batch.shape == (6, 9, time.size)
+    assert np.allclose(batch, looped)
+    # and the trajectory itself is unchanged
+    assert trajectory.trajectoryParams is None
+
+
+@pytest.mark.parametrize("traj_type", TRAJ_TYPES)
+def test_position_gradient_batch(traj_type):
+    (startState, jrsParams, _, factory, time, params) = make_problem(traj_type)
+    trajectory = factory.createTrajectory(startState, jrsInstance=jrsParams)
+    grad = trajectory.getPositionGradientBatch(params, time)
+    eps = 1e-6
+    for (i, k) in enumerate(params):
+        trajectory.setParameters(k)
+        assert np.allclose(grad[i], trajectory.getPositionGradient(time))
+        # each joint only depends on its own parameter
+        for j in range(3):
+            dk = eps*np.eye(k.size)[j]
+            position = lambda k: factory.createTrajectory(startState, trajectoryParams=k,
+                                                          jrsInstance=jrsParams).getCommand(time).position
+            fd = (position(k + dk) - position(k - dk)) / (2*eps)
+            assert np.allclose(grad[i,j], fd[j], atol=1e-6)
+
+
+@pytest.mark.parametrize("traj_type", TRAJ_TYPES)
+def test_objective_batch_matches_loop(traj_type):
+    (startState, jrsParams, trajOptProps, factory, _, params) = make_problem(traj_type)
+    objective = GenericArmObjective(trajOptProps, factory).genObjective(
+        startState, np.array([0.1, 0.2, 0.3]), {"jrs": jrsParams})
+    (cost, grad) = objective.batch(params)
+    for (i, k) in enumerate(params):
+        (cost_i, grad_i) = objective(k)
+        assert np.isclose(cost[i], cost_i)
+        assert np.allclose(grad[i], grad_i)
+
+
+def test_bernstein_matches_legacy():
+    (startState, jrsParams, trajOptProps, _, time, params) = make_problem("bernstein")
+    trajectory = BernsteinArmTrajectory(trajOptProps, startState, jrsParams)
+    T = trajOptProps.horizonTime
+    t_scaled = (time - startState.time) / T
+    within = t_scaled < 1
+    for k in params:
+        trajectory.setParameters(k)
+        state = trajectory.getCommand(time).state
+        q_goal = startState.position + jrsParams.output_range[1] * k[:3]
+        # the monomial coefficients of each joint, converted one at a time
+        for j in range(3):
+            beta = match_deg5_bernstein_coefficients([startState.position[j], startState.velocity[j],
+                                                      startState.acceleration[j], q_goal[j], 0, 0], T)
+            alpha = bernstein_to_poly(beta, 6)
+            polys = [np.polynomial.Polynomial(alpha)]
+            polys += [polys[0].deriv(1), polys[0].deriv(2)]
+            for (i, poly) in enumerate(polys):
+                assert np.allclose(state[j + 3*i, within], poly(t_scaled[within]) / T**i)
+            assert np.allclose(state[j, ~within], q_goal[j])
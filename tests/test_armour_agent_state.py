@@ -0,0 +1,59 @@
+import numpy as np
+from types import SimpleNamespace
+from armour.agent import ArmourAgentState
+
+
+
+def make_state() -> ArmourAgentState:
+    state = ArmourAgentState(SimpleNamespace(n_q=3))
+    state.reset()
+    rng = np.random.default_rng(0)
+    for _ in range(3):
+        state.commit_state_data(np.linspace(0, 1, 101), rng.normal(size=(6, 101)))
+    return state
+
+
+def reference(state: ArmourAgentState, time) -> np.ndarray:
+    time = np.atleast_1d(time)
+    return np.stack([np.interp(time, state.time, state.state[i]) for i in range(state.n_states)])
+
+
+
+def test_matches_interp():
+    state = make_state()
+    step = state.time[-1] - 1
+    for time in (step + np.arange(0, 1.0001, 0.1),         # a coarser grid of the last step
+                 np.array([0.35, 2.2, 0.35, 99.0, -1.0]),   # unsorted, repeated and out of range
+                 np.array([0.35, 2.25]),                    # partly interpolated already
+                 1.234):
+        assert np.allclose(state.get_state(time).state, reference(state, time))
+    # the default is the last state
+    assert np.allclose(state.get_state().state, state.state[:,-1:])
+
+
+def test_step_grid_is_cached():
+    state = make_state()
+    step = state.time[-1] - 1
+    # the committed states of the step serve any grid of its times
+    for time in (step + np.linspace(0, 1, 101), step + np.arange(0, 1.0001, 0.1)):
+        state.get_state(time)
+    assert (state.cache_hits, state.cache_misses) == (112, 0)
+    
+    # new times are interpolated once, even if repeated
+    time = step + np.array([0.005, 0.005, 0.015])
+    state.get_state(time)
+    state.get_state(time)
+    assert (state.cache_hits, state.cache_misses) == (116, 2)
+    assert state.cache_hit_rate == 116 / 118
+    
+    # returned states don't share memory with the cache
+    state.get_state(time).state[:] = 0
+    assert np.allclose(state.get_state(time).state, reference(state, time))
+
+
+def test_commit_clears_cache():
+    state = make_state()
+    time = np.array([2.5, 3.5])
+    state.get_state(time)
+    state.commit_state_data(np.linspace(0, 1, 11), np.zeros((6, 11)))
+    assert np.allclose(state.get_state(time).state, reference(state, time))
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+import torch
+from types import SimpleNamespace
+pytest.importorskip("zonopy")
+from armour.reachsets.FOInstance import FOInstance
+
+
+
+def make_instance(FO_Z: list[torch.Tensor]) -> FOInstance:
+    jrsInstance = SimpleNamespace(n_q=len(FO_Z), n_k=len(FO_Z), input_range=np.array([[-1.0], [1.0]]))
+    return FOInstance([SimpleNamespace(Z=Z) for Z in FO_Z], jrsInstance)
+
+
+def box(center, half_widths, n_gens=None) -> torch.Tensor:
+    '''
+    Zonotope of an axis-aligned box, with the half widths split over
+    `n_gens` generators along each axis
+    '''
+    n_gens = 1 if n_gens is None else n_gens
+    G = torch.diag(torch.as_tensor(half_widths, dtype=torch.double) / n_gens).repeat(n_gens, 1)
+    return torch.cat((torch.as_tensor(center, dtype=torch.double).unsqueeze(0), G))
+
+
+
+def test_boxes_different_generator_counts():
+    # two time steps per link, with 3 and 6 generators
+    FO_Z = [torch.stack((box([0, 0, 0], [1, 1, 1]), box([1, 0, 0], [1, 1, 1]))),
+            torch.stack((box([4, 0, 0], [1, 2, 1], 2), box([6, 0, 0], [1, 2, 1], 2)))]
+    instance = make_instance(FO_Z)
+    obstacles = [SimpleNamespace(Z=box([3, 0, 0], [0.5, 0.5, 0.5])),
+                 SimpleNamespace(Z=box([20, 0, 0], [1, 1, 1]))]
+    
+    (FO_c, FO_r, obs_c, obs_r) = instance.boxes(obstacles)
+    assert FO_c.shape == (2, 2, 3) and FO_r.shape == (2, 2, 3)
+    assert torch.allclose(FO_c[1,1], torch.tensor([6.0, 0, 0], dtype=torch.double))
+    assert torch.allclose(FO_r[1], torch.tensor([1.0, 2, 1], dtype=torch.double))
+    assert torch.allclose(obs_r[0], torch.full((3,), 0.5, dtype=torch.double))
+    
+    # only the second link comes within reach of the first obstacle
+    overlap = instance.broadphase(obstacles)
+    assert overlap.tolist() == [[False, False], [True, False]]
+    clearance = instance.clearance(obstacles)
+    assert np.isclose(clearance[0,0].item(), 1.5)
+    assert np.isclose(clearance[1,0].item(), 0.5)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import torch
+from types import SimpleNamespace
+zp = pytest.importorskip("zonopy")
+from armour.reachsets import JLSGenerator, PolyZonotopeConstraints
+
+
+
+def make_jrs(n_t: int, generator: torch.Generator) -> SimpleNamespace:
+    '''
+    Two joints of one dimensional JRS sets batched over time, where the
+    second joint depends on both parameters
+    '''
+    make = lambda expMat, ids: zp.batchPolyZonotope(
+        torch.randn(n_t, 1 + expMat.shape[0] + 3, 1, dtype=torch.double, generator=generator),
+        n_dep_gens=expMat.shape[0], expMat=expMat, id=np.array(ids))
+    sets = lambda: [make(torch.tensor([[1], [2]]), [0]), make(torch.tensor([[1, 0], [1, 1]]), [0, 1])]
+    return SimpleNamespace(n_q=2, n_t=n_t, n_k=2, input_range=np.array([[-1.0, -1.0], [1.0, 1.0]]),
+                           q=sets(), dq=sets())
+
+
+def sliced(pz, k: np.ndarray) -> tuple[torch.Tensor, torch.Tensor]:
+    '''
+    Center and radius over time of a one dimensional batchPolyZonotope
+    sliced at k
+    '''
+    Z = pz.Z[...,0]
+    n_dep = pz.n_dep_gens
+    expMat = torch.as_tensor(pz.expMat)[:,np.argsort(pz.id)].double()
+    mono = torch.prod(torch.as_tensor(k[:len(pz.id)])**expMat, dim=-1)
+    return (Z[:,0] + (Z[:,1:n_dep+1]*mono).sum(-1), Z[:,n_dep+1:].abs().sum(-1))
+
+
+
+def test_bounds_match_reference():
+    jrs = make_jrs(6, torch.Generator().manual_seed(0))
+    joints = SimpleNamespace(position_limits=np.array([[-1.0, -np.inf], [1.0, 0.5]]),
+                             velocity_limits=np.array([[-2.0, -2.0], [2.0, np.inf]]))
+    robot = SimpleNamespace(info=SimpleNamespace(joints=joints))
+    jrsGenerator = SimpleNamespace(getReachableSet=lambda robotState, ignore_cache=False: {1: jrs})
+    instance = JLSGenerator(robot, jrsGenerator).generateReachableSet(None)[1]
+    
+    # every time step of each bound, in the order the instance stacks them
+    k = np.random.default_rng(0).uniform(-1, 1, 2)
+    constraints = PolyZonotopeConstraints.fromBatchPolyZonotopes(
+        instance.q_ub + instance.q_lb + instance.dq_ub + instance.dq_lb, 2, prune=False)
+    (h, _, grad_h, _) = constraints(k)
+    
+    # the supremum of the sliced set above the upper limit, and below the
+    # lower limit, with infinite limits replaced by 200 pi
+    q_lim = np.array([[-1.0, -200*np.pi], [1.0, 0.5]])
+    dq_lim = np.array([[-2.0, -2.0], [2.0, 200*np.pi]])
+    ref = list()
+    for (sets, limits) in ((jrs.q, q_lim), (jrs.dq, dq_lim)):
+        ub = [sliced(pz, k)[0] + sliced(pz, k)[1] - limits[1,j] for (j, pz) in enumerate(sets)]
+        lb = [limits[0,j] - (sliced(pz, k)[0] - sliced(pz, k)[1]) for (j, pz) in enumerate(sets)]
+        ref += ub + lb
+    assert np.allclose(h, torch.cat(ref).numpy())
+    
+    eps = 1e-6
+    fd = np.stack([(constraints(k + eps*e_i)[0] - constraints(k - eps*e_i)[0]) / (2*eps) for e_i in np.eye(2)], -1)
+    assert np.allclose(grad_h, fd, atol=1e-6)
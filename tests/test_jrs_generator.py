@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+import torch
+from armour.reachsets import JRSGenerator
+
+
+
+class batchPolyZonotope:
+    '''
+    Plain stand in with the attributes and constructor arguments of
+    zonopy's batchPolyZonotope which are saved
+    '''
+    def __init__(self, Z, n_dep_gens=0, expMat=None, id=None, compress=2, copy_Z=True):
+        self.Z = Z
+        self.n_dep_gens = n_dep_gens
+        self.expMat = expMat
+        self.id = id
+        self.compress = compress
+        self.copy_Z = copy_Z
+
+
+SET_TYPES = {'batchPolyZonotope': batchPolyZonotope}
+
+
+def make_set() -> batchPolyZonotope:
+    Z = torch.randn(4, 3, 2, dtype=torch.double)
+    return batchPolyZonotope(Z, n_dep_gens=2, expMat=torch.tensor([[1, 0], [0, 1]]), id=np.arange(2))
+
+
+def assert_same_set(loaded, pz):
+    assert type(loaded) is type(pz)
+    assert torch.equal(loaded.Z, pz.Z)
+    assert loaded.n_dep_gens == pz.n_dep_gens
+    assert torch.equal(loaded.expMat, pz.expMat)
+    assert np.array_equal(np.asarray(loaded.id), np.asarray(pz.id))
+
+
+def test_pack_unpack_plain_tensors():
+    pz = make_set()
+    packed = JRSGenerator.packSet(pz)
+    assert packed['type'] == 'batchPolyZonotope'
+    assert all(isinstance(packed[key], torch.Tensor) for key in ('Z', 'expMat', 'id'))
+    unpacked = JRSGenerator.unpackSet(packed, SET_TYPES)
+    assert_same_set(unpacked, pz)
+    # the saved sets are already compressed and own their tensors
+    assert unpacked.compress == 0 and not unpacked.copy_Z
+    
+    # only the zonopy types are saved
+    with pytest.raises(TypeError):
+        JRSGenerator.packSet(object())
+    with pytest.raises(TypeError):
+        JRSGenerator.unpackSet(dict(packed, type='object'), SET_TYPES)
+
+
+@pytest.mark.parametrize("load_mmap", (True, False))
+def test_save_load_plain_tensors(tmp_path, monkeypatch, load_mmap):
+    if load_mmap and not JRSGenerator.load_mmap:
+        pytest.skip("torch doesn't support memory mapped loading")
+    monkeypatch.setattr(JRSGenerator, "load_mmap", load_mmap)
+    load_args = list()
+    torch_load = torch.load
+    def recorded_load(*args, **kwargs):
+        load_args.append(kwargs)
+        return torch_load(*args, **kwargs)
+    monkeypatch.setattr(torch, "load", recorded_load)
+    
+    pz = make_set()
+    zonojrs = {key: [pz, pz] for key in JRSGenerator.jrs_keys}
+    zonojrs['g_k_orig'] = np.array([0.1, 0.2])
+    path = str(tmp_path / "jrs.pt")
+    JRSGenerator.saveJRS(path, zonojrs)
+    loaded = JRSGenerator.loadJRS(path, SET_TYPES)
+    
+    # memory mapped only if torch supports it
+    assert load_args[0].get('mmap', False) == load_mmap
+    assert load_args[0]['weights_only']
+    for key in JRSGenerator.jrs_keys:
+        assert len(loaded[key]) == 2
+        assert_same_set(loaded[key][0], pz)
+    # the set comes with the parameter range it was generated for
+    assert np.array_equal(loaded['g_k_orig'], zonojrs['g_k_orig'])
+
+
+def test_save_load_roundtrip(tmp_path):
+    zp = pytest.importorskip("zonopy")
+    Z = torch.randn(4, 3, 2, dtype=torch.double)
+    expMat = torch.tensor([[1, 0], [0, 1]])
+    pz = zp.batchPolyZonotope(Z, n_dep_gens=2, expMat=expMat, id=np.arange(2))
+    zonojrs = {key: [pz, pz] for key in JRSGenerator.jrs_keys}
+    zonojrs['g_k_orig'] = np.array([0.1, 0.2])
+    
+    path = str(tmp_path / "jrs.pt")
+    JRSGenerator.saveJRS(path, zonojrs)
+    loaded = JRSGenerator.loadJRS(path)
+    for key in JRSGenerator.jrs_keys:
+        assert len(loaded[key]) == 2
+        assert_same_set(loaded[key][0], pz)
+    assert np.array_equal(loaded['g_k_orig'], zonojrs['g_k_orig'])
+
+
+def test_load_invalid(tmp_path):
+    path = tmp_path / "jrs.pt"
+    assert JRSGenerator.loadJRS(str(path), SET_TYPES) is None
+    path.write_bytes(b"not a set")
+    assert JRSGenerator.loadJRS(str(path), SET_TYPES) is None
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+import torch
+pytest.importorskip("zonopy")
+from armour.reachsets.FOInstance import ObstacleConstraints
+
+
+
+class SlicedOccupancy:
+    '''
+    The parts of a batchPolyZonotope forward occupancy that the
+    constraints use, with `n_dep_gens` random dependent generators
+    '''
+    def __init__(self, n_t: int, n_dep_gens: int, ids: list[int], generator: torch.Generator):
+        self.n_dep_gens = n_dep_gens
+        self.Z = torch.randn(n_t, n_dep_gens + 3, 3, dtype=torch.double, generator=generator)
+        self.c = self.Z[:,0]
+        self.expMat = torch.randint(0, 3, (n_dep_gens, len(ids)), generator=generator)
+        self.id = np.array(ids)
+
+
+
+def make_pairs(n_t: int = 20):
+    generator = torch.Generator().manual_seed(0)
+    FO = [SlicedOccupancy(n_t, 4, [2, 0, 1], generator),
+          SlicedOccupancy(n_t, 6, [0, 1, 2, 3], generator),
+          SlicedOccupancy(n_t, 2, [1, 0], generator)]
+    A = [torch.randn(n_t, n_h, 3, dtype=torch.double, generator=generator) for n_h in (6, 12, 4)]
+    b = [torch.randn(n_t, n_h, dtype=torch.double, generator=generator) for n_h in (6, 12, 4)]
+    # degenerate halfspaces are NaN
+    A[0][5,2] = torch.nan
+    b[1][3,1] = torch.nan
+    return (A, b, FO)
+
+
+def reference(A, b, FO, k):
+    '''
+    The constraints of each pair and time step, evaluated one pair at a
+    time like the unbatched implementation
+    '''
+    h = list()
+    for (A_obs, b_obs, FO_j) in zip(A, b, FO):
+        expMat = FO_j.expMat[:,np.argsort(FO_j.id)].double()
+        mono = torch.prod(torch.as_tensor(k[:len(FO_j.id)])**expMat, dim=-1)
+        x = FO_j.Z[:,0] + (FO_j.Z[:,1:FO_j.n_dep_gens+1] * mono[None,:,None]).sum(1)
+        dist = (A_obs @ x.unsqueeze(-1)).squeeze(-1) - b_obs
+        h.append(-dist.nan_to_num(-torch.inf).max(-1)[0])
+    return torch.stack(h).numpy()
+
+
+def finite_difference(f, k, eps=1e-6):
+    return np.stack([(f(k + eps*e_i) - f(k - eps*e_i)) / (2*eps) for e_i in np.eye(k.size)], axis=-1)
+
+
+
+def test_matches_reference():
+    (A, b, FO) = make_pairs()
+    constraint = ObstacleConstraints(A, b, FO, 5)
+    k = np.random.default_rng(0).uniform(-1, 1, 6)
+    # a zero element still has exact gradients
+    k[1] = 0
+    (h, heq, grad_h, grad_heq) = constraint(k)
+    assert heq is None and grad_heq is None
+    assert np.allclose(h, reference(A, b, FO, k).ravel())
+    assert grad_h.shape == (h.size, 6)
+    assert np.allclose(grad_h, finite_difference(lambda k: reference(A, b, FO, k).ravel(), k), atol=1e-6)
+
+
+def test_batch_matches_single():
+    (A, b, FO) = make_pairs()
+    constraint = ObstacleConstraints(A, b, FO, 5)
+    K = np.random.default_rng(1).uniform(-1, 1, (4, 6))
+    (h, _, grad_h, _) = constraint.batch(K)
+    for (i, k) in enumerate(K):
+        (h_i, _, grad_h_i, _) = constraint(k)
+        assert np.allclose(h[i], h_i)
+        assert np.allclose(grad_h[i], grad_h_i)
+
+
+def test_no_pairs():
+    constraint = ObstacleConstraints([], [], [], 5)
+    (h, _, grad_h, _) = constraint(np.zeros(6))
+    assert h.shape == (0,) and grad_h.shape == (0, 6)
+
+
+def test_smooth_max():
+    (A, b, FO) = make_pairs()
+    beta = 50.0
+    constraint = ObstacleConstraints(A, b, FO, 5, smooth_beta=beta)
+    k = np.random.default_rng(2).uniform(-1, 1, 6)
+    (h, _, grad_h, _) = constraint(k)
+    # one conservative constraint per pair, at most log(n_t)/beta above the largest
+    h_max = reference(A, b, FO, k).max(-1)
+    assert h.shape == (3,)
+    assert np.all(h >= h_max - 1e-12)
+    assert np.all(h <= h_max + np.log(20)/beta + 1e-12)
+    assert np.allclose(grad_h, finite_difference(lambda k: constraint(k)[0], k), atol=1e-5)
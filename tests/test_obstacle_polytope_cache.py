@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import torch
+from itertools import combinations
+from types import SimpleNamespace
+from armour.reachsets import ObstaclePolytopeCache
+
+
+
+def sorted_rows(A: torch.Tensor, b: torch.Tensor) -> np.ndarray:
+    rows = torch.cat((A, b.unsqueeze(-1)), dim=-1).numpy().round(9)
+    return rows[np.lexsort(rows.T[::-1])]
+
+
+def make_obstacle(seed: int, n_gens: int = 4) -> SimpleNamespace:
+    generator = torch.Generator().manual_seed(seed)
+    return SimpleNamespace(Z=torch.randn(n_gens+1, 3, dtype=torch.double, generator=generator))
+
+
+def test_polytope_is_exact():
+    obs = make_obstacle(0)
+    G_buf = torch.randn(2, 5, 3, dtype=torch.double, generator=torch.Generator().manual_seed(1))
+    (A, b) = ObstaclePolytopeCache().polytope(obs, G_buf)
+    assert A.shape == (2, 2*(6 + 4*5 + 10), 3)
+    
+    for t in range(2):
+        # every offset is the support function of the buffered zonotope
+        c = obs.Z[0]
+        G = torch.cat((obs.Z[1:], G_buf[t]))
+        support = A[t] @ c + (A[t] @ G.T).abs().sum(-1)
+        assert torch.allclose(b[t], support)
+        
+        # and the points of the zonotope are inside of it
+        beta = torch.rand(1000, G.shape[0], dtype=torch.double, generator=torch.Generator().manual_seed(t))*2 - 1
+        points = c + beta @ G
+        assert torch.all(points @ A[t].T <= b[t] + 1e-9)
+        # including the vertices which attain the support
+        vertices = c + torch.sign(A[t] @ G.T) @ G
+        assert torch.allclose((vertices * A[t]).sum(-1), b[t])
+
+
+def test_repeated_obstacle_is_a_hit():
+    cache = ObstaclePolytopeCache()
+    obs = make_obstacle(0)
+    G_buf = torch.randn(1, 3, 3, dtype=torch.double)
+    (A, b) = cache.polytope(obs, G_buf)
+    assert (cache.hits, cache.misses) == (0, 1)
+    
+    # the key is the content of Z, so a copy of the obstacle is a hit
+    copy = SimpleNamespace(Z=obs.Z.clone())
+    assert cache.obstacleKey(copy) == cache.obstacleKey(obs)
+    (A_copy, b_copy) = cache.polytope(copy, G_buf)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert torch.equal(A, A_copy) and torch.equal(b, b_copy)
+    
+    # and a moved obstacle is a miss
+    moved = SimpleNamespace(Z=obs.Z.clone())
+    moved.Z[0] += 0.1
+    cache.polytope(moved, G_buf)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_prune_drops_unseen_obstacles():
+    cache = ObstaclePolytopeCache()
+    obstacles = [make_obstacle(seed) for seed in range(3)]
+    keys = [cache.obstacleKey(obs) for obs in obstacles]
+    for (obs, key) in zip(obstacles, keys):
+        cache.obstacleData(obs, key)
+    assert cache.misses == 3
+    
+    # only the obstacles seen in this cycle are kept
+    cache.prune({keys[0], keys[2]})
+    cache.obstacleData(obstacles[0], keys[0])
+    cache.obstacleData(obstacles[2], keys[2])
+    assert (cache.hits, cache.misses) == (2, 3)
+    cache.obstacleData(obstacles[1], keys[1])
+    assert (cache.hits, cache.misses) == (2, 4)
+    
+    cache.prune(set())
+    cache.obstacleData(obstacles[0], keys[0])
+    assert (cache.hits, cache.misses) == (2, 5)
+
+
+def test_combination_table_pairs():
+    pytest.importorskip("zonopy")
+    from armour.reachsets import FOGenerator
+    combs = FOGenerator.generate_combinations_upto(20)
+    assert combs is FOGenerator.generate_combinations_upto(20)
+    for n in range(2, 21):
+        assert sorted(map(tuple, combs[n-1].tolist())) == list(combinations(range(n), 2))
+    
+    # the pairs from the table give the same halfspaces
+    obs = make_obstacle(0)
+    G_buf = torch.randn(2, 5, 3, dtype=torch.double)
+    (A, b) = ObstaclePolytopeCache().polytope(obs, G_buf)
+    (A_combs, b_combs) = ObstaclePolytopeCache(combs).polytope(obs, G_buf)
+    for t in range(2):
+        assert np.allclose(sorted_rows(A[t], b[t]), sorted_rows(A_combs[t], b_combs[t]))
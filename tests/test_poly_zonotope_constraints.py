@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+import torch
+from types import SimpleNamespace
+pytest.importorskip("zonopy")
+from armour.reachsets import PolyZonotopeConstraints
+
+
+
+def make_pz(Z: torch.Tensor, n_dep_gens: int, expMat: torch.Tensor, ids: list[int]) -> SimpleNamespace:
+    '''
+    The parts of a one dimensional (batch)PolyZonotope which the
+    constraints use
+    '''
+    return SimpleNamespace(Z=Z, c=Z[...,0,:], G=Z[...,1:n_dep_gens+1,:], Grest=Z[...,n_dep_gens+1:,:],
+                           n_dep_gens=n_dep_gens, expMat=expMat, id=np.array(ids))
+
+
+def make_pzs(generator: torch.Generator) -> list[SimpleNamespace]:
+    pzs = list()
+    for (n_dep, ids) in ((3, [1, 0]), (5, [0, 1, 2]), (0, [])):
+        Z = torch.randn(n_dep + 3, 1, dtype=torch.double, generator=generator)
+        pzs.append(make_pz(Z, n_dep, torch.randint(0, 3, (n_dep, len(ids)), generator=generator), ids))
+    return pzs
+
+
+def reference(pzs: list, k: np.ndarray) -> np.ndarray:
+    '''
+    Supremum of each polyZonotope sliced at k, one at a time
+    '''
+    h = list()
+    for pz in pzs:
+        expMat = pz.expMat[:,np.argsort(pz.id)].double()
+        mono = torch.prod(torch.as_tensor(k[:len(pz.id)])**expMat, dim=-1)
+        h.append((pz.c.sum() + (pz.G[:,0]*mono).sum() + pz.Grest.abs().sum()).item())
+    return np.array(h)
+
+
+def finite_difference(f, k, eps=1e-6):
+    return np.stack([(f(k + eps*e_i) - f(k - eps*e_i)) / (2*eps) for e_i in np.eye(k.size)], axis=-1)
+
+
+
+def test_matches_reference():
+    pzs = make_pzs(torch.Generator().manual_seed(0))
+    constraints = PolyZonotopeConstraints.fromPolyZonotopes(pzs, 3)
+    # an extra parameter which the constraints don't depend on
+    k = np.random.default_rng(0).uniform(-1, 1, 4)
+    (h, heq, grad_h, grad_heq) = constraints(k)
+    assert heq is None and grad_heq is None
+    assert np.allclose(h, reference(pzs, k))
+    assert grad_h.shape == (3, 4)
+    assert np.allclose(grad_h, finite_difference(lambda k: reference(pzs, k), k), atol=1e-6)
+    assert np.all(grad_h[:,3] == 0)
+
+
+def test_batch_matches_single():
+    pzs = make_pzs(torch.Generator().manual_seed(1))
+    constraints = PolyZonotopeConstraints.fromPolyZonotopes(pzs, 3)
+    K = np.random.default_rng(1).uniform(-1, 1, (5, 3))
+    (h, _, grad_h, _) = constraints.batch(K)
+    for (i, k) in enumerate(K):
+        (h_i, _, grad_h_i, _) = constraints(k)
+        assert np.allclose(h[i], h_i)
+        assert np.allclose(grad_h[i], grad_h_i)
+
+
+def test_batch_poly_zonotopes_match_elements():
+    generator = torch.Generator().manual_seed(2)
+    n_t = 8
+    bpzs = list()
+    for (n_dep, ids) in ((2, [2, 0]), (4, [0, 1, 2])):
+        Z = torch.randn(n_t, n_dep + 2, 1, dtype=torch.double, generator=generator)
+        bpzs.append(make_pz(Z, n_dep, torch.randint(0, 3, (n_dep, len(ids)), generator=generator), ids))
+    elements = [make_pz(bpz.Z[t], bpz.n_dep_gens, bpz.expMat, bpz.id) for bpz in bpzs for t in range(n_t)]
+    k = np.random.default_rng(2).uniform(-1, 1, 3)
+    
+    # without pruning, every element becomes a constraint in order
+    constraints = PolyZonotopeConstraints.fromBatchPolyZonotopes(bpzs, 3, prune=False)
+    (h, _, grad_h, _) = constraints(k)
+    (h_ref, _, grad_h_ref, _) = PolyZonotopeConstraints.fromPolyZonotopes(elements, 3)(k)
+    assert np.allclose(h, h_ref)
+    assert np.allclose(grad_h, grad_h_ref)
+    
+    # pruning drops the elements whose supremum is below zero everywhere
+    sup = np.array([(pz.Z[0] + pz.Z[1:].abs().sum()).item() for pz in elements])
+    pruned = PolyZonotopeConstraints.fromBatchPolyZonotopes(bpzs, 3)
+    assert pruned.n_c == np.sum(sup >= 0)
+    assert np.allclose(pruned(k)[0], h_ref[sup >= 0])
+
+
+def test_no_constraints():
+    constraints = PolyZonotopeConstraints.fromBatchPolyZonotopes([], 3)
+    (h, _, grad_h, _) = constraints(np.zeros(3))
+    assert h.shape == (0,) and grad_h.shape == (0, 3)
@@ -0,0 +1,27 @@
+import numpy as np
+import torch
+from rtd.functional.polynomials import horner, monomials
+
+
+
+def test_horner_matches_polyval():
+    rng = np.random.default_rng(0)
+    coefs = rng.normal(size=(4, 3, 6))
+    t = np.linspace(0, 1, 11)
+    value = horner(coefs, t)
+    assert value.shape == (4, 3, 11)
+    assert np.allclose(value, np.polynomial.polynomial.polyval(t, np.moveaxis(coefs, -1, 0)))
+    # a constant is broadcast over the times
+    assert np.allclose(horner(np.array([2.0]), t), np.full(11, 2.0))
+
+
+
+def test_monomials_gradient():
+    rng = np.random.default_rng(1)
+    expMat = torch.as_tensor(rng.integers(0, 4, (5, 3)), dtype=torch.double)
+    # a zero element still has exact gradients
+    k = torch.tensor([0.7, 0.0, -1.3], dtype=torch.double)
+    (mono, grad_mono) = monomials(k, expMat)
+    assert torch.allclose(mono, torch.prod(k**expMat, dim=-1))
+    jacobian = torch.autograd.functional.jacobian(lambda k: torch.prod(k**expMat, dim=-1), k)
+    assert torch.allclose(grad_mono, jacobian)
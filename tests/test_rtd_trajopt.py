@@ -0,0 +1,291 @@
+import numpy as np
+import pytest
+import threading
+from rtd.planner.reachsets import ReachSetGenerator, ReachSetInstance
+from rtd.planner.trajopt import Objective, TrajOptProps, ScipyOptimizationEngine, TorchMultiStartOptimizationEngine, RtdTrajOpt
+from rtd.planner.trajectory import Trajectory, TrajectoryFactory
+
+
+
+class ShiftInstance(ReachSetInstance):
+    '''
+    Three parameters with the constraint k_0 + k_1 >= shift
+    '''
+    def __init__(self, shift: float):
+        ReachSetInstance.__init__(self)
+        self.input_range = np.array([[-1.0], [1.0]])
+        self.num_parameters = 3
+        self.shift = shift
+    
+    
+    def genNLConstraint(self, worldState):
+        def constraint(k):
+            grad = np.zeros((1, k.size))
+            grad[0,:2] = -1
+            return (np.array([self.shift - k[0] - k[1]]), None, grad, None)
+        constraint.shift = self.shift
+        return constraint
+
+
+
+class ShiftGenerator(ReachSetGenerator):
+    def __init__(self, shifts: list[float]):
+        ReachSetGenerator.__init__(self)
+        self.cache_max_size = 0
+        self.shifts = shifts
+    
+    
+    def generateReachableSet(self, robotState, **options):
+        return {i: ShiftInstance(shift) for (i, shift) in enumerate(self.shifts)}
+
+
+
+class HalfspaceInstance(ShiftInstance):
+    '''
+    Three parameters with the constraints A k[:2] <= b
+    '''
+    def __init__(self, A: np.ndarray, b: np.ndarray):
+        ShiftInstance.__init__(self, 0.0)
+        self.A = A
+        self.b = b
+    
+    
+    def genNLConstraint(self, worldState):
+        def constraint(k):
+            grad = np.zeros((self.A.shape[0], k.size))
+            grad[:,:2] = self.A
+            return (self.A @ k[:2] - self.b, None, grad, None)
+        return constraint
+
+
+
+class DistanceObjective(Objective):
+    def genObjective(self, robotState, waypoint, reachableSets):
+        return lambda k: (float(np.sum((k - waypoint)**2)), 2*(k - waypoint))
+
+
+
+class BatchDistanceObjective(Objective):
+    def genObjective(self, robotState, waypoint, reachableSets):
+        objective = lambda k: (float(np.sum((k - waypoint)**2)), 2*(k - waypoint))
+        objective.batch = lambda K: (np.sum((K - waypoint)**2, axis=1), 2*(K - waypoint))
+        return objective
+
+
+
+class ParameterFactory(TrajectoryFactory):
+    def createTrajectory(self, robotState, rsInstances=None, trajectoryParams=None, **options):
+        return trajectoryParams
+
+
+
+class ParameterTrajectory(Trajectory):
+    def __init__(self, trajectoryParams):
+        Trajectory.__init__(self)
+        self.setParameters(trajectoryParams)
+    
+    
+    def validate(self, throwOnError: bool = False) -> bool:
+        return self.trajectoryParams is not None
+    
+    
+    def setParameters(self, trajectoryParams, **options):
+        self.trajectoryParams = trajectoryParams
+    
+    
+    def getCommand(self, time):
+        return self.trajectoryParams
+
+
+
+class ParameterTrajectoryFactory(TrajectoryFactory):
+    def createTrajectory(self, robotState, rsInstances=None, trajectoryParams=None, **options):
+        return ParameterTrajectory(trajectoryParams)
+
+
+
+def make_trajopt(shifts: list[float], objective: Objective = None, engine: type = ScipyOptimizationEngine,
+                 **options) -> RtdTrajOpt:
+    trajOptProps = TrajOptProps()
+    objective = DistanceObjective() if objective is None else objective
+    return RtdTrajOpt(trajOptProps, {'shift': ShiftGenerator(shifts)}, objective,
+                      engine(trajOptProps), ParameterFactory(), **options)
+
+
+
+def test_picks_lowest_cost_problem():
+    trajopt = make_trajopt([1.0, 0.4])
+    (trajectory, cost, info) = trajopt.solveTrajOpt(None, None, np.array([0.1, -0.3, 0.6]))
+    assert info['solution_idx'] == 1
+    assert trajectory[0] + trajectory[1] >= 0.4 - 1e-6
+    assert np.isclose(cost, np.sum((trajectory - np.array([0.1, -0.3, 0.6]))**2))
+
+
+def test_infeasible_reports_first_problem():
+    trajopt = make_trajopt([5.0, 6.0, 7.0])
+    (trajectory, cost, info) = trajopt.solveTrajOpt(None, None, np.zeros(3))
+    assert trajectory is None
+    assert info['solution_idx'] == -1
+    assert info['nlconCallbacks']['shift'].shift == 5.0
+
+
+
+def test_replan_warm_start_random_init():
+    trajOptProps = TrajOptProps(randomInit=True)
+    trajopt = RtdTrajOpt(trajOptProps, {'shift': ShiftGenerator([0.4])}, DistanceObjective(),
+                         ScipyOptimizationEngine(trajOptProps), ParameterTrajectoryFactory())
+    waypoint = np.array([0.5, 0.3, 0.6])
+    (trajectory, _, _) = trajopt.solveTrajOpt(None, None, waypoint)
+    # the previous trajectory is a full length guess for the next plan
+    (trajectory, _, info) = trajopt.solveTrajOpt(None, None, waypoint, trajectory)
+    assert info['solution_idx'] == 0
+    assert info['warm_start']
+    assert trajectory.trajectoryParams.shape == (3,)
+
+
+def test_replan_warm_start_longer_trajectory():
+    trajOptProps = TrajOptProps()
+    trajopt = RtdTrajOpt(trajOptProps, {'shift': ShiftGenerator([0.4])}, DistanceObjective(),
+                         ScipyOptimizationEngine(trajOptProps), ParameterTrajectoryFactory())
+    waypoint = np.array([0.5, 0.3, 0.6])
+    # a previous trajectory with more parameters than the problem has
+    previous = ParameterTrajectory(np.array([0.5, 0.3, 0.6, 0.2, -0.1]))
+    (trajectory, _, info) = trajopt.solveTrajOpt(None, None, waypoint, previous)
+    assert info['solution_idx'] == 0
+    assert info['warm_start']
+    assert np.array_equal(info['guess'], waypoint)
+    assert trajectory.trajectoryParams.shape == (3,)
+
+
+def test_cancel_batch_objective():
+    trajopt = make_trajopt([0.4], BatchDistanceObjective(), TorchMultiStartOptimizationEngine)
+    cancelEvent = threading.Event()
+    problem = trajopt.solveProblem(0, {'shift': ShiftInstance(0.4)}, None, None, np.zeros(3),
+                                   cancelEvent=cancelEvent)
+    assert problem['success'] and not problem['cancelled']
+    
+    # the engine only evaluates the batch objective
+    cancelEvent.set()
+    problem = trajopt.solveProblem(0, {'shift': ShiftInstance(0.4)}, None, None, np.zeros(3),
+                                   cancelEvent=cancelEvent)
+    assert problem['cancelled']
+
+
+
+class CountingConstraint:
+    '''
+    Two inequality constraints linear in the first two parameters,
+    counting how often they are evaluated
+    '''
+    def __init__(self, A: np.ndarray):
+        self.A = A
+        self.calls = 0
+    
+    
+    def __call__(self, k):
+        self.calls += 1
+        grad = np.zeros((self.A.shape[0], k.size))
+        grad[:,:2] = self.A
+        return (self.A @ k[:2], None, grad, None)
+
+
+
+def test_merge_constraints_memo():
+    first = CountingConstraint(np.array([[1.0, 2.0], [0.0, -1.0]]))
+    second = CountingConstraint(np.array([[3.0, 1.0]]))
+    merged = RtdTrajOpt.merge_constraints({'a': first, 'b': second, 'c': None}, buffer_size=2)
+    
+    k = np.array([0.5, -0.25, 1.0])
+    (h, heq, grad_h, grad_heq) = merged(k)
+    assert np.allclose(h, [0.0, 0.25, 1.25])
+    assert heq.shape == (0,) and grad_heq.shape == (0, 3)
+    assert grad_h.shape == (3, 3)
+    
+    # the same values hit the memo, even if the input was modified since
+    k_copy = k.copy()
+    k[0] = 10.0
+    assert merged(k_copy)[0] is h
+    assert (first.calls, merged.hits) == (1, 1)
+    assert not np.allclose(merged(k)[0], h)
+    
+    # the least recently used entry is evicted
+    merged(np.zeros(3))
+    merged(k_copy)
+    assert first.calls == 4
+
+
+def test_merge_constraints_batch():
+    first = CountingConstraint(np.array([[1.0, 2.0], [0.0, -1.0]]))
+    second = CountingConstraint(np.array([[3.0, 1.0]]))
+    merged = RtdTrajOpt.merge_constraints({'a': first, 'b': second})
+    
+    K = np.random.default_rng(0).normal(size=(5, 3))
+    (h, heq, grad_h, grad_heq) = merged.batch(K)
+    for (i, k) in enumerate(K):
+        (h_i, _, grad_h_i, _) = merged(k)
+        assert np.allclose(h[i], h_i)
+        assert np.allclose(grad_h[i], grad_h_i)
+    assert heq.shape == (5, 0) and grad_heq.shape == (5, 0, 3)
+
+
+def make_halfspaces() -> dict:
+    # a polygon around the origin, where the waypoint is outside of it
+    angles = np.linspace(0, 2*np.pi, 40, endpoint=False)
+    A = np.stack((np.cos(angles), np.sin(angles)), axis=-1)
+    return {'shift': HalfspaceInstance(A, np.ones(40))}
+
+
+def test_cutting_planes_match_full_solve():
+    waypoint = np.array([2.0, 1.5, 0.5])
+    full = make_trajopt([]).solveProblem(0, make_halfspaces(), None, None, waypoint)
+    trajopt = make_trajopt([], cutting_planes=True, working_set_size=2)
+    cutting = trajopt.solveProblem(0, make_halfspaces(), None, None, waypoint)
+    assert full['success'] and cutting['success']
+    assert np.allclose(cutting['parameter'], full['parameter'], atol=1e-5)
+    assert cutting['solve_info']['working_set_size'] < 40
+    assert cutting['solve_info']['cutting_plane_rounds'] > 1
+
+
+def test_cutting_planes_need_a_round():
+    trajopt = make_trajopt([], cutting_planes=True, max_cutting_plane_rounds=0)
+    with pytest.raises(ValueError):
+        trajopt.solveProblem(0, make_halfspaces(), None, None, np.zeros(3))
+
+
+def test_cutting_planes_rank_at_engine_start():
+    guesses = list()
+    class RecordingEngine(ScipyOptimizationEngine):
+        def performOptimization(self, initialGuess, *args, **kwargs):
+            guesses.append(np.copy(initialGuess))
+            return ScipyOptimizationEngine.performOptimization(self, initialGuess, *args, **kwargs)
+    
+    trajOptProps = TrajOptProps(randomInit=True)
+    trajopt = RtdTrajOpt(trajOptProps, {'shift': ShiftGenerator([])}, DistanceObjective(),
+                         RecordingEngine(trajOptProps), ParameterFactory(), cutting_planes=True)
+    ranked = list()
+    halfspaces = make_halfspaces()
+    constraint = halfspaces['shift'].genNLConstraint
+    def genNLConstraint(worldState):
+        callback = constraint(worldState)
+        def recorded(k):
+            ranked.append(np.copy(k))
+            return callback(k)
+        return recorded
+    halfspaces['shift'].genNLConstraint = genNLConstraint
+    trajopt.solveProblem(0, halfspaces, None, None, np.array([2.0, 1.5, 0.5]))
+    # the random guess the engine starts from is the one the working set is ranked at
+    assert guesses[0].shape == (3,)
+    assert np.array_equal(ranked[0], guesses[0])
+
+
+def test_parallel_good_enough_cancels_pending():
+    # with one worker, the rest of the problems are still pending when
+    # the first one is good enough
+    trajopt = make_trajopt([0.1]*8, parallel_solve=True, max_workers=1, good_enough_cost=100.0)
+    (trajectory, cost, info) = trajopt.solveTrajOpt(None, None, np.zeros(3))
+    assert info['solution_idx'] != -1
+    assert info['successes'][info['solution_idx']]
+    assert len(info['cancelled']) > 0
+    assert info['solution_idx'] not in info['cancelled']
+    assert trajectory[0] + trajectory[1] >= 0.1 - 1e-6
+    assert np.isclose(cost, np.sum(trajectory**2))
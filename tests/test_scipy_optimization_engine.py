@@ -0,0 +1,39 @@
+import numpy as np
+from rtd.planner.trajopt import TrajOptProps, ScipyOptimizationEngine
+
+
+
+def make_problem():
+    '''
+    Minimize |k - 1|^2 subject to k_0 + k_1 <= 1, where the optimum is
+    k = (0.5, 0.5, 1) with cost 0.5. Counts the objective evaluations
+    '''
+    calls = [0]
+    def objective(k):
+        calls[0] += 1
+        return (float(np.sum((k - 1)**2)), 2*(k - 1))
+    def constraint(k):
+        return (np.array([k[0] + k[1] - 1.0]), np.empty(0), np.array([[1.0, 1.0, 0.0]]), np.empty((0, 3)))
+    bounds = {'param_limits': np.array([[-2.0, 2.0]]*3)}
+    return (objective, constraint, bounds, calls)
+
+
+
+def test_known_optimum():
+    (objective, constraint, bounds, _) = make_problem()
+    engine = ScipyOptimizationEngine(TrajOptProps())
+    (success, parameters, cost) = engine.performOptimization(np.zeros(3), objective, constraint, bounds)
+    assert success
+    assert np.allclose(parameters, [0.5, 0.5, 1.0], atol=1e-5)
+    assert np.isclose(cost, 0.5)
+
+
+def test_iterates_reuse_objective():
+    (objective, constraint, bounds, calls) = make_problem()
+    engine = ScipyOptimizationEngine(TrajOptProps())
+    solveInfo = dict()
+    engine.performOptimization(np.zeros(3), objective, constraint, bounds, solveInfo=solveInfo)
+    # every iterate is evaluated by SLSQP, so recording it mustn't
+    # evaluate the objective again
+    assert solveInfo['iterations'] > 0
+    assert calls[0] < 2*solveInfo['iterations']
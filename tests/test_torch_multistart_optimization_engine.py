@@ -0,0 +1,68 @@
+import numpy as np
+import torch
+from rtd.planner.trajopt import TrajOptProps, ScipyOptimizationEngine, TorchMultiStartOptimizationEngine
+
+
+
+def make_problem():
+    '''
+    Minimize |k - 1|^2 subject to k_0 + k_1 <= 1, where the optimum is
+    k = (0.5, 0.5, 1) with cost 0.5
+    '''
+    def objective(k):
+        return (float(np.sum((k - 1)**2)), 2*(k - 1))
+    def constraint(k):
+        return (np.array([k[0] + k[1] - 1.0]), np.empty(0), np.array([[1.0, 1.0, 0.0]]), np.empty((0, 3)))
+    bounds = {'param_limits': np.array([[-2.0, 2.0]]*3)}
+    return (objective, constraint, bounds)
+
+
+def make_double_well():
+    '''
+    Minimize (k^2 - 1)^2 + 0.3k over [-2, 2], which has a local minimum
+    near k = 0.96 and the global minimum near k = -1.04
+    '''
+    def objective(k):
+        return (float((k[0]**2 - 1)**2 + 0.3*k[0]), np.array([4*k[0]*(k[0]**2 - 1) + 0.3]))
+    def constraint(k):
+        return (np.empty(0), np.empty(0), np.empty((0, 1)), np.empty((0, 1)))
+    bounds = {'param_limits': np.array([[-2.0, 2.0]])}
+    return (objective, constraint, bounds)
+
+
+
+def test_known_optimum():
+    (objective, constraint, bounds) = make_problem()
+    engine = TorchMultiStartOptimizationEngine(TrajOptProps())
+    solveInfo = dict()
+    (success, parameters, cost) = engine.performOptimization(np.zeros(3), objective, constraint, bounds,
+                                                             solveInfo=solveInfo)
+    assert success
+    assert np.allclose(parameters, [0.5, 0.5, 1.0], atol=1e-2)
+    assert np.isclose(cost, 0.5, atol=1e-3)
+    # stops once the rounds stop improving
+    assert solveInfo['iterations'] < engine.outer_iterations*engine.inner_iterations
+
+
+def test_batch_matches_loop():
+    (objective, constraint, bounds) = make_problem()
+    objective.batch = lambda K: (np.sum((K - 1)**2, axis=1), 2*(K - 1))
+    K = np.random.default_rng(0).uniform(-2, 2, (5, 3))
+    batched = TorchMultiStartOptimizationEngine.evalBatch(torch.as_tensor(K), objective, constraint)
+    del objective.batch
+    looped = TorchMultiStartOptimizationEngine.evalBatch(torch.as_tensor(K), objective, constraint)
+    for (a, b) in zip(batched, looped):
+        assert np.allclose(a.numpy(), b.numpy())
+
+
+def test_finds_global_minimum():
+    (objective, constraint, bounds) = make_double_well()
+    guess = np.array([0.5])
+    (_, local, _) = ScipyOptimizationEngine(TrajOptProps()).performOptimization(
+        guess, objective, constraint, bounds)
+    (success, parameters, _) = TorchMultiStartOptimizationEngine(TrajOptProps()).performOptimization(
+        guess, objective, constraint, bounds)
+    # a single start from the guess stays in the nearest well
+    assert local[0] > 0
+    assert success
+    assert parameters[0] < 0
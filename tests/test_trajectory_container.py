@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+from rtd.planner.trajectory import Trajectory, TrajectoryContainer, BadTrajectoryException
+
+
+
+class ConstantTrajectory(Trajectory):
+    '''
+    Trajectory whose command is its own id, along with the queried times
+    '''
+    def __init__(self, id: int, startTime: float, vectorized: bool = True):
+        Trajectory.__init__(self)
+        self.id = id
+        self.startTime = startTime
+        self.vectorized = vectorized
+        self.calls = 0
+    
+    
+    def validate(self, throwOnError: bool = False) -> bool:
+        return True
+    
+    
+    def setParameters(self, trajectoryParams, **options):
+        pass
+    
+    
+    def getCommand(self, time):
+        self.calls += 1
+        return (self.id, np.copy(time))
+
+
+
+def make_container(startTimes: list[float], **options) -> TrajectoryContainer:
+    container = TrajectoryContainer(**options)
+    container.setInitialTrajectory(ConstantTrajectory(0, 0))
+    for (i, startTime) in enumerate(startTimes):
+        container.setTrajectory(ConstantTrajectory(i + 1, startTime, vectorized=(i % 2 == 0)))
+    return container
+
+
+def reference(startTimes: list[float], time: np.ndarray) -> list[int]:
+    '''
+    Id of the newest trajectory started at or before each time, or the
+    initial one before any started
+    '''
+    startTimes = [0] + list(startTimes)
+    return [max((i for (i, start) in enumerate(startTimes) if start <= t), default=0) for t in time]
+
+
+
+def test_commands_match_reference():
+    # more trajectories than the initial buffer holds, including two
+    # starting at the same time
+    startTimes = [0.5, 1.0, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0]
+    container = make_container(startTimes)
+    assert len(container) == 12
+    time = np.array([4.2, 0.0, 0.5, 0.7, 1.0, 5.0, 7.0, 2.49, 0.2])
+    commands = container.getCommand(time)
+    assert [command[0] for command in commands] == reference(startTimes, time)
+
+
+def test_vectorized_trajectories_share_a_command():
+    container = make_container([1.0, 2.0])
+    commands = container.getCommand([1.2, 1.5, 2.1, 2.5, 0.5])
+    # the first added trajectory is vectorized and evaluates both of its
+    # times at once, the second isn't and evaluates them one by one
+    (first, second) = container.trajectories[1:]
+    assert (first.calls, second.calls) == (1, 2)
+    assert commands[0] is commands[1]
+    assert np.array_equal(commands[0][1], [1.2, 1.5])
+    assert commands[2][1] == 2.1 and commands[3][1] == 2.5
+
+
+def test_retention_horizon():
+    startTimes = list(np.arange(1.0, 40.0))
+    container = make_container(startTimes, retention_horizon=2.5)
+    # only the trajectories active within the horizon of the newest are kept
+    assert list(container.startTimes) == [36.0, 37.0, 38.0, 39.0]
+    assert [trajectory.id for trajectory in container.trajectories] == [36, 37, 38, 39]
+    # times before the oldest kept trajectory use it
+    commands = container.getCommand([0.0, 37.5, 100.0])
+    assert [command[0] for command in commands] == [36, 37, 39]
+
+
+def test_retire_keeps_newest():
+    container = make_container([1.0, 2.0])
+    container.retire(10.0)
+    assert len(container) == 1
+    assert container.getCommand(0.0)[0][0] == 2
+
+
+def test_clear_and_invalid():
+    container = make_container([1.0, 2.0])
+    container.clear()
+    assert len(container) == 1
+    assert container.getCommand(5.0)[0][0] == 0
+    
+    # trajectories have to start after the last one
+    container.setTrajectory(ConstantTrajectory(1, 3.0))
+    with pytest.raises(BadTrajectoryException):
+        container.setTrajectory(ConstantTrajectory(2, 2.0), errorIfInvalid=True)
+    with pytest.raises(BadTrajectoryException):
+        TrajectoryContainer().getCommand(0.0)
+
+
+def test_initial_trajectory_after_retire():
+    container = make_container([1.0, 2.0])
+    # replacing the initial trajectory keeps the others
+    container.setInitialTrajectory(ConstantTrajectory(10, 0))
+    assert [trajectory.id for trajectory in container.trajectories] == [10, 1, 2]
+    
+    # once it's retired, the oldest kept trajectory isn't overwritten
+    container.retire(1.5)
+    with pytest.raises(BadTrajectoryException):
+        container.setInitialTrajectory(ConstantTrajectory(20, 0))
+    assert [trajectory.id for trajectory in container.trajectories] == [1, 2]
+    
+    # until the container is cleared
+    container.clear()
+    container.setInitialTrajectory(ConstantTrajectory(20, 0))
+    assert [trajectory.id for trajectory in container.trajectories] == [20]
+    assert container.getCommand(5.0)[0][0] == 20
+    
+    # and the same after the buffers were compacted
+    container = make_container(list(np.arange(1.0, 40.0)), retention_horizon=2.5)
+    with pytest.raises(BadTrajectoryException):
+        container.setInitialTrajectory(ConstantTrajectory(20, 0))
+    assert list(container.startTimes) == [36.0, 37.0, 38.0, 39.0]